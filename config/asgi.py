@@ -0,0 +1,27 @@
+# ruff: noqa
+"""
+ASGI config for dialog_management project.
+
+Serves the same Django application as ``config/wsgi.py``, but lets streaming
+responses such as ``/api/dialogue/<id>/stream/`` wait on the event loop
+instead of holding a worker thread for as long as the client is connected.
+
+Run it with an ASGI server, for example::
+
+    gunicorn config.asgi -k uvicorn_worker.UvicornWorker
+
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from django.core.asgi import get_asgi_application
+
+# This allows easy placement of apps within the interior
+# dialogmanagement directory.
+BASE_DIR = Path(__file__).resolve(strict=True).parent.parent
+sys.path.append(str(BASE_DIR / "dialogmanagement"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
+
+application = get_asgi_application()
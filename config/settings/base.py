@@ -63,6 +63,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 ROOT_URLCONF = "config.urls"
 # https://docs.djangoproject.com/en/dev/ref/settings/#wsgi-application
 WSGI_APPLICATION = "config.wsgi.application"
+# https://docs.djangoproject.com/en/dev/ref/settings/#asgi-application
+ASGI_APPLICATION = "config.asgi.application"
 
 # APPS
 # ------------------------------------------------------------------------------
@@ -273,6 +275,11 @@ LOGGING = {
 
 REDIS_URL = env("REDIS_URL", default="redis://localhost:6379/0")
 REDIS_SSL = REDIS_URL.startswith("rediss://")
+# Extra keyword arguments for the redis.asyncio clients used by async views.
+REDIS_ASYNC_CONNECTION_KWARGS: dict = {}
+# Most reply streams and long-poll requests one ASGI process serves at once;
+# they share one pub/sub connection. Requests beyond it get a 503.
+PUBSUB_MAX_SUBSCRIPTIONS = env.int("PUBSUB_MAX_SUBSCRIPTIONS", default=10_000)
 
 # Celery
 # ------------------------------------------------------------------------------
@@ -308,12 +315,54 @@ CELERY_TASK_TIME_LIMIT = 5 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 60
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-scheduler
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_BEAT_SCHEDULE = {
+    "create-dialogue-partitions": {
+        "task": "dialogmanagement.utils.tasks.create_dialogue_partitions",
+        "schedule": 60 * 60 * 24,
+    },
+    "archive-old-dialogues": {
+        "task": "dialogmanagement.utils.tasks.archive_old_dialogues",
+        "schedule": 60 * 60 * 24,
+    },
+}
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-send-task-events
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
 CELERY_TASK_SEND_SENT_EVENT = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-hijack-root-logger
 CELERY_WORKER_HIJACK_ROOT_LOGGER = False
+# Queue of the tasks that call each AI provider, so a throttled provider
+# does not hold up the others. Workers must consume them (see README).
+AI_PROVIDER_QUEUES = {
+    "openai": env("OPENAI_QUEUE", default="openai"),
+    "gemini": env("GEMINI_QUEUE", default="gemini"),
+}
+# Quota of each provider shared by all workers, per minute; 0 is unlimited.
+AI_PROVIDER_RATE_LIMITS = {
+    "openai": {
+        "requests_per_minute": env.int("OPENAI_RPM", default=0),
+        "tokens_per_minute": env.int("OPENAI_TPM", default=0),
+    },
+    "gemini": {
+        "requests_per_minute": env.int("GEMINI_RPM", default=0),
+        "tokens_per_minute": env.int("GEMINI_TPM", default=0),
+    },
+}
+# Attempts at a provider call that fails before its first chunk, with full
+# jitter exponential backoff between them (seconds).
+AI_PROVIDER_MAX_ATTEMPTS = env.int("AI_PROVIDER_MAX_ATTEMPTS", default=3)
+AI_RETRY_BASE_DELAY = 0.5
+AI_RETRY_MAX_DELAY = 8
+# Transient failures of a model version within the window (seconds) that
+# stop calls to it for the cooldown (seconds), before one call probes it.
+AI_CIRCUIT_FAILURE_THRESHOLD = env.int("AI_CIRCUIT_FAILURE_THRESHOLD", default=5)
+AI_CIRCUIT_FAILURE_WINDOW = 60
+AI_CIRCUIT_COOLDOWN = env.int("AI_CIRCUIT_COOLDOWN", default=30)
+# Most calls one `run_ai_worker` process has in flight to each provider.
+AI_PROVIDER_CONCURRENCY = {
+    "openai": env.int("OPENAI_CONCURRENCY", default=100),
+    "gemini": env.int("GEMINI_CONCURRENCY", default=100),
+}
 # django-allauth
 # ------------------------------------------------------------------------------
 ACCOUNT_ALLOW_REGISTRATION = env.bool("DJANGO_ACCOUNT_ALLOW_REGISTRATION", True)
@@ -359,3 +408,37 @@ SPECTACULAR_SETTINGS = {
 # Your stuff...
 # ------------------------------------------------------------------------------
 TIME_ZONE = "Asia/Taipei"
+# "fused" answers a dialogue message in one Celery task, "chained" runs the
+# insert and the AI reply as a chain of two tasks.
+DIALOGUE_PIPELINE_MODE = env("DIALOGUE_PIPELINE_MODE", default="fused")
+# Queue answered turns in a Redis stream for `flush_dialogues` to write in
+# batches of up to DIALOGUE_FLUSH_BATCH_SIZE rows, collected over at most
+# DIALOGUE_FLUSH_INTERVAL_MS, instead of writing each one in its own
+# transaction.
+DIALOGUE_WRITE_BEHIND = env.bool("DIALOGUE_WRITE_BEHIND", default=False)
+DIALOGUE_FLUSH_BATCH_SIZE = env.int("DIALOGUE_FLUSH_BATCH_SIZE", default=500)
+DIALOGUE_FLUSH_INTERVAL_MS = env.int("DIALOGUE_FLUSH_INTERVAL_MS", default=200)
+# Set once `partition_dialogues` has moved the Dialogue table to monthly
+# partitions: list pages then bound `created_timestamp` by their cursor's, so
+# Postgres skips the other partitions. Ids are reserved before their rows are
+# written, so the bound is widened by the longest such delay (seconds).
+DIALOGUE_PARTITIONED = env.bool("DIALOGUE_PARTITIONED", default=False)
+DIALOGUE_PARTITION_SLACK = env.int("DIALOGUE_PARTITION_SLACK", default=60 * 60 * 24)
+# Months of partitions `create_dialogue_partitions` keeps ahead of today's.
+DIALOGUE_PARTITION_MONTHS_AHEAD = 3
+# Dialogues older than this many days are moved to compressed segment files
+# in the default storage by `archive_old_dialogues`, at most
+# DIALOGUE_ARCHIVE_SEGMENT_ROWS per file. 0 keeps every row in the table.
+DIALOGUE_ARCHIVE_AFTER_DAYS = env.int("DIALOGUE_ARCHIVE_AFTER_DAYS", default=0)
+DIALOGUE_ARCHIVE_SEGMENT_ROWS = env.int("DIALOGUE_ARCHIVE_SEGMENT_ROWS", default=1000)
+# Rows the history export reads from the database and sends per chunk.
+DIALOGUE_EXPORT_CHUNK_SIZE = env.int("DIALOGUE_EXPORT_CHUNK_SIZE", default=2000)
+# Seconds a cached AI reply is served for, and most replies kept, for model
+# versions with `response_cache_enabled`.
+AI_RESPONSE_CACHE_TIMEOUT = env.int("AI_RESPONSE_CACHE_TIMEOUT", default=60 * 60)
+AI_RESPONSE_CACHE_MAX_ENTRIES = env.int("AI_RESPONSE_CACHE_MAX_ENTRIES", default=10000)
+# Longest a provider call for a prompt is waited on by identical concurrent
+# calls, which then share its reply; 0 turns the coalescing off. Kept short
+# of CELERY_TASK_SOFT_TIME_LIMIT by more than the provider clients' 30 s read
+# timeout, so a follower given up on its leader still has time to answer.
+AI_SINGLE_FLIGHT_TIMEOUT = env.int("AI_SINGLE_FLIGHT_TIMEOUT", default=20)
@@ -2,6 +2,9 @@
 With these settings, tests run faster.
 """
 
+from fakeredis import FakeConnection
+from fakeredis.aioredis import FakeConnection as FakeAsyncConnection
+
 from .base import *  # noqa: F403
 from .base import TEMPLATES
 from .base import env
@@ -16,6 +19,23 @@ SECRET_KEY = env(
 # https://docs.djangoproject.com/en/dev/ref/settings/#test-runner
 TEST_RUNNER = "django.test.runner.DiscoverRunner"
 
+# CACHES
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#caches
+# django-redis over an in-memory fake server, so code that uses Redis directly
+# (lists, pub/sub, Lua scripts) runs under test without a Redis server.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://localhost:6379/0",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "CONNECTION_POOL_KWARGS": {"connection_class": FakeConnection},
+        },
+    },
+}
+REDIS_ASYNC_CONNECTION_KWARGS = {"connection_class": FakeAsyncConnection}
+
 # PASSWORDS
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#password-hashers
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AiModelConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "dialogmanagement.ai_model"
+
+    def ready(self):
+        import dialogmanagement.ai_model.signals  # noqa: F401
@@ -0,0 +1,129 @@
+import logging
+import os
+import threading
+import time
+
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from dialogmanagement.ai_model.models import AIModel
+from dialogmanagement.ai_model.models import ModelVersion
+
+logger = logging.getLogger(__name__)
+
+# Every web and worker process listens here and drops its copy of the catalog
+# when any process saves or deletes an AIModel or ModelVersion.
+CATALOG_CHANNEL = "ai_model_catalog_invalidate"
+
+
+class ModelCatalog:
+    """
+    Process-local copy of every `AIModel` and `ModelVersion`, so resolving
+    the ids of a dialogue turn is a dictionary lookup instead of two queries.
+
+    The whole catalog is loaded at once on first use. Writes invalidate it
+    through the model signals in this process and through Redis pub/sub in
+    every other one. A lookup miss reloads once, so rows created elsewhere are
+    found even if their invalidation message has not arrived yet, and
+    `MAX_AGE` bounds staleness if the subscriber connection drops unnoticed.
+    Misses reload at most once per `MISS_RELOAD_INTERVAL`, so requests for
+    unknown ids cannot make every request reload the catalog.
+    """
+
+    MAX_AGE = 60 * 5  # 5 minutes
+    MISS_RELOAD_INTERVAL = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: dict[int, AIModel] | None = None
+        self._versions: dict[int, ModelVersion] | None = None
+        self._loaded_at = 0.0
+        self._listener = None
+        self._pid = None
+
+    def get_model(self, model_id: int) -> AIModel | None:
+        return self._lookup("_models", model_id)
+
+    def get_version(self, model_version_id: int) -> ModelVersion | None:
+        return self._lookup("_versions", model_version_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._models = self._versions = None
+
+    def publish_invalidation(self):
+        """Tell every process, this one included, to drop its catalog."""
+        self.invalidate()
+        get_redis_connection("default").publish(CATALOG_CHANNEL, b"1")
+
+    def _lookup(self, attr: str, pk: int):
+        entries = self._current()
+        if pk in entries[attr]:
+            return entries[attr][pk]
+        if time.monotonic() - self._loaded_at < self.MISS_RELOAD_INTERVAL:
+            return None
+        return self._current(reload=True)[attr].get(pk)
+
+    def _current(self, *, reload: bool = False) -> dict:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Threads do not survive a fork: a Celery child process starts
+                # its own listener and discards any catalog it inherited.
+                self._pid = os.getpid()
+                self._listener = None
+                self._models = self._versions = None
+            stale = time.monotonic() - self._loaded_at > self.MAX_AGE
+            if reload or stale or self._models is None or self._versions is None:
+                # Subscribe before loading, so no invalidation published
+                # after the load can be missed.
+                self._ensure_listener()
+                self._load()
+            return {"_models": self._models, "_versions": self._versions}
+
+    def _load(self):
+        models = {model.id: model for model in AIModel.objects.all()}
+        versions = {}
+        for version in ModelVersion.objects.all():
+            # Share the AIModel instances so `version.ai_model` never queries.
+            version.ai_model = models[version.ai_model_id]
+            versions[version.id] = version
+        self._models, self._versions = models, versions
+        self._loaded_at = time.monotonic()
+
+    def _ensure_listener(self):
+        if self._listener is not None:
+            return
+        try:
+            pubsub = get_redis_connection("default").pubsub(
+                ignore_subscribe_messages=True,
+            )
+            pubsub.subscribe(**{CATALOG_CHANNEL: self._on_message})
+            self._listener = pubsub.run_in_thread(
+                sleep_time=1,
+                daemon=True,
+                exception_handler=self._on_listener_error,
+            )
+        except Exception:
+            # Keep serving with MAX_AGE as the only bound on staleness and
+            # try to subscribe again on the next load.
+            logger.exception("Could not subscribe to %s", CATALOG_CHANNEL)
+
+    def _on_message(self, message):
+        self.invalidate()
+
+    def _on_listener_error(self, exc, pubsub, thread):
+        logger.warning("Catalog invalidation listener stopped: %s", exc)
+        thread.stop()
+        pubsub.close()
+        with self._lock:
+            self._listener = None
+            self._models = self._versions = None
+
+
+catalog = ModelCatalog()
+
+
+def invalidate_catalog():
+    """Drop the catalog here now and in every process once committed."""
+    catalog.invalidate()
+    transaction.on_commit(catalog.publish_invalidation)
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from dialogmanagement.utils import dialogue_archive
+from dialogmanagement.utils import hedging
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils import response_cache
+
+PROVIDERS = ("openai", "gemini")
+
+
+class Command(BaseCommand):
+    help = "Print the AI service counters collected from web and worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Clear the counters after printing them.",
+        )
+
+    def handle(self, *args, **options):
+        counters = metrics.get_counters()
+        for name in sorted(counters):
+            self.stdout.write(f"{name}: {counters[name]}")
+
+        for provider in PROVIDERS:
+            rate = metrics.connection_reuse_rate(counters, provider)
+            if rate is not None:
+                self.stdout.write(f"{provider} connection reuse rate: {rate:.1%}")
+            ttft = metrics.average_ms(counters, f"{provider}.ttft")
+            if ttft is not None:
+                self.stdout.write(f"{provider} time to first token: {ttft:.0f} ms")
+
+        cache_hit_rate = response_cache.hit_rate(counters)
+        if cache_hit_rate is not None:
+            self.stdout.write(f"response cache hit rate: {cache_hit_rate:.1%}")
+
+        stats = hedging.hedge_stats(counters)
+        if stats is not None:
+            sent, win_rate, tokens = stats
+            self.stdout.write(
+                f"hedges: {sent}, {win_rate:.1%} answered first, {tokens} extra tokens",
+            )
+
+        archived = dialogue_archive.archive_stats(counters)
+        if archived is not None:
+            rows, hot_bytes, archive_bytes = archived
+            self.stdout.write(
+                f"archived dialogues: {rows}, {hot_bytes} table bytes "
+                f"freed, {archive_bytes} bytes in segment files",
+            )
+
+        if options["reset"]:
+            metrics.reset()
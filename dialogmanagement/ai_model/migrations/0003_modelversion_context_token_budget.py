@@ -0,0 +1,18 @@
+# Generated by Django 5.0.13 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_model', '0002_alter_modelversion_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='context_token_budget',
+            field=models.PositiveIntegerField(default=2000),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.13 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_model', '0003_modelversion_context_token_budget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='response_cache_enabled',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.13 on 2026-10-18 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_model', '0004_modelversion_response_cache_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='fallback_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ai_model.modelversion'),
+        ),
+        migrations.AddField(
+            model_name='modelversion',
+            name='hedge_enabled',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -20,6 +20,24 @@ class AIModel(models.Model):
 class ModelVersion(models.Model):
     ai_model = models.ForeignKey(AIModel, on_delete=models.CASCADE)
     name = models.CharField(max_length=50)
+    # Upper bound on the conversation tokens sent to the provider per turn;
+    # older turns are folded into a summary.
+    context_token_budget = models.PositiveIntegerField(default=2000)
+    # Answer a prompt identical to a recent one (same history window) from the
+    # response cache instead of calling the provider.
+    response_cache_enabled = models.BooleanField(default=False)
+    # Version that answers when a call to this one fails before its reply
+    # starts. With hedging enabled it is also called once this version is
+    # slower than its usual (p95) time to first token, and the first of the
+    # two to start replying answers.
+    fallback_version = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    hedge_enabled = models.BooleanField(default=False)
 
     def __str__(self):
         return f"{self.ai_model.name} - {self.name}"
@@ -40,4 +58,8 @@ class ModelVersion(models.Model):
             err = f"Invalid model version: {self.name}"
             raise ValueError(err)
 
+        if self.pk is not None and self.fallback_version_id == self.pk:
+            err = f"{self} cannot be its own fallback version"
+            raise ValueError(err)
+
         super().save(*args, **kwargs)
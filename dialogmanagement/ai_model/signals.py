@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from dialogmanagement.ai_model.catalog import invalidate_catalog
+from dialogmanagement.ai_model.models import AIModel
+from dialogmanagement.ai_model.models import ModelVersion
+
+
+@receiver(post_save, sender=AIModel)
+@receiver(post_delete, sender=AIModel)
+@receiver(post_save, sender=ModelVersion)
+@receiver(post_delete, sender=ModelVersion)
+def model_catalog_changed(sender, **kwargs):
+    invalidate_catalog()
@@ -0,0 +1,173 @@
+import datetime
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class DialogueCursorPagination(BasePagination):
+    """
+    Keyset pagination over `Dialogue.id`.
+
+    Without a cursor the newest page is returned. `?before=<id>` walks back
+    through older rows (`WHERE id < before ORDER BY id DESC LIMIT n + 1`) and
+    `?after=<id>` fetches rows newer than the last one a client has seen
+    (`WHERE id > after ORDER BY id LIMIT n + 1`). The cost of a page does not
+    depend on how deep into the history it is, no `COUNT(*)` is issued, and
+    cursors stay valid while new rows are being written.
+    """
+
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    before_query_param = "before"
+    after_query_param = "after"
+    # Order of the rows inside a page; cursors are the same either way.
+    ascending = False
+
+    def get_page_size(self, request):
+        page_size = self.get_positive_int(request, self.page_size_query_param)
+        if page_size is None:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_positive_int(self, request, param):
+        raw = request.query_params.get(param)
+        if raw is None:
+            return None
+        try:
+            value = int(raw)
+        except ValueError as err:
+            raise ValidationError({param: "Must be a positive integer."}) from err
+        if value <= 0:
+            raise ValidationError({param: "Must be a positive integer."})
+        return value
+
+    def paginate_queryset(self, queryset, request, view=None):
+        bound = self.cursor_bound(request)
+        if bound is not None:
+            created = self.cursor_created(queryset, bound[1]).first()
+            queryset = self.bound_by_time(queryset, bound[0], created)
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None, pending=()):
+        """
+        `paginate_queryset` for async views, on Django's async ORM. `pending`
+        rows, not written to the database yet, are placed among its rows.
+        """
+        bound = self.cursor_bound(request)
+        if bound is not None:
+            created = await self.cursor_created(queryset, bound[1]).afirst()
+            queryset = self.bound_by_time(queryset, bound[0], created)
+        queryset = self.get_page_queryset(queryset, request)
+        rows = [row async for row in queryset]
+        if pending:
+            rows = self.merge_pending(rows, pending)
+        return self.set_page(rows)
+
+    def cursor_bound(self, request) -> tuple[str, int] | None:
+        """
+        On a partitioned table, the direction and id of the cursor whose
+        `created_timestamp` bounds the page's, so other partitions are skipped.
+        """
+        if not settings.DIALOGUE_PARTITIONED:
+            return None
+        after = self.get_positive_int(request, self.after_query_param)
+        if after is not None:
+            return self.after_query_param, after
+        before = self.get_positive_int(request, self.before_query_param)
+        if before is not None:
+            return self.before_query_param, before
+        return None
+
+    def cursor_created(self, queryset, cursor_id):
+        return queryset.filter(id=cursor_id).values_list(
+            "created_timestamp",
+            flat=True,
+        )
+
+    def bound_by_time(self, queryset, direction, created):
+        # A row's id is reserved before it is written, so a newer id may have
+        # an older timestamp, by up to the slack.
+        if created is None:
+            return queryset
+        slack = datetime.timedelta(seconds=settings.DIALOGUE_PARTITION_SLACK)
+        if direction == self.after_query_param:
+            return queryset.filter(created_timestamp__gte=created - slack)
+        return queryset.filter(created_timestamp__lt=created + slack)
+
+    def get_page_queryset(self, queryset, request):
+        """Return the query for the requested page plus one lookahead row."""
+        self.page_size = self.get_page_size(request)
+        self.before = self.get_positive_int(request, self.before_query_param)
+        self.after = self.get_positive_int(request, self.after_query_param)
+        if self.before is not None and self.after is not None:
+            msg = "Use either 'before' or 'after', not both."
+            raise ValidationError({self.before_query_param: msg})
+
+        if self.after is not None:
+            queryset = queryset.filter(id__gt=self.after).order_by("id")
+        else:
+            if self.before is not None:
+                queryset = queryset.filter(id__lt=self.before)
+            queryset = queryset.order_by("-id")
+        return queryset[: self.page_size + 1]
+
+    def merge_pending(self, rows, pending):
+        """
+        Merge rows matching the cursor into the fetched ones, in the same
+        order and limit. A row found in both is kept once.
+        """
+        if self.after is not None:
+            pending = [row for row in pending if row.id > self.after]
+        elif self.before is not None:
+            pending = [row for row in pending if row.id < self.before]
+        merged = {row.id: row for row in pending} | {row.id: row for row in rows}
+        ordered = sorted(merged.values(), key=lambda row: row.id)
+        if self.after is None:
+            ordered.reverse()
+        return ordered[: self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if self.after is not None:
+            # Rows up to `after` were already seen, so older rows exist.
+            self.has_older = bool(rows)
+        else:
+            self.has_older = has_more
+            rows.reverse()
+
+        self.page = rows if self.ascending else rows[::-1]
+        return self.page
+
+    def get_paginated_response(self, data):
+        oldest = min(self.page, key=lambda row: row.id, default=None)
+        newest = max(self.page, key=lambda row: row.id, default=None)
+        return Response(
+            {
+                "before": oldest.id if oldest and self.has_older else None,
+                # Always hand back a cursor for "anything newer than this",
+                # so clients can keep asking for new rows.
+                "after": newest.id if newest else self.after,
+                "results": data,
+            },
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "before": {"type": "integer", "nullable": True},
+                "after": {"type": "integer", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class DialogueHistoryPagination(DialogueCursorPagination):
+    """Chat history pages, oldest message first inside each page."""
+
+    ascending = True
@@ -0,0 +1,39 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets clients ask for `text/event-stream`. The stream itself is written by
+    a StreamingHttpResponse; this only renders error responses as JSON.
+    """
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Lets clients ask for an NDJSON export, with `?format=ndjson` or the
+    Accept header. The rows are streamed by the view; this only renders
+    error responses as JSON.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode(self.charset)
+
+
+class CSVRenderer(NDJSONRenderer):
+    """`NDJSONRenderer` for a CSV export."""
+
+    media_type = "text/csv"
+    format = "csv"
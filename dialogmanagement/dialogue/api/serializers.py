@@ -1,7 +1,6 @@
 from rest_framework import serializers
 
-from dialogmanagement.ai_model.models import AIModel
-from dialogmanagement.ai_model.models import ModelVersion
+from dialogmanagement.ai_model.catalog import catalog
 from dialogmanagement.dialogue.models import Dialogue
 
 
@@ -38,27 +37,34 @@ class DialogueCreateSerializer(serializers.ModelSerializer[Dialogue]):
         model_version_id = attrs.pop("model_version_id")
 
         # Validate AIModel existence
-        try:
-            ai_model = AIModel.objects.get(id=model_id)
-        except AIModel.DoesNotExist as err:
-            raise serializers.ValidationError(
-                {"model_id": "Invalid AI model ID."},
-            ) from err
+        ai_model = catalog.get_model(model_id)
+        if ai_model is None:
+            raise serializers.ValidationError({"model_id": "Invalid AI model ID."})
 
         # Validate ModelVersion and ensure it belongs to AIModel
-        try:
-            model_version = ModelVersion.objects.get(
-                id=model_version_id,
-                ai_model=ai_model,
-            )
-        except ModelVersion.DoesNotExist as err:
+        model_version = catalog.get_version(model_version_id)
+        if model_version is None or model_version.ai_model_id != ai_model.id:
             raise serializers.ValidationError(
                 {
                     "model_version_id": "Invalid model version ID.",
                 },
-            ) from err
+            )
 
         # Assign validated instances
         attrs["model"] = ai_model
         attrs["model_version"] = model_version
         return attrs
+
+
+class DialogueSearchSerializer(serializers.Serializer):
+    keyword = serializers.CharField(trim_whitespace=True)
+    model_id = serializers.IntegerField(required=False)
+    model_version_id = serializers.IntegerField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+
+class DialogueWaitSerializer(serializers.Serializer):
+    # Seconds to hold the request open when there is nothing new yet; keep
+    # it under the proxy's read timeout.
+    timeout = serializers.IntegerField(min_value=0, max_value=55, default=25)
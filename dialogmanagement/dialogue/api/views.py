@@ -1,58 +1,162 @@
-from celery import chain
+import re
+
+from adrf.viewsets import GenericViewSet
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.postgres.search import SearchQuery
-from django.contrib.postgres.search import SearchRank
-from django.contrib.postgres.search import SearchVector
 from django.core.cache import cache
-from django.db.models import Q
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404
+from django.http import StreamingHttpResponse
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.mixins import ListModelMixin
 from rest_framework.mixins import RetrieveModelMixin
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.viewsets import GenericViewSet
 
 from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.utils import dialogue_archive
+from dialogmanagement.utils import dialogue_export
+from dialogmanagement.utils import write_behind
+from dialogmanagement.utils.chat_history import clear_chat_history
+from dialogmanagement.utils.dialogue_cache import PAGE_CACHE_TIMEOUT
+from dialogmanagement.utils.dialogue_cache import adialogue_page_cache_key
+from dialogmanagement.utils.dialogue_cache import bump_dialogue_version
+from dialogmanagement.utils.dialogue_notifications import NewDialogueListener
+from dialogmanagement.utils.dialogue_stream import DONE
+from dialogmanagement.utils.dialogue_stream import arelay_dialogue_stream
+from dialogmanagement.utils.dialogue_stream import format_event
+from dialogmanagement.utils.dialogue_stream import relay_dialogue_stream
+from dialogmanagement.utils.dialogue_stream import stream_started
 from dialogmanagement.utils.dialogue_types import StatusType
-from dialogmanagement.utils.tasks import chat_with_ai_task
-from dialogmanagement.utils.tasks import create_user_dialogue
-from dialogmanagement.utils.tasks import update_search_vector
+from dialogmanagement.utils.error_handle import TooManySubscriptionsError
+from dialogmanagement.utils.subscriber import get_subscriber
+from dialogmanagement.utils.tasks import enqueue_dialogue_turn
 
+from .pagination import DialogueCursorPagination
+from .pagination import DialogueHistoryPagination
 from .permission import DialoguePermission
+from .renderers import CSVRenderer
+from .renderers import EventStreamRenderer
+from .renderers import NDJSONRenderer
 from .serializers import DialogueCreateSerializer
+from .serializers import DialogueSearchSerializer
 from .serializers import DialogueSerializer
+from .serializers import DialogueWaitSerializer
+
+ACCEPTS_GZIP = re.compile(r"\bgzip\b")
 
 
 # Create your views here.
 class DialogueViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
+    """
+    Dialogue endpoints. `list`, `create`, `search_dialogue`, `wait` and
+    `stream` are coroutines: under ASGI they wait on the cache, Redis and
+    the database without holding a thread. The other actions are sync and
+    run in a thread.
+    """
+
     queryset = Dialogue.objects.all()
     serializer_class = DialogueSerializer
     permission_classes = [IsAuthenticated, DialoguePermission]
+    pagination_class = DialogueHistoryPagination
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        # Dialogue writes all happen in Celery tasks, so opting out of
+        # ATOMIC_REQUESTS keeps cache hits from opening a DB transaction.
+        # Async views could not run inside one anyway.
+        return transaction.non_atomic_requests(super().as_view(*args, **kwargs))
 
     def get_queryset(self, *args, **kwargs):
-        assert isinstance(self.request.user.id, int)
-        cache_key = f"user_dialogues_{self.request.user.id}"
-        cached_data = cache.get(cache_key)
-        latest_id_key = f"user_latest_dialogue_{self.request.user.id}"
-        latest_id = cache.get(latest_id_key)
+        latest_id = cache.get(f"user_latest_dialogue_{self.request.user.id}")
+        return self.history_queryset(latest_id)
 
-        if latest_id:
-            queryset = self.queryset.filter(
-                Q(user=self.request.user)
-                & Q(status=StatusType.COMPLETED)
-                & Q(id__gt=latest_id),
-            ).order_by("id")
-            cache.set(latest_id_key, queryset, timeout=60 * 3)
-            return queryset
-
-        if cached_data:
-            return cached_data  # Return cached queryset
-        queryset = self.queryset.filter(
+    async def alatest_id(self):
+        return await cache.aget(f"user_latest_dialogue_{self.request.user.id}")
+
+    def history_queryset(self, latest_id):
+        assert isinstance(self.request.user.id, int)
+        queryset = self.queryset.select_related("user").filter(
             user=self.request.user,
             status=StatusType.COMPLETED,
-        ).order_by("id")
-        cache.set(cache_key, queryset, timeout=60 * 1)
-        return queryset
+        )
+        # Rows up to `latest_id` are hidden; the list paginator walks
+        # forward from there with `?after=`.
+        if latest_id:
+            queryset = queryset.filter(id__gt=latest_id)
+        return queryset.order_by("id")
+
+    async def list(self, request, *args, **kwargs):
+        """
+        Serve rendered pages from the cache. Keys carry the user's dialogue
+        version, which is bumped on every write, so a hit is never stale.
+        """
+        cache_key = await adialogue_page_cache_key(
+            request.user.id,
+            request.query_params,
+        )
+        data = await cache.aget(cache_key)
+        if data is not None:
+            return Response(data)
+
+        response = await self.history_page()
+        await cache.aset(cache_key, response.data, timeout=PAGE_CACHE_TIMEOUT)
+        return response
+
+    async def history_page(self):
+        latest_id = await self.alatest_id()
+        # Read the turns not flushed yet before the table: one flushed in
+        # between is then found twice, never missed.
+        pending = await self.apending_rows(latest_id)
+        queryset = self.filter_queryset(self.history_queryset(latest_id))
+        page = await self.paginator.apaginate_queryset(
+            queryset,
+            self.request,
+            view=self,
+            pending=pending,
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    async def apending_rows(self, latest_id):
+        """History rows that `DIALOGUE_WRITE_BEHIND` has not written yet."""
+        if not settings.DIALOGUE_WRITE_BEHIND:
+            return []
+        rows = await write_behind.apending_rows(self.request.user)
+        return [row for row in rows if not latest_id or row.id > latest_id]
+
+    def get_object(self):
+        """
+        Read a dialogue `archive_old_dialogues` has moved out of the table
+        from its segment file.
+        """
+        try:
+            return super().get_object()
+        except Http404:
+            dialogue = self.find_archived()
+            if dialogue is None:
+                raise
+        self.check_object_permissions(self.request, dialogue)
+        return dialogue
+
+    def find_archived(self):
+        try:
+            dialogue_id = int(self.kwargs[self.lookup_field])
+        except ValueError:
+            return None
+        dialogue = dialogue_archive.find_archived(self.request.user, dialogue_id)
+        if dialogue is None or dialogue.status != StatusType.COMPLETED:
+            return None
+        # Hidden like the rows `history_queryset` leaves out.
+        latest_id = cache.get(f"user_latest_dialogue_{self.request.user.id}")
+        if latest_id and dialogue_id <= latest_id:
+            return None
+        return dialogue
 
     def get_serializer_class(self):
         """
@@ -63,7 +167,7 @@ class DialogueViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
             return DialogueCreateSerializer
         return self.serializer_class  # Default serializer for other actions
 
-    def create(self, request, *args, **kwargs):
+    async def create(self, request, *args, **kwargs):
         """
         Override the create method to handle the creation of a Dialog.
         Ensure the payload is correct and the 'id' field is excluded.
@@ -71,25 +175,24 @@ class DialogueViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
 
         # Serialize the data
         serializer = self.get_serializer(data=request.data)
-        # Validate and create the dialogue object
-
-        if serializer.is_valid():
-            chain(
-                create_user_dialogue.s(
-                    request.user.id,
-                    serializer.validated_data.get("content"),
-                    request.data.get("model_id"),
-                    request.data.get("model_version_id"),
-                ),
-                chat_with_ai_task.s(
-                    request.user.id,
-                    request.data.get("model_id"),
-                    request.data.get("model_version_id"),
-                ),
-                update_search_vector.s(),
-            ).apply_async()
+        # Validate and create the dialogue object; validation may load the
+        # model catalog from the database.
+        if await sync_to_async(serializer.is_valid)():
+            # Reserve the id now so the client can open the reply stream
+            # before the task has written the row.
+            dialogue_id = await Dialogue.objects.areserve_id()
+            await sync_to_async(enqueue_dialogue_turn)(
+                request.user.id,
+                serializer.validated_data.get("content"),
+                request.data.get("model_id"),
+                request.data.get("model_version_id"),
+                dialogue_id=dialogue_id,
+            )
             return Response(
-                {"message": "Dialogue created and AI task enqueued."},
+                {
+                    "message": "Dialogue created and AI task enqueued.",
+                    "dialogue_id": dialogue_id,
+                },
                 status=status.HTTP_201_CREATED,
             )
         # Return an error response if validation fails
@@ -121,30 +224,153 @@ class DialogueViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
             latest_dialogue.id,
             timeout=86400,
         )
-        cache.delete(f"chat_history_gemini_{request.user.id}")
-        cache.delete(f"chat_history_openai_{request.user.id}")
+        bump_dialogue_version(request.user.id)
+        clear_chat_history(request.user.id)
         return Response(
             {"message": "Dialogue updated successfully."},
             status=status.HTTP_200_OK,
         )
 
     @action(detail=False, methods=["post"], url_path="search-dialogue")
-    def search_dialogue(self, request, *args, **kwargs):
-        """
-        Search for dialogues based on a keyword.
-        Accepts a JSON payload with a 'keyword' field.
-        """
-        keyword = request.data.get("keyword", "").strip()
-        dialogues = (
-            Dialogue.objects.annotate(
-                rank=SearchRank(  # calculates a ranking score for each result
-                    SearchVector("content"),
-                    SearchQuery(keyword),
-                ),
-            )
-            .filter(rank__gte=0.05)
-            .order_by("-rank")
+    async def search_dialogue(self, request, *args, **kwargs):
+        """
+        Search the current user's dialogues for a keyword, newest first.
+        Accepts a JSON payload with a 'keyword' field and optional
+        'model_id', 'model_version_id', 'since' and 'until' filters.
+        Pass the returned 'before' value as `?before=` to get the next page.
+        """
+        search = DialogueSearchSerializer(data=request.data)
+        search.is_valid(raise_exception=True)
+        params = search.validated_data
+
+        # Matching against the stored column lets Postgres use the GIN index.
+        dialogues = Dialogue.objects.select_related("user").filter(
+            user=request.user,
+            search_vector=SearchQuery(params["keyword"]),
         )
+        if "model_id" in params:
+            dialogues = dialogues.filter(model_id=params["model_id"])
+        if "model_version_id" in params:
+            dialogues = dialogues.filter(model_version_id=params["model_version_id"])
+        if "since" in params:
+            dialogues = dialogues.filter(created_timestamp__gte=params["since"])
+        if "until" in params:
+            dialogues = dialogues.filter(created_timestamp__lt=params["until"])
+
+        paginator = DialogueCursorPagination()
+        page = await paginator.apaginate_queryset(dialogues, request, view=self)
+        serializer = DialogueSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    async def wait(self, request):
+        """
+        Long-poll for new messages: return the completed dialogues with ids
+        above `?after=` as soon as there are any, waiting up to `?timeout=`
+        seconds for one to be saved. Pass the returned `after` value to the
+        next call; an empty `results` only means the timeout ran out.
+        """
+        params = DialogueWaitSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        try:
+            async with NewDialogueListener(request.user.id) as listener:
+                response = await self.history_page()
+                timeout = params.validated_data["timeout"]
+                if not response.data["results"] and await listener.wait(timeout):
+                    response = await self.history_page()
+        except TooManySubscriptionsError:
+            return busy_response()
+        return response
+
+    @action(
+        detail=True,
+        methods=["get"],
+        renderer_classes=[EventStreamRenderer, JSONRenderer],
+    )
+    async def stream(self, request, pk=None):
+        """
+        Relay the AI reply to dialogue `pk` as Server-Sent Events, from the
+        first chunk until the reply is saved (`done`) or fails (`error`).
+        Send `Last-Event-ID` on reconnect to skip events already received.
+        """
+        try:
+            dialogue_id = int(pk)
+            last_seq = int(request.headers.get("Last-Event-ID", 0))
+        except ValueError as err:
+            raise NotFound from err
+        asgi = served_over_asgi(request)
+        if asgi and not get_subscriber().has_room():
+            return busy_response()
+
+        if not await stream_started(request.user.id, dialogue_id):
+            # The buffer expires a few minutes after the reply; an answered
+            # dialogue is then simply reported as done.
+            answered = await Dialogue.objects.filter(
+                id=dialogue_id,
+                user=request.user,
+                status=StatusType.COMPLETED,
+            ).aexists()
+            if answered:
+                events = [
+                    format_event({"seq": last_seq + 1, "event": DONE, "text": ""}),
+                ]
+                return event_stream_response(events)
+
+        relay = arelay_dialogue_stream if asgi else relay_dialogue_stream
+        return event_stream_response(relay(request.user.id, dialogue_id, last_seq))
+
+    @action(
+        detail=False,
+        methods=["get"],
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+    )
+    async def export(self, request):
+        """
+        Stream the user's whole history, archived rows included, oldest
+        first: NDJSON by default, CSV with `?format=csv` or `Accept: text/csv`.
+        Gzipped on the fly for clients that accept it.
+        """
+        output = request.accepted_renderer.format
+        content = dialogue_export.export(
+            request.user,
+            output,
+            settings.DIALOGUE_EXPORT_CHUNK_SIZE,
+        )
+        gzipped = ACCEPTS_GZIP.search(request.headers.get("Accept-Encoding", ""))
+        if gzipped:
+            content = dialogue_export.gzip(content)
+        response = StreamingHttpResponse(
+            dialogue_export.aiterate(content) if served_over_asgi(request) else content,
+            content_type=request.accepted_renderer.media_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="dialogues.{output}"'
+        response["Vary"] = "Accept, Accept-Encoding"
+        if gzipped:
+            response["Content-Encoding"] = "gzip"
+        return response
+
+
+def served_over_asgi(request) -> bool:
+    """
+    Whether a streamed body may be an async iterator. A WSGI server would
+    read one to the end before sending its first byte.
+    """
+    return isinstance(request._request, ASGIRequest)  # noqa: SLF001
+
+
+def busy_response() -> Response:
+    """Turn a client away while the process waits on too many channels."""
+    return Response(
+        {"error": "Too many open streams, try again shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
 
-        serializer = self.get_serializer(dialogues, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+def event_stream_response(events) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class DialogueConfig(AppConfig):
     name = "dialogmanagement.dialogue"
     default_auto_field = "django.db.models.BigAutoField"
+
+    def ready(self):
+        from dialogmanagement.utils.single_flight import check_timeout
+
+        check_timeout()
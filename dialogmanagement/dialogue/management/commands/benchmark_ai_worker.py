@@ -0,0 +1,198 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connections
+
+from dialogmanagement.users.models import User
+from dialogmanagement.utils.ai_clients import reset_clients
+from dialogmanagement.utils.ai_service import AIModelFactory
+from dialogmanagement.utils.ai_service import ChatGPTModel
+from dialogmanagement.utils.tasks import arun_dialogue_turn
+from dialogmanagement.utils.tasks import run_dialogue_turn
+
+STUB_REPLY = ("Stub ", "reply ", "from ", "the ", "benchmark.")
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """Answers OpenAI chat completion requests with a streamed canned reply."""
+
+    protocol_version = "HTTP/1.1"
+    server: "StubProvider"
+
+    def do_POST(self):  # noqa: N802
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.server.latency)
+        chunks = [{"content": text} for text in STUB_REPLY] + [{}]
+        body = "".join(
+            "data: "
+            + json.dumps(
+                {
+                    "id": "stub",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": "stub",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": delta,
+                            "finish_reason": None if delta else "stop",
+                        },
+                    ],
+                },
+            )
+            + "\n\n"
+            for delta in chunks
+        )
+        body += "data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class StubProvider(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency: float):
+        super().__init__(("127.0.0.1", 0), StubProviderHandler)
+        self.latency = latency
+
+
+def answer_turn(args):
+    run_dialogue_turn(*args)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare dialogue turns per second and per CPU-second of a prefork "
+        "process pool and of the asyncio AI worker, against a local stub of "
+        "the OpenAI API. Turns are written to the user's history; the broker "
+        "is left out, so this measures the two execution models alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", required=True)
+        parser.add_argument("--model-id", type=int, required=True)
+        parser.add_argument("--model-version-id", type=int, required=True)
+        parser.add_argument("--turns", type=int, default=200)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=1.0,
+            help="Seconds the stub provider takes to answer.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Prefork pool size.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=100,
+            help="Turns the asyncio worker keeps in flight.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist as err:
+            raise CommandError(str(err)) from err
+        ai_model = AIModelFactory.get_model(
+            options["model_id"],
+            options["model_version_id"],
+        )
+        if not isinstance(ai_model, ChatGPTModel):
+            msg = "The stub provider speaks the OpenAI API; pick a ChatGPT model."
+            raise CommandError(msg)
+
+        # The stub runs in a process of its own, so its CPU time is left out
+        # of both measurements.
+        connections.close_all()
+        provider = StubProvider(options["latency"])
+        server = multiprocessing.get_context("fork").Process(
+            target=provider.serve_forever,
+            daemon=True,
+        )
+        server.start()
+        provider.server_close()
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{provider.server_port}/v1"
+        os.environ["OPENAI_API_KEY"] = "stub"
+        reset_clients()
+
+        turns = [
+            (
+                user.id,
+                f"Benchmark turn {turn}",
+                options["model_id"],
+                options["model_version_id"],
+            )
+            for turn in range(options["turns"])
+        ]
+        try:
+            self.report(
+                f"prefork ({options['processes']} processes)",
+                len(turns),
+                *self.run_prefork(turns, options["processes"]),
+            )
+            self.report(
+                f"asyncio ({options['concurrency']} in flight)",
+                len(turns),
+                *self.run_async(turns, options["concurrency"]),
+            )
+        finally:
+            server.terminate()
+            server.join()
+
+    def run_prefork(self, turns, processes):
+        # Children must open their own database connections.
+        connections.close_all()
+        cpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        pool = multiprocessing.get_context("fork").Pool(
+            processes,
+            initializer=reset_clients,
+        )
+        pool.map(answer_turn, turns, chunksize=1)
+        pool.close()
+        pool.join()
+        elapsed = time.perf_counter() - start
+        used = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_seconds = (used.ru_utime - cpu.ru_utime) + (used.ru_stime - cpu.ru_stime)
+        return elapsed, cpu_seconds
+
+    def run_async(self, turns, concurrency):
+        async def answer_all():
+            limit = asyncio.Semaphore(concurrency)
+
+            async def answer(args):
+                async with limit:
+                    await arun_dialogue_turn(*args)
+
+            await asyncio.gather(*(answer(args) for args in turns))
+
+        cpu = time.process_time()
+        start = time.perf_counter()
+        asyncio.run(answer_all())
+        return time.perf_counter() - start, time.process_time() - cpu
+
+    def report(self, label, turns, elapsed, cpu_seconds):
+        self.stdout.write(
+            f"{label}: {turns / elapsed:.1f} turns/s, "
+            f"{turns / max(cpu_seconds, 1e-9):.1f} turns per CPU-second "
+            f"({elapsed:.1f} s wall, {cpu_seconds:.1f} s CPU)",
+        )
@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from dialogmanagement.users.models import User
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils.tasks import PIPELINE_STAGES
+from dialogmanagement.utils.tasks import PIPELINES
+from dialogmanagement.utils.tasks import get_pipeline
+
+
+class Command(BaseCommand):
+    help = (
+        "Send dialogue turns through the running Celery workers in each "
+        "pipeline mode and compare end-to-end latency. Turns are real: they "
+        "call the provider and are saved to the user's history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", required=True)
+        parser.add_argument("--model-id", type=int, required=True)
+        parser.add_argument("--model-version-id", type=int, required=True)
+        parser.add_argument("--turns", type=int, default=20)
+        parser.add_argument(
+            "--modes",
+            nargs="+",
+            choices=list(PIPELINES),
+            default=list(PIPELINES),
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=120,
+            help="Seconds to wait for each turn.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist as err:
+            raise CommandError(str(err)) from err
+
+        for mode in options["modes"]:
+            start_turn = get_pipeline(mode)
+            before = metrics.get_counters()
+            latencies = []
+            for turn in range(options["turns"]):
+                start = time.perf_counter()
+                result = start_turn(
+                    user.id,
+                    f"Benchmark turn {turn}: reply with one word.",
+                    options["model_id"],
+                    options["model_version_id"],
+                    None,
+                )
+                result.get(timeout=options["timeout"])
+                latencies.append((time.perf_counter() - start) * 1000)
+            after = metrics.get_counters()
+            self.report(mode, latencies, before, after)
+
+    def report(self, mode, latencies, before, after):
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"{mode}: {len(latencies)} turns, "
+            f"mean {statistics.mean(latencies):.0f} ms, "
+            f"p50 {statistics.median(latencies):.0f} ms, "
+            f"p95 {p95:.0f} ms",
+        )
+        # Stage time spent inside the workers; the rest of the end-to-end
+        # latency is broker, result backend and worker pickup overhead.
+        delta = {name: after.get(name, 0) - before.get(name, 0) for name in after}
+        for stage in PIPELINE_STAGES:
+            average = metrics.average_ms(delta, stage)
+            if average is not None:
+                self.stdout.write(f"  {stage}: {average:.0f} ms")
@@ -0,0 +1,24 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from dialogmanagement.utils.write_behind import Flusher
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the answered turns queued by DIALOGUE_WRITE_BEHIND to the "
+        "database in batches, until stopped."
+    )
+
+    def handle(self, *args, **options):
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopping.set())
+        flusher = Flusher()
+        self.stdout.write(
+            f"Flushing dialogues in batches of up to {flusher.batch_size} rows "
+            f"every {flusher.interval_ms} ms.",
+        )
+        flusher.run(stop=stopping.is_set)
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dialogmanagement.utils import dialogue_partitions as partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the Dialogue table to monthly partitions by created_timestamp "
+        "while it stays in use. Safe to run again if interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10_000,
+            help="Rows copied per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if partitions.is_partitioned():
+            self.stdout.write("The Dialogue table is already partitioned.")
+            return
+        if partitions.table_exists(partitions.NEW_TABLE):
+            self.stdout.write(f"Resuming the copy into {partitions.NEW_TABLE}.")
+        else:
+            partitions.create_new_table(
+                timezone.now(),
+                settings.DIALOGUE_PARTITION_MONTHS_AHEAD,
+            )
+            self.stdout.write(f"Created {partitions.NEW_TABLE}; mirroring writes.")
+
+        batch_size = options["batch_size"]
+        first_id, last_id = partitions.id_range(partitions.TABLE)
+        copied = 0
+        for start in range(first_id, last_id + 1, batch_size):
+            copied += partitions.copy_batch(start, start + batch_size - 1)
+            self.stdout.write(f"Copied up to id {start + batch_size - 1}")
+        # Rows deleted while their batch was copied may have been copied
+        # anyway; deletes after the copy are mirrored.
+        pruned = sum(
+            partitions.prune_batch(start, start + batch_size - 1)
+            for start in range(first_id, last_id + 1, batch_size)
+        )
+
+        partitions.swap_tables()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Copied {copied} rows ({pruned} deleted meanwhile) and swapped "
+                f"in the partitioned table. Set DIALOGUE_PARTITIONED=true, and "
+                f"drop {partitions.OLD_TABLE} once satisfied.",
+            ),
+        )
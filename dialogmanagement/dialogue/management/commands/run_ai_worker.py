@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from config import celery_app
+from dialogmanagement.utils.ai_worker import AsyncAIWorker
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the AI tasks of the provider queues on one asyncio event loop, "
+        "with many provider calls in flight at once. Run one per core."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queues",
+            nargs="+",
+            default=sorted(set(settings.AI_PROVIDER_QUEUES.values())),
+            help="Queues to consume; only AI tasks may be routed to them.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=sum(settings.AI_PROVIDER_CONCURRENCY.values()),
+            help="Most turns in flight in this process.",
+        )
+
+    def handle(self, *args, **options):
+        if celery_app.conf.task_default_queue in options["queues"]:
+            err = (
+                "The default queue also carries tasks without a coroutine; "
+                "give each provider a queue of its own in AI_PROVIDER_QUEUES."
+            )
+            raise CommandError(err)
+        self.stdout.write(
+            f"Consuming {', '.join(options['queues'])} with up to "
+            f"{options['concurrency']} turns in flight.",
+        )
+        AsyncAIWorker(options["queues"], options["concurrency"]).run()
@@ -0,0 +1,34 @@
+# Keeps Dialogue.search_vector current from inside Postgres so that writes
+# only pay for the row being inserted or updated.
+
+from django.db import migrations
+
+CREATE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION dialogue_dialogue_search_vector_update()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector(COALESCE(NEW.content, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dialogue_dialogue_search_vector_trigger
+BEFORE INSERT OR UPDATE OF content ON dialogue_dialogue
+FOR EACH ROW EXECUTE FUNCTION dialogue_dialogue_search_vector_update();
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS dialogue_dialogue_search_vector_trigger ON dialogue_dialogue;
+DROP FUNCTION IF EXISTS dialogue_dialogue_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dialogue', '0003_dialogue_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGGER_SQL, reverse_sql=DROP_TRIGGER_SQL),
+    ]
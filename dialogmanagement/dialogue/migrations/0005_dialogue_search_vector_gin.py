@@ -0,0 +1,19 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Build the index without locking the table against writes.
+    atomic = False
+
+    dependencies = [
+        ('dialogue', '0004_dialogue_search_vector_trigger'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='dialogue',
+            index=GinIndex(fields=['search_vector'], name='dialogue_search_vector_gin'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the table against writes.
+    atomic = False
+
+    dependencies = [
+        ('dialogue', '0005_dialogue_search_vector_gin'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='dialogue',
+            index=models.Index(condition=models.Q(('status', 'COMPLETE')), fields=['user', 'id'], name='dialogue_user_completed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='dialogue',
+            index=models.Index(fields=['user', 'created_timestamp'], name='dialogue_user_created_idx'),
+        ),
+    ]
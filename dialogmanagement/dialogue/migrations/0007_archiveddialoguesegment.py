@@ -0,0 +1,35 @@
+# Generated by Django 5.0.13 on 2026-10-18 17:39
+
+import dialogmanagement.dialogue.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dialogue', '0006_dialogue_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDialogueSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to=dialogmanagement.dialogue.models.archive_segment_path)),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('first_created', models.DateTimeField()),
+                ('last_created', models.DateTimeField()),
+                ('row_count', models.PositiveIntegerField()),
+                ('created_timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_dialogue_segments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'first_id'], name='archived_segment_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Indexes the rows written before the trigger of 0004 existed, which only
+# covers new writes. Runs in batches of ids, each committed on its own, so
+# the table is never locked as a whole.
+
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Max
+from django.db.models import Min
+
+BATCH_SIZE = 1000
+
+
+def backfill_search_vector(apps, schema_editor):
+    Dialogue = apps.get_model('dialogue', 'Dialogue')
+    bounds = Dialogue.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return
+    for start in range(bounds['first'], bounds['last'] + 1, BATCH_SIZE):
+        Dialogue.objects.filter(
+            id__gte=start,
+            id__lt=start + BATCH_SIZE,
+            search_vector__isnull=True,
+        ).update(search_vector=SearchVector('content'))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('dialogue', '0007_archiveddialoguesegment'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+from asgiref.sync import sync_to_async
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.postgres.search import SearchVectorField
+from django.db import connection
 from django.db import models
 from django.utils import timezone
 
@@ -8,6 +11,23 @@ from dialogmanagement.utils.dialogue_types import StatusType
 from dialogmanagement.utils.dialogue_types import UserType
 
 
+class DialogueManager(models.Manager):
+    def reserve_id(self) -> int:
+        """
+        Take the next id from the table's sequence, so a row written later by
+        a Celery task can be referred to before it exists.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id'))",
+                [self.model._meta.db_table],  # noqa: SLF001
+            )
+            return cursor.fetchone()[0]
+
+    async def areserve_id(self) -> int:
+        return await sync_to_async(self.reserve_id)()
+
+
 # Create your models here.
 class Dialogue(models.Model):
     user = models.ForeignKey(
@@ -39,7 +59,63 @@ class Dialogue(models.Model):
     )
     created_timestamp = models.DateTimeField(default=timezone.now)
     updated_timestamp = models.DateTimeField(auto_now=True)
+    # Filled by the `dialogue_dialogue_search_vector_trigger` database trigger
+    # on insert and on content updates (see migration 0004).
     search_vector = SearchVectorField(null=True)
 
+    objects = DialogueManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="dialogue_search_vector_gin"),
+            # History list: one user's COMPLETED rows, walked by id.
+            models.Index(
+                fields=["user", "id"],
+                condition=models.Q(status=StatusType.COMPLETED),
+                name="dialogue_user_completed_idx",
+            ),
+            # Latest dialogue lookup in `update-dialogue`.
+            models.Index(
+                fields=["user", "created_timestamp"],
+                name="dialogue_user_created_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.id}-{self.user.username}"
+
+
+def archive_segment_path(segment, filename):
+    return f"dialogue_archive/{segment.user_id}/{filename}"
+
+
+class ArchivedDialogueSegment(models.Model):
+    """
+    A compressed JSONL file of one user's dialogues moved out of the Dialogue
+    table by `archive_old_dialogues`, indexed by the ids it holds.
+    """
+
+    user = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        related_name="archived_dialogue_segments",
+    )
+    file = models.FileField(upload_to=archive_segment_path)
+    # Ids in between may still be in the Dialogue table or another segment.
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    first_created = models.DateTimeField()
+    last_created = models.DateTimeField()
+    row_count = models.PositiveIntegerField()
+    created_timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "first_id"],
+                name="archived_segment_user_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.first_id}-{self.last_id}"
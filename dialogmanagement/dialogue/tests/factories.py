@@ -0,0 +1,49 @@
+from django.contrib.auth.models import Permission
+from factory import SubFactory
+from factory import Trait
+from factory import post_generation
+from factory.django import DjangoModelFactory
+
+from dialogmanagement.ai_model.models import AIModel
+from dialogmanagement.ai_model.models import ModelVersion
+from dialogmanagement.users.tests.factories import UserFactory
+from dialogmanagement.utils.dialogue_types import GeminiModelType
+from dialogmanagement.utils.dialogue_types import GPTModelType
+from dialogmanagement.utils.dialogue_types import ModelType
+
+
+class ModelFactory(DjangoModelFactory[AIModel]):
+    name = ModelType.CHATGPT
+
+    class Meta:
+        model = AIModel
+        django_get_or_create = ["name"]
+
+
+class ModelVersionFactory(DjangoModelFactory[ModelVersion]):
+    """A ChatGPT version by default; pass `gemini=True` for a Gemini one."""
+
+    ai_model = SubFactory(ModelFactory)
+    name = GPTModelType.GPT_4O
+
+    class Params:
+        gemini = Trait(
+            ai_model=SubFactory(ModelFactory, name=ModelType.GEMINI),
+            name=GeminiModelType.GEMINI_2_0_FLASH,
+        )
+
+    class Meta:
+        model = ModelVersion
+
+
+class DialogueUserFactory(UserFactory):
+    """A user allowed to list and start dialogues."""
+
+    @post_generation
+    def permissions(self, create: bool, extracted, **kwargs):  # noqa: FBT001
+        if create:
+            self.user_permissions.add(
+                *Permission.objects.filter(
+                    codename__in=["view_dialogue", "add_dialogue"],
+                ),
+            )
@@ -0,0 +1,43 @@
+from unittest.mock import MagicMock
+
+import httpx
+import openai
+from google.genai import errors as genai_errors
+
+from dialogmanagement.utils.ai_service import BaseAIModel
+
+
+def openai_stream(*texts):
+    """Build the chunks of a streamed OpenAI chat completion."""
+    chunks = []
+    for text in texts:
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = text
+        chunks.append(chunk)
+    return chunks
+
+
+def genai_error(code: int) -> genai_errors.APIError:
+    response = httpx.Response(code, json={"error": {"message": "", "status": ""}})
+    return genai_errors.APIError(code, response)
+
+
+def openai_error(code: int) -> openai.APIStatusError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(code, request=request)
+    return openai.APIStatusError("", response=response, body=None)
+
+
+# Create a mock subclass to implement the abstract provider methods
+class MockAIModel(BaseAIModel):
+    def __init__(self, model_version):
+        super().__init__(model_version)
+
+    def stream_completion(self, system_prompt, messages):
+        yield "Mock response"
+
+    async def astream_completion(self, system_prompt, messages):
+        yield "Mock response"
+
+    def generate_summary(self, transcript):
+        return "Mock summary"
@@ -0,0 +1,209 @@
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.test import TestCase
+
+from dialogmanagement.ai_model.models import AIModel
+from dialogmanagement.ai_model.models import ModelVersion
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.dialogue.tests.fakes import MockAIModel
+from dialogmanagement.dialogue.tests.fakes import openai_stream
+from dialogmanagement.users.models import User
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils.ai_clients import track_connection_reuse
+from dialogmanagement.utils.ai_service import BaseAIModel
+from dialogmanagement.utils.ai_service import ChatGPTModel
+from dialogmanagement.utils.ai_service import GeminiModel
+from dialogmanagement.utils.chat_history import assistant_message
+from dialogmanagement.utils.chat_history import user_message
+from dialogmanagement.utils.dialogue_types import StatusType
+from dialogmanagement.utils.dialogue_types import UserType
+from dialogmanagement.utils.error_handle import NotFoundError
+
+
+class ChatGPTModelTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Test-User")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        self.chat_model = ChatGPTModel(self.model_version)
+
+    def test_client_is_shared_across_instances(self):
+        other = ChatGPTModel(self.model_version)
+
+        self.assertIs(other.client, self.chat_model.client)  # noqa: PT009
+
+    @patch.object(ChatGPTModel, "chat_with_ai", return_value="Mocked response")
+    def test_chat_with_ai(self, mock_chat):
+        # Test if chat_with_ai function is correctly mocked.
+        response = self.chat_model.chat_with_ai(self.user.id, "Hello")
+        # Assertions
+        self.assertEqual(response, "Mocked response")  # noqa: PT009
+        mock_chat.assert_called_once_with(self.user.id, "Hello")
+
+
+class GeminiModelTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Test-User")
+        self.ai_model = AIModel.objects.create(name="gemini")
+        self.model_version = ModelVersion.objects.create(
+            name="gemini-2.0-flash",
+            ai_model=self.ai_model,
+        )
+        self.gemini_model = GeminiModel(self.model_version)
+
+    @patch.object(GeminiModel, "chat_with_ai", return_value="Mocked response")
+    def test_chat_with_ai(self, mock_chat):
+        """Test if chat_with_ai function is correctly mocked."""
+
+        response = self.gemini_model.chat_with_ai(self.user.id, "Hello")
+
+        # Assertions
+        self.assertEqual(response, "Mocked response")  # noqa: PT009
+        mock_chat.assert_called_once_with(self.user.id, "Hello")
+
+
+class TestBaseAIModel(TestCase):
+    def setUp(self):
+        """Common setup for all tests."""
+        self.mock_model_version = MagicMock(spec=ModelVersion)
+        self.mock_model_version.ai_model = MagicMock()  # Mock AIModel
+        self.mock_model_version.name = "test-model"
+
+        self.ai_model = MockAIModel(
+            self.mock_model_version,
+        )  # Abstract class, only used for testing utility methods
+
+    def test_provider_without_async_or_summary_hooks_cannot_be_created(self):
+        class SyncOnlyModel(BaseAIModel):
+            def stream_completion(self, system_prompt, messages):
+                yield "Mock response"
+
+        with self.assertRaises(TypeError):  # noqa: PT027
+            SyncOnlyModel(self.mock_model_version)  # type: ignore[abstract]
+
+    @patch("dialogmanagement.dialogue.models.Dialogue.objects.create")
+    @patch("django.utils.timezone.now")
+    def test_save_ai_response_success(
+        self,
+        mock_now,
+        mock_create_dialogue,
+    ):
+        # Mock timestamp
+        mock_now.return_value = "2025-03-17T12:00:00Z"
+
+        # Call the method under test
+        self.ai_model.save_ai_response(user_id=1, text="Test AI response")
+
+        # Assertions: foreign keys are passed as ids, nothing is fetched.
+        mock_create_dialogue.assert_called_once_with(
+            user_id=1,
+            status=StatusType.COMPLETED,
+            content="Test AI response",
+            type=UserType.AI,
+            model_id=self.mock_model_version.ai_model_id,
+            model_version_id=self.mock_model_version.id,
+            created_timestamp="2025-03-17T12:00:00Z",
+        )
+
+    @patch("dialogmanagement.dialogue.models.Dialogue.objects.create")
+    def test_save_ai_response_user_not_found(self, mock_create_dialogue):
+        """Test handling when user is not found."""
+        mock_create_dialogue.side_effect = IntegrityError(
+            "violates foreign key constraint",
+        )  # Simulate missing user
+
+        with self.assertRaises(NotFoundError) as context:  # noqa: PT027
+            self.ai_model.save_ai_response(user_id=999, text="Test AI response")
+
+        self.assertEqual(str(context.exception), "User 999 does not exist.")  # noqa: PT009
+
+    @patch("dialogmanagement.dialogue.models.Dialogue.objects.filter")
+    def test_update_dialogue_status_success(self, mock_filter):
+        """Test that dialogue status is updated correctly."""
+        mock_query_set = mock_filter.return_value  # Mock queryset
+        mock_query_set.update = MagicMock()
+
+        self.ai_model.update_dialogue_status(dialogue_id=5)
+
+        mock_filter.assert_called_once_with(id=5)  # Ensure it filters correctly
+        mock_query_set.update.assert_called_once_with(status=StatusType.COMPLETED)
+
+
+class StreamChatTestCase(TestCase):
+    def setUp(self):
+        self.model_version = ModelVersionFactory(gemini=True)
+        self.model = self.model_version.ai_model
+        self.gemini_model = GeminiModel(self.model_version)
+        self.gemini_model.client = MagicMock()
+        self.gemini_model.history(user_id=1).clear()
+        metrics.reset()
+
+    def test_stream_yields_chunks_and_records_turn(self):
+        self.gemini_model.client.models.generate_content_stream.return_value = [
+            MagicMock(text="Hel"),
+            MagicMock(text=""),
+            MagicMock(text="lo!"),
+        ]
+        publisher = MagicMock()
+
+        chunks = list(self.gemini_model.stream_chat(1, "Hi", publisher))
+
+        self.assertEqual(chunks, ["Hel", "lo!"])  # noqa: PT009
+        self.assertEqual(publisher.delta.call_count, 2)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            self.gemini_model.history(user_id=1).load(),
+            [user_message("Hi"), assistant_message("Hello!")],
+        )
+        self.assertEqual(metrics.get_counters()["gemini.ttft.count"], 1)  # noqa: PT009
+
+    async def test_async_stream_on_async_client(self):
+        async def completion(*texts):
+            for chunk in openai_stream(*texts):
+                yield chunk
+
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(
+            return_value=completion("Hi", None, "\nthere"),
+        )
+        chat_model = ChatGPTModel(self.model_version)
+        await sync_to_async(chat_model.history(user_id=1).clear)()
+        publisher = MagicMock(adelta=AsyncMock())
+
+        with patch(
+            "dialogmanagement.utils.ai_service.get_async_openai_client",
+            return_value=client,
+        ):
+            response = await chat_model.achat_with_ai(1, "Hello", publisher)
+
+        self.assertEqual(response, "Hi there")  # noqa: PT009
+        self.assertEqual(publisher.adelta.await_count, 2)  # noqa: PT009
+        self.assertTrue(  # noqa: PT009
+            client.chat.completions.create.call_args.kwargs["stream"],
+        )
+        history = await sync_to_async(chat_model.history(user_id=1).load)()
+        self.assertEqual(  # noqa: PT009
+            history,
+            [user_message("Hello"), assistant_message("Hi there")],
+        )
+
+
+class ConnectionReuseMetricTestCase(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_reuse_rate_counts_new_connections_per_request(self):
+        on_request = track_connection_reuse("openai")
+        for _ in range(4):
+            request = MagicMock(extensions={})
+            on_request(request)
+        # Only the first request had to open a connection.
+        request.extensions["trace"]("connection.connect_tcp.complete", {})
+
+        counters = metrics.get_counters()
+
+        self.assertEqual(counters["openai.requests"], 4)  # noqa: PT009
+        self.assertEqual(metrics.connection_reuse_rate(counters, "openai"), 0.75)  # noqa: PT009
@@ -0,0 +1,89 @@
+import concurrent.futures
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+
+from celery import states
+from django.test import TestCase
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.users.tests.factories import UserFactory
+from dialogmanagement.utils import ai_worker
+from dialogmanagement.utils.ai_service import ChatGPTModel
+from dialogmanagement.utils.ai_worker import AsyncAIWorker
+from dialogmanagement.utils.dialogue_types import StatusType
+from dialogmanagement.utils.tasks import run_dialogue_turn
+from dialogmanagement.utils.tasks import update_search_vector
+
+
+# The test case's transaction must survive the worker's per-task check.
+@patch("dialogmanagement.utils.ai_worker.close_old_connections")
+class AsyncAIWorkerTestCase(TestCase):
+    def setUp(self):
+        self.user = UserFactory(username="worker-user")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        ChatGPTModel(self.model_version).history(self.user.id).clear()
+        self.worker = AsyncAIWorker(["openai"], concurrency=10)
+
+    async def stream_completion(self, system_prompt, messages):
+        for chunk in ("Hi", " there"):
+            yield chunk
+
+    async def test_runs_turn_message(self, mock_close):
+        body = [
+            [self.user.id, "Hello", self.model.id, self.model_version.id, None],
+            {},
+            {},
+        ]
+        headers = {"task": run_dialogue_turn.name, "id": "task-1"}
+
+        with (
+            patch.object(ChatGPTModel, "astream_completion", self.stream_completion),
+            patch.object(self.worker, "store_result", AsyncMock()) as store,
+        ):
+            await self.worker.handle(body, headers)
+
+        rows = [
+            row
+            async for row in Dialogue.objects.filter(user=self.user)
+            .order_by("id")
+            .values_list("id", "content", "status")
+        ]
+        question_id = rows[0][0]
+        self.assertEqual(  # noqa: PT009
+            rows,
+            [
+                (question_id, "Hello", StatusType.COMPLETED),
+                (rows[1][0], "Hi there", StatusType.COMPLETED),
+            ],
+        )
+        store.assert_awaited_once_with("task-1", question_id, states.SUCCESS)
+
+    async def test_sends_task_without_coroutine_to_default_queue(self, mock_close):
+        headers = {"task": update_search_vector.name, "id": "task-2"}
+
+        with (
+            patch.object(self.worker, "store_result", AsyncMock()) as store,
+            patch("dialogmanagement.utils.ai_worker.celery_app.send_task") as send,
+        ):
+            await self.worker.handle([[50], {}, {}], headers)
+
+        store.assert_not_awaited()
+        send.assert_called_once_with(
+            update_search_vector.name,
+            args=[50],
+            kwargs={},
+            task_id="task-2",
+            eta=None,
+            queue="celery",
+        )
+
+    def test_unhandled_message_is_requeued(self, mock_close):
+        failed: concurrent.futures.Future[None] = concurrent.futures.Future()
+        failed.set_exception(RuntimeError("broker down"))
+        done: concurrent.futures.Future[None] = concurrent.futures.Future()
+        done.set_result(None)
+
+        self.assertFalse(ai_worker.handled(failed))  # noqa: PT009
+        self.assertTrue(ai_worker.handled(done))  # noqa: PT009
@@ -0,0 +1,112 @@
+import datetime
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from dialogmanagement.dialogue.models import ArchivedDialogueSegment
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.dialogue.tests.factories import DialogueUserFactory
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.users.tests.factories import UserFactory
+from dialogmanagement.utils import dialogue_archive
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils.dialogue_types import StatusType
+from dialogmanagement.utils.tasks import archive_old_dialogues
+
+
+class DialogueArchiveTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = self.settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = DialogueUserFactory(username="historian")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        self.now = timezone.now()
+        self.old = [
+            self.create(f"old message {i}", self.now - datetime.timedelta(days=200))
+            for i in range(5)
+        ]
+        self.recent = [self.create(f"recent message {i}") for i in range(2)]
+
+    def create(self, content, created=None, user=None):
+        return Dialogue.objects.create(
+            user=user or self.user,
+            status=StatusType.COMPLETED,
+            content=content,
+            model=self.model,
+            model_version=self.model_version,
+            created_timestamp=created or timezone.now(),
+        )
+
+    def archive(self):
+        cutoff = self.now - datetime.timedelta(days=90)
+        return dialogue_archive.archive_old_dialogues(cutoff, batch_size=2)
+
+    def test_old_dialogues_move_to_segments(self):
+        result = self.archive()
+
+        self.assertEqual(result["rows"], 5)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            list(Dialogue.objects.order_by("id").values_list("id", flat=True)),
+            [d.id for d in self.recent],
+        )
+        segments = ArchivedDialogueSegment.objects.order_by("first_id")
+        self.assertEqual(  # noqa: PT009
+            [(s.first_id, s.last_id, s.row_count) for s in segments],
+            [
+                (self.old[0].id, self.old[1].id, 2),
+                (self.old[2].id, self.old[3].id, 2),
+                (self.old[4].id, self.old[4].id, 1),
+            ],
+        )
+        counters = metrics.get_counters()
+        self.assertEqual(counters["archive.rows"], 5)  # noqa: PT009
+        self.assertEqual(counters["archive.segments"], 3)  # noqa: PT009
+        self.assertGreater(counters["archive.hot_bytes"], 0)  # noqa: PT009
+        self.assertEqual(self.archive()["rows"], 0)  # noqa: PT009
+
+    def test_archived_dialogues_read_back_in_order(self):
+        self.archive()
+
+        dialogues = list(dialogue_archive.archived_dialogues(self.user))
+
+        self.assertEqual(  # noqa: PT009
+            [(d.id, d.content, d.created_timestamp) for d in dialogues],
+            [(d.id, d.content, d.created_timestamp) for d in self.old],
+        )
+
+    def test_retrieve_reads_through_to_the_archive(self):
+        other = UserFactory(username="stranger")
+        self.archive()
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        archived = client.get(f"/api/dialogue/{self.old[3].id}/")
+        hot = client.get(f"/api/dialogue/{self.recent[0].id}/")
+        client.force_authenticate(other)
+        other.user_permissions.add(*self.user.user_permissions.all())
+        foreign = client.get(f"/api/dialogue/{self.old[3].id}/")
+
+        self.assertEqual(archived.status_code, 200)  # noqa: PT009
+        self.assertEqual(archived.data["content"], "old message 3")  # noqa: PT009
+        self.assertEqual(archived.data["username"], "historian")  # noqa: PT009
+        self.assertEqual(hot.data["content"], "recent message 0")  # noqa: PT009
+        self.assertEqual(foreign.status_code, 404)  # noqa: PT009
+
+    def test_task_does_nothing_until_configured(self):
+        self.assertIsNone(archive_old_dialogues())  # noqa: PT009
+
+        with override_settings(DIALOGUE_ARCHIVE_AFTER_DAYS=90):
+            result = archive_old_dialogues()
+
+        self.assertEqual(result["rows"], 5)  # noqa: PT009
+        self.assertEqual(Dialogue.objects.count(), 2)  # noqa: PT009
@@ -0,0 +1,90 @@
+import time
+
+from django.test import TestCase
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+
+from dialogmanagement.ai_model.catalog import CATALOG_CHANNEL
+from dialogmanagement.ai_model.catalog import ModelCatalog
+from dialogmanagement.ai_model.catalog import catalog
+from dialogmanagement.ai_model.models import ModelVersion
+from dialogmanagement.dialogue.tests.factories import DialogueUserFactory
+from dialogmanagement.dialogue.tests.factories import ModelFactory
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.utils.ai_service import AIModelFactory
+from dialogmanagement.utils.error_handle import NotFoundError
+
+
+class ModelCatalogTestCase(TestCase):
+    def setUp(self):
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        catalog.invalidate()
+
+    def test_lookups_are_served_from_memory(self):
+        AIModelFactory.get_model(self.model.id, self.model_version.id)
+
+        with self.assertNumQueries(0):
+            chat_model = AIModelFactory.get_model(self.model.id, self.model_version.id)
+            self.assertEqual(str(chat_model.model_version), "chatgpt - gpt-4o")  # noqa: PT009
+
+    def test_unknown_ids_raise_not_found(self):
+        with self.assertRaises(NotFoundError):  # noqa: PT027
+            AIModelFactory.get_model(self.model.id, self.model_version.id + 1000)
+
+    def test_misses_reload_at_most_once_per_interval(self):
+        catalog.get_version(self.model_version.id)
+        unknown = self.model_version.id + 1000
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(catalog.get_version(unknown))  # noqa: PT009
+        catalog._loaded_at -= ModelCatalog.MISS_RELOAD_INTERVAL  # noqa: SLF001
+        with self.assertNumQueries(2):
+            self.assertIsNone(catalog.get_version(unknown))  # noqa: PT009
+        with self.assertNumQueries(0):
+            self.assertIsNone(catalog.get_version(unknown))  # noqa: PT009
+
+    def version_name(self) -> str:
+        version = catalog.get_version(self.model_version.id)
+        assert version is not None
+        return version.name
+
+    def test_save_invalidates_catalog(self):
+        catalog.get_version(self.model_version.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ModelVersion.objects.filter(pk=self.model_version.pk).update(name="gpt-4")
+            self.model_version.refresh_from_db()
+            self.model_version.save()
+
+        self.assertEqual(self.version_name(), "gpt-4")  # noqa: PT009
+
+    def test_invalidation_from_another_process(self):
+        catalog.get_version(self.model_version.id)
+        # Another process renamed the version and published the change.
+        ModelVersion.objects.filter(pk=self.model_version.pk).update(name="gpt-4")
+        get_redis_connection("default").publish(CATALOG_CHANNEL, b"1")
+
+        deadline = time.monotonic() + 5
+        while self.version_name() != "gpt-4":
+            self.assertLess(time.monotonic(), deadline)  # noqa: PT009
+            time.sleep(0.05)
+
+    def test_create_rejects_version_of_another_model(self):
+        user = DialogueUserFactory(username="creator")
+        gemini = ModelFactory(name="gemini")
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        response = client.post(
+            "/api/dialogue/",
+            {
+                "content": "Hello",
+                "model_id": gemini.id,
+                "model_version_id": self.model_version.id,
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)  # noqa: PT009
+        self.assertIn("model_version_id", response.json())  # noqa: PT009
@@ -0,0 +1,138 @@
+import typing
+from typing import cast
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from dialogmanagement.utils.ai_service import ChatGPTModel
+from dialogmanagement.utils.ai_service import GeminiModel
+from dialogmanagement.utils.chat_history import ChatHistoryManager
+from dialogmanagement.utils.chat_history import assistant_message
+from dialogmanagement.utils.chat_history import count_message_tokens
+from dialogmanagement.utils.chat_history import user_message
+from dialogmanagement.utils.error_handle import AIModelError
+
+if typing.TYPE_CHECKING:
+    from django_redis.cache import RedisCache
+
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.dialogue.tests.fakes import openai_stream
+
+
+class ChatHistoryManagerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.history = ChatHistoryManager("openai", user_id=1, token_budget=40)
+        self.messages = [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": "x" * 40}
+            for i in range(6)
+        ]
+
+    def test_window_keeps_newest_messages_within_budget(self):
+        window = self.history.window(self.messages)
+
+        self.assertEqual(window, self.messages[-2:])  # noqa: PT009
+        self.assertLessEqual(  # noqa: PT009
+            sum(count_message_tokens(m) for m in window),
+            self.history.token_budget,
+        )
+
+    def test_window_always_keeps_newest_message(self):
+        long_message = {"role": "user", "content": "x" * 1000}
+
+        self.assertEqual(self.history.window([long_message]), [long_message])  # noqa: PT009
+
+    def test_compact_folds_old_turns_into_summary(self):
+        self.history.append(*self.messages)
+        summarize = MagicMock(return_value="they talked about x")
+
+        self.history.compact(summarize)
+
+        summarize.assert_called_once_with("", self.messages[:-1])
+        self.assertEqual(self.history.get_summary(), "they talked about x")  # noqa: PT009
+        self.assertEqual(self.history.load(), self.messages[-1:])  # noqa: PT009
+
+    def test_compact_keeps_turns_appended_meanwhile(self):
+        self.history.append(*self.messages)
+        new_turn = [user_message("still there?"), assistant_message("yes")]
+
+        def summarize(summary, messages):
+            self.history.append(*new_turn)
+            return "they talked about x"
+
+        self.history.compact(summarize)
+
+        self.assertEqual(self.history.load(), [self.messages[-1], *new_turn])  # noqa: PT009
+
+    def test_compact_keeps_turns_when_no_summary_comes_back(self):
+        chat_model = ChatGPTModel(ModelVersionFactory())
+        chat_model.client = MagicMock()
+        completion = chat_model.client.chat.completions.create.return_value
+        completion.choices = [MagicMock(message=MagicMock(content=None))]
+        self.history.append(*self.messages)
+
+        with self.assertRaises(AIModelError):  # noqa: PT027
+            self.history.compact(chat_model.summarize)
+
+        self.assertEqual(self.history.get_summary(), "")  # noqa: PT009
+        self.assertEqual(self.history.load(), self.messages)  # noqa: PT009
+
+    def test_compact_keeps_turns_when_gemini_sends_no_summary(self):
+        gemini_model = GeminiModel(ModelVersionFactory(gemini=True))
+        gemini_model.client = MagicMock()
+        gemini_model.client.models.generate_content.return_value.text = ""
+        self.history.append(*self.messages)
+
+        with self.assertRaises(AIModelError):  # noqa: PT027
+            self.history.compact(gemini_model.summarize)
+
+        self.assertEqual(self.history.get_summary(), "")  # noqa: PT009
+        self.assertEqual(self.history.load(), self.messages)  # noqa: PT009
+
+    def test_append_keeps_the_summary_alive(self):
+        cache.set(self.history.summary_key, "they talked about x", timeout=5)
+
+        self.history.append(user_message("still there?"))
+
+        self.assertGreater(  # noqa: PT009
+            cast("RedisCache", cache).ttl(self.history.summary_key),
+            ChatHistoryManager.CACHE_TIMEOUT - 5,
+        )
+
+    def test_recent_reads_only_the_window(self):
+        self.history.WINDOW_MESSAGES = 2
+        self.history.append(*self.messages)
+
+        recent, length = self.history.recent()
+
+        self.assertEqual(recent, self.messages[-2:])  # noqa: PT009
+        self.assertEqual(length, len(self.messages))  # noqa: PT009
+
+    @patch("dialogmanagement.utils.tasks.compact_chat_history.delay")
+    def test_chat_sends_bounded_prompt_and_schedules_compaction(self, mock_delay):
+        model_version = ModelVersionFactory(context_token_budget=40)
+        chat_model = ChatGPTModel(model_version)
+        chat_model.history(user_id=1).append(*self.messages)
+        chat_model.client = MagicMock()
+        chat_model.client.chat.completions.create.return_value = openai_stream(
+            "Mocked",
+            " response",
+        )
+
+        response = chat_model.chat_with_ai(1, "Hello")
+
+        sent = chat_model.client.chat.completions.create.call_args.kwargs["messages"]
+        self.assertEqual(response, "Mocked response")  # noqa: PT009
+        self.assertEqual(sent[-1], {"role": "user", "content": "Hello"})  # noqa: PT009
+        self.assertLess(len(sent), len(self.messages) + 2)  # noqa: PT009
+        mock_delay.assert_called_once_with(
+            1,
+            model_version.ai_model_id,
+            model_version.id,
+        )
+        self.assertEqual(  # noqa: PT009
+            chat_model.history(user_id=1).load()[-2:],
+            [user_message("Hello"), assistant_message("Mocked response")],
+        )
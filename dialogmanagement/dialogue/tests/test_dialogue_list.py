@@ -0,0 +1,108 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.dialogue.tests.factories import DialogueUserFactory
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.utils.dialogue_cache import bump_dialogue_version
+from dialogmanagement.utils.dialogue_types import StatusType
+
+
+class DialogueListPaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = DialogueUserFactory(username="reader")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        self.dialogues = [
+            Dialogue.objects.create(
+                user=self.user,
+                status=StatusType.COMPLETED,
+                content=f"message {i}",
+                model=self.model,
+                model_version=self.model_version,
+            )
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ids(self, response):
+        return [row["id"] for row in response.json()["results"]]
+
+    def test_list_returns_latest_page_oldest_first(self):
+        response = self.client.get("/api/dialogue/?page_size=2")
+
+        self.assertEqual(response.status_code, 200)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            self.ids(response),
+            [self.dialogues[3].id, self.dialogues[4].id],
+        )
+        self.assertEqual(response.json()["before"], self.dialogues[3].id)  # noqa: PT009
+        self.assertEqual(response.json()["after"], self.dialogues[4].id)  # noqa: PT009
+
+    def test_list_walks_back_with_before(self):
+        response = self.client.get(
+            f"/api/dialogue/?page_size=3&before={self.dialogues[3].id}",
+        )
+
+        self.assertEqual(  # noqa: PT009
+            self.ids(response),
+            [d.id for d in self.dialogues[:3]],
+        )
+        self.assertIsNone(response.json()["before"])  # noqa: PT009
+
+    def test_list_fetches_newer_rows_with_after(self):
+        response = self.client.get(
+            f"/api/dialogue/?page_size=2&after={self.dialogues[1].id}",
+        )
+
+        self.assertEqual(  # noqa: PT009
+            self.ids(response),
+            [self.dialogues[2].id, self.dialogues[3].id],
+        )
+        self.assertEqual(response.json()["after"], self.dialogues[3].id)  # noqa: PT009
+
+    def test_list_after_newest_row_is_empty(self):
+        newest = self.dialogues[-1].id
+        response = self.client.get(f"/api/dialogue/?after={newest}")
+
+        self.assertEqual(self.ids(response), [])  # noqa: PT009
+        self.assertEqual(response.json()["after"], newest)  # noqa: PT009
+
+
+class DialogueListCacheTestCase(TestCase):
+    def setUp(self):
+        self.user = DialogueUserFactory(username="cached-reader")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_dialogue(self, content):
+        return Dialogue.objects.create(
+            user=self.user,
+            status=StatusType.COMPLETED,
+            content=content,
+            model=self.model,
+            model_version=self.model_version,
+        )
+
+    def test_repeated_list_is_served_from_cache(self):
+        self.create_dialogue("hello")
+        first = self.client.get("/api/dialogue/")
+
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/dialogue/")
+
+        self.assertEqual(second.json(), first.json())  # noqa: PT009
+
+    def test_version_bump_invalidates_cached_pages(self):
+        self.create_dialogue("hello")
+        self.client.get("/api/dialogue/")
+
+        reply = self.create_dialogue("hi there")
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_dialogue_version(self.user.id)
+        response = self.client.get("/api/dialogue/")
+
+        self.assertEqual(response.json()["results"][-1]["id"], reply.id)  # noqa: PT009
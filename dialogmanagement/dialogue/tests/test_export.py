@@ -0,0 +1,139 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import tempfile
+import typing
+from typing import cast
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.utils import dialogue_archive
+from dialogmanagement.utils.dialogue_types import StatusType
+
+if typing.TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+    from collections.abc import Iterator
+
+    from django.http import StreamingHttpResponse
+
+from dialogmanagement.dialogue.tests.factories import DialogueUserFactory
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.users.tests.factories import UserFactory
+
+
+@override_settings(DIALOGUE_EXPORT_CHUNK_SIZE=2)
+class DialogueExportTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = self.settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = DialogueUserFactory(username="exporter")
+        model_version = ModelVersionFactory()
+        model = model_version.ai_model
+        now = timezone.now()
+        self.dialogues = [
+            Dialogue.objects.create(
+                user=self.user,
+                status=StatusType.COMPLETED,
+                content=f'message {i}, with "quotes"\nand a newline',
+                model=model,
+                model_version=model_version,
+                created_timestamp=now - datetime.timedelta(days=200 - 50 * i),
+            )
+            for i in range(5)
+        ]
+        Dialogue.objects.create(
+            user=UserFactory(username="someone-else"),
+            content="not mine",
+            model=model,
+        )
+        dialogue_archive.archive_old_dialogues(
+            now - datetime.timedelta(days=90),
+            batch_size=10,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_export_streams_ndjson_archived_rows_included(self):
+        response = self.client.get("/api/dialogue/export/")
+        chunks = list(response)
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")  # noqa: PT009
+        self.assertEqual(len(chunks), 3)  # noqa: PT009
+        rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+        self.assertEqual(  # noqa: PT009
+            [(row["id"], row["content"]) for row in rows],
+            [(d.id, d.content) for d in self.dialogues],
+        )
+        self.assertEqual(  # noqa: PT009
+            rows[0]["created_timestamp"],
+            DjangoJSONEncoder().default(self.dialogues[0].created_timestamp),
+        )
+
+    @override_settings(DIALOGUE_EXPORT_CHUNK_SIZE=2)
+    def test_export_streams_rows_as_they_are_read_over_wsgi(self):
+        response = cast(
+            "StreamingHttpResponse",
+            self.client.get("/api/dialogue/export/"),
+        )
+        content = cast("Iterator[bytes]", response.streaming_content)
+
+        with CaptureQueriesContext(connection) as queries:
+            first = next(content)
+
+        self.assertFalse(response.is_async)  # noqa: PT009
+        self.assertEqual(len(first.splitlines()), 2)  # noqa: PT009
+        # The first chunk comes from the archive; the table is not read yet.
+        self.assertFalse(  # noqa: PT009
+            any('FROM "dialogue_dialogue"' in q["sql"] for q in queries),
+        )
+        self.assertEqual(len(list(content)), 2)  # noqa: PT009
+
+    async def test_export_streams_over_asgi(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = cast(
+            "StreamingHttpResponse",
+            await self.async_client.get("/api/dialogue/export/"),
+        )
+        streaming_content = cast("AsyncIterator[bytes]", response.streaming_content)
+        chunks = [chunk async for chunk in streaming_content]
+
+        self.assertTrue(response.is_async)  # noqa: PT009
+        rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+        self.assertEqual(  # noqa: PT009
+            [row["id"] for row in rows],
+            [d.id for d in self.dialogues],
+        )
+
+    def test_export_as_csv(self):
+        response = self.client.get("/api/dialogue/export/?format=csv")
+
+        self.assertEqual(response["Content-Type"], "text/csv")  # noqa: PT009
+        rows = list(csv.reader(io.StringIO(b"".join(response).decode())))
+        self.assertEqual(rows[0][:4], ["id", "status", "type", "content"])  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            [(int(row[0]), row[3]) for row in rows[1:]],
+            [(d.id, d.content) for d in self.dialogues],
+        )
+
+    def test_export_is_gzipped_for_clients_that_accept_it(self):
+        plain = b"".join(self.client.get("/api/dialogue/export/"))
+        response = self.client.get(
+            "/api/dialogue/export/",
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")  # noqa: PT009
+        self.assertEqual(gzip.decompress(b"".join(response)), plain)  # noqa: PT009
@@ -0,0 +1,207 @@
+import asyncio
+import concurrent.futures
+import threading
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase
+from django_redis import get_redis_connection
+from google.genai import errors as genai_errors
+
+from dialogmanagement.ai_model.catalog import catalog
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.dialogue.tests.fakes import genai_error
+from dialogmanagement.utils import hedging
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils.ai_service import GeminiModel
+from dialogmanagement.utils.chat_history import assistant_message
+from dialogmanagement.utils.chat_history import user_message
+
+
+class HedgingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        fallback_version = ModelVersionFactory(
+            gemini=True,
+            name="gemini-2.0-flash-lite",
+        )
+        self.model_version = ModelVersionFactory(
+            gemini=True,
+            fallback_version=fallback_version,
+            hedge_enabled=True,
+        )
+        self.primary = GeminiModel(self.model_version)
+        self.fallback = GeminiModel(fallback_version)
+        self.stub(self.fallback, "stream_completion", lambda *args: iter(["Fallback"]))
+        for model_ in (self.primary, self.fallback):
+            model_.history(user_id=1).clear()
+        patcher = patch.object(
+            self.primary,
+            "fallback_model",
+            return_value=self.fallback,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stub(self, model_: GeminiModel, method: str, new: object):
+        patcher = patch.object(model_, method, new)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record_samples(self, elapsed_ms: float):
+        for _ in range(hedging.MIN_SAMPLES):
+            hedging.record_ttft(self.model_version.id, elapsed_ms)
+
+    def test_hedge_delay_is_p95_of_samples(self):
+        self.assertIsNone(hedging.hedge_delay(self.model_version.id))  # noqa: PT009
+        for elapsed_ms in range(1, 101):
+            hedging.record_ttft(self.model_version.id, elapsed_ms)
+
+        self.assertEqual(hedging.hedge_delay(self.model_version.id), 0.095)  # noqa: PT009
+
+    def test_fast_primary_is_not_hedged(self):
+        self.record_samples(1000)
+        self.stub(self.primary, "stream_completion", lambda *args: iter(["Primary"]))
+
+        reply = self.primary.chat_with_ai(1, "Hi")
+
+        self.assertEqual(reply, "Primary")  # noqa: PT009
+        self.assertNotIn("hedge.requests", metrics.get_counters())  # noqa: PT009
+
+    def test_slow_primary_is_hedged(self):
+        self.record_samples(10)
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_stream(*args):
+            release.wait(5)
+            yield "Primary"
+
+        self.stub(self.primary, "stream_completion", slow_stream)
+        publisher = MagicMock()
+
+        reply = self.primary.chat_with_ai(1, "Hi", publisher)
+
+        self.assertEqual(reply, "Fallback")  # noqa: PT009
+        publisher.delta.assert_called_once_with("Fallback")
+        counters = metrics.get_counters()
+        self.assertEqual(counters["hedge.requests"], 1)  # noqa: PT009
+        self.assertEqual(counters["hedge.wins"], 1)  # noqa: PT009
+        self.assertGreater(counters["hedge.tokens"], 0)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            self.primary.history(user_id=1).load(),
+            [user_message("Hi"), assistant_message("Fallback")],
+        )
+
+    def test_failed_primary_fails_over(self):
+        self.stub(
+            self.primary,
+            "stream_completion",
+            MagicMock(side_effect=genai_error(400)),
+        )
+
+        reply = self.primary.chat_with_ai(1, "Hi")
+
+        self.assertEqual(reply, "Fallback")  # noqa: PT009
+        counters = metrics.get_counters()
+        self.assertEqual(counters["hedge.failovers"], 1)  # noqa: PT009
+        self.assertNotIn("hedge.requests", counters)  # noqa: PT009
+
+    def test_primary_error_is_raised_when_both_fail(self):
+        self.stub(
+            self.primary,
+            "stream_completion",
+            MagicMock(side_effect=genai_error(400)),
+        )
+        self.stub(
+            self.fallback,
+            "stream_completion",
+            MagicMock(side_effect=genai_error(403)),
+        )
+
+        with self.assertRaises(genai_errors.APIError) as raised:  # noqa: PT027
+            self.primary.chat_with_ai(1, "Hi")
+
+        self.assertEqual(raised.exception.code, 400)  # noqa: PT009
+
+    def test_sync_races_share_the_process_pool(self):
+        self.stub(self.primary, "stream_completion", lambda *args: iter(["Primary"]))
+
+        with patch.object(hedging, "pool", wraps=hedging.pool) as pool:
+            self.primary.chat_with_ai(1, "Hi")
+            self.primary.chat_with_ai(2, "Hi")
+
+        self.assertEqual(pool.submit.call_count, 2)  # noqa: PT009
+
+    def test_abandoned_read_not_started_is_cancelled(self):
+        read: concurrent.futures.Future[str | None] = concurrent.futures.Future()
+        stream = MagicMock()
+
+        hedging.abandon({read: stream})
+
+        self.assertTrue(read.cancelled())  # noqa: PT009
+        stream.close.assert_called_once_with()
+
+    async def test_async_hedge_cancels_primary(self):
+        await sync_to_async(self.record_samples)(10)
+        cancelled = asyncio.Event()
+
+        async def slow_stream(*args):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            yield "Primary"
+
+        async def fallback_stream(*args):
+            yield "Fallback"
+
+        self.stub(self.primary, "astream_completion", slow_stream)
+        self.stub(self.fallback, "astream_completion", fallback_stream)
+
+        reply = await self.primary.achat_with_ai(1, "Hi")
+
+        self.assertEqual(reply, "Fallback")  # noqa: PT009
+        self.assertTrue(cancelled.is_set())  # noqa: PT009
+        # The cancelled call still counts as a sample of its latency.
+        samples = await sync_to_async(get_redis_connection("default").llen)(
+            hedging.samples_key(self.model_version.id),
+        )
+        self.assertEqual(samples, hedging.MIN_SAMPLES + 1)  # noqa: PT009
+
+    async def test_async_fallback_loads_an_empty_catalog(self):
+        catalog.invalidate()
+        model = GeminiModel(self.model_version)
+
+        async def primary_stream(*args):
+            yield "Primary"
+
+        self.stub(model, "astream_completion", primary_stream)
+
+        with patch("dialogmanagement.utils.ai_service.get_genai_client"):
+            reply = await model.achat_with_ai(1, "Hi")
+
+        self.assertEqual(reply, "Primary")  # noqa: PT009
+
+    def test_fallback_model_comes_from_catalog(self):
+        model = GeminiModel(self.model_version)
+
+        with patch("dialogmanagement.utils.ai_service.get_genai_client"):
+            fallback = model.fallback_model()
+        assert fallback is not None
+
+        self.assertEqual(  # noqa: PT009
+            fallback.model_version.id,
+            self.model_version.fallback_version_id,
+        )
+        self.assertIsNone(GeminiModel(self.fallback.model_version).fallback_model())  # noqa: PT009
+
+    def test_version_cannot_be_its_own_fallback(self):
+        self.model_version.fallback_version = self.model_version
+
+        with self.assertRaises(ValueError):  # noqa: PT027
+            self.model_version.save()
@@ -0,0 +1,222 @@
+import datetime
+import io
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db import connection
+from django.db import transaction
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.dialogue.tests.factories import DialogueUserFactory
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.users.tests.factories import UserFactory
+from dialogmanagement.utils import dialogue_partitions
+from dialogmanagement.utils.dialogue_types import StatusType
+
+
+class DialoguePartitionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = DialogueUserFactory(username="archivist")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        now = timezone.now()
+        self.dialogues = [
+            self.create(f"message {i}", now - datetime.timedelta(days=40 * (4 - i)))
+            for i in range(5)
+        ]
+
+    def create(self, content, created=None):
+        return Dialogue.objects.create(
+            user=self.user,
+            status=StatusType.COMPLETED,
+            content=content,
+            model=self.model,
+            model_version=self.model_version,
+            created_timestamp=created or timezone.now(),
+        )
+
+    def partitions(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname FROM pg_inherits JOIN pg_class ON oid = inhrelid "
+                "WHERE inhparent = %s::regclass ORDER BY relname",
+                [dialogue_partitions.TABLE],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {table}")  # noqa: S608
+            return cursor.fetchone()[0]
+
+    def test_command_moves_rows_to_monthly_partitions(self):
+        call_command("partition_dialogues", batch_size=2, stdout=io.StringIO())
+
+        self.assertTrue(dialogue_partitions.is_partitioned())  # noqa: PT009
+        self.assertEqual(Dialogue.objects.count(), 5)  # noqa: PT009
+        self.assertEqual(self.count(dialogue_partitions.OLD_TABLE), 5)  # noqa: PT009
+        oldest = dialogue_partitions.month_start(self.dialogues[0].created_timestamp)
+        partitions = self.partitions()
+        self.assertIn(dialogue_partitions.DEFAULT_PARTITION, partitions)  # noqa: PT009
+        partitions.remove(dialogue_partitions.DEFAULT_PARTITION)
+        self.assertEqual(  # noqa: PT009
+            partitions[0],
+            dialogue_partitions.partition_name(oldest),
+        )
+        self.assertGreaterEqual(len(partitions), 6)  # noqa: PT009
+
+    def test_partitioned_table_continues_ids_and_indexes_content(self):
+        call_command("partition_dialogues", stdout=io.StringIO())
+
+        reserved = Dialogue.objects.reserve_id()
+        dialogue = self.create("A new partitioned hello")
+
+        self.assertGreater(reserved, self.dialogues[-1].id)  # noqa: PT009
+        self.assertGreater(dialogue.id, reserved)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            list(
+                Dialogue.objects.filter(search_vector="partitioned").values_list(
+                    "id",
+                    flat=True,
+                ),
+            ),
+            [dialogue.id],
+        )
+
+    def test_writes_during_the_copy_are_mirrored(self):
+        dialogue_partitions.create_new_table(timezone.now(), 1)
+        added = self.create("written during the copy")
+        Dialogue.objects.filter(id=self.dialogues[1].id).update(content="edited")
+        Dialogue.objects.filter(id=self.dialogues[2].id).delete()
+
+        first_id, last_id = dialogue_partitions.id_range(dialogue_partitions.TABLE)
+        dialogue_partitions.copy_batch(first_id, last_id)
+        dialogue_partitions.swap_tables()
+
+        self.assertEqual(  # noqa: PT009
+            list(Dialogue.objects.order_by("id").values_list("content", flat=True)),
+            ["message 0", "edited", "message 3", "message 4", added.content],
+        )
+
+    def test_mirrored_write_to_a_month_without_a_partition_is_kept(self):
+        now = timezone.now()
+        dialogue_partitions.create_new_table(now, 0)
+        later = now + datetime.timedelta(days=100)
+        month = dialogue_partitions.partition_name(
+            dialogue_partitions.month_start(later),
+        )
+
+        self.create("from a later month", later)
+
+        self.assertFalse(dialogue_partitions.table_exists(month))  # noqa: PT009
+        self.assertEqual(self.count(dialogue_partitions.DEFAULT_PARTITION), 1)  # noqa: PT009
+        self.assertEqual(dialogue_partitions.ensure_partitions(later, 0), [month])  # noqa: PT009
+        self.assertEqual(self.count(dialogue_partitions.DEFAULT_PARTITION), 0)  # noqa: PT009
+        self.assertEqual(self.count(month), 1)  # noqa: PT009
+
+    def test_command_refuses_a_partitioned_table(self):
+        call_command("partition_dialogues", stdout=io.StringIO())
+        out = io.StringIO()
+
+        call_command("partition_dialogues", stdout=out)
+
+        self.assertIn("already partitioned", out.getvalue())  # noqa: PT009
+
+    def test_ensure_partitions_creates_months_ahead(self):
+        later = timezone.now() + datetime.timedelta(days=365)
+        self.assertEqual(dialogue_partitions.ensure_partitions(later, 1), [])  # noqa: PT009
+        call_command("partition_dialogues", stdout=io.StringIO())
+
+        created = dialogue_partitions.ensure_partitions(later, 1)
+
+        month = dialogue_partitions.month_start(later)
+        self.assertEqual(  # noqa: PT009
+            created,
+            [
+                dialogue_partitions.partition_name(month),
+                dialogue_partitions.partition_name(
+                    dialogue_partitions.add_months(month, 1),
+                ),
+            ],
+        )
+        self.assertEqual(dialogue_partitions.ensure_partitions(later, 1), [])  # noqa: PT009
+
+    @override_settings(DIALOGUE_PARTITIONED=True, DIALOGUE_PARTITION_SLACK=60)
+    def test_cursor_pages_are_bounded_by_time(self):
+        call_command("partition_dialogues", stdout=io.StringIO())
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            before = client.get(
+                f"/api/dialogue/?page_size=2&before={self.dialogues[3].id}",
+            )
+        page_sql = queries.captured_queries[-1]["sql"]
+        after = client.get(
+            f"/api/dialogue/?page_size=2&after={self.dialogues[1].id}",
+        )
+
+        self.assertEqual(  # noqa: PT009
+            [row["id"] for row in before.data["results"]],
+            [self.dialogues[1].id, self.dialogues[2].id],
+        )
+        self.assertEqual(  # noqa: PT009
+            [row["id"] for row in after.data["results"]],
+            [self.dialogues[2].id, self.dialogues[3].id],
+        )
+        self.assertIn('"created_timestamp" <', page_sql)  # noqa: PT009
+
+
+class DialoguePartitionCopyTestCase(TransactionTestCase):
+    def setUp(self):
+        model_version = ModelVersionFactory()
+        self.dialogue = Dialogue.objects.create(
+            user=UserFactory(username="copier"),
+            content="before the copy",
+            model=model_version.ai_model,
+            model_version=model_version,
+        )
+        dialogue_partitions.create_new_table(timezone.now(), 1)
+        self.addCleanup(self.drop_new_table)
+
+    def drop_new_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(dialogue_partitions.DROP_MIRROR_SQL)
+            cursor.execute(f"DROP TABLE {dialogue_partitions.NEW_TABLE}")
+
+    def test_update_during_a_batch_waits_for_its_copy(self):
+        errors = []
+
+        def update():
+            try:
+                Dialogue.objects.filter(id=self.dialogue.id).update(content="edited")
+            except DatabaseError as err:
+                errors.append(err)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=update)
+        with transaction.atomic():
+            dialogue_partitions.copy_batch(self.dialogue.id, self.dialogue.id)
+            writer.start()
+            # The update's mirror insert is now blocked by the uncommitted copy.
+            time.sleep(0.2)
+        writer.join()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT content FROM {dialogue_partitions.NEW_TABLE}",  # noqa: S608
+            )
+            copies = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(errors, [])  # noqa: PT009
+        self.assertEqual(copies, ["edited"])  # noqa: PT009
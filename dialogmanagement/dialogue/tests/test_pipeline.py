@@ -0,0 +1,116 @@
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase
+from django.test import override_settings
+
+from dialogmanagement.ai_model.catalog import catalog
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.users.tests.factories import UserFactory
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils.ai_service import ChatGPTModel
+from dialogmanagement.utils.dialogue_stream import read_stream_buffer
+from dialogmanagement.utils.dialogue_types import StatusType
+from dialogmanagement.utils.dialogue_types import UserType
+from dialogmanagement.utils.error_handle import NotFoundError
+from dialogmanagement.utils.tasks import PIPELINE_STAGES
+from dialogmanagement.utils.tasks import DialogueAITask
+from dialogmanagement.utils.tasks import create_user_dialogue
+from dialogmanagement.utils.tasks import enqueue_dialogue_turn
+from dialogmanagement.utils.tasks import run_dialogue_turn
+
+
+class DialoguePipelineTestCase(TestCase):
+    def setUp(self):
+        self.user = UserFactory(username="pipeline-user")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        metrics.reset()
+
+    @patch.object(
+        ChatGPTModel,
+        "stream_completion",
+        return_value=iter(["Hi", " there"]),
+    )
+    def test_fused_turn_inserts_and_answers(self, mock_stream):
+        dialogue_id = run_dialogue_turn(
+            self.user.id,
+            "Hello",
+            self.model.id,
+            self.model_version.id,
+        )
+
+        events = read_stream_buffer(self.user.id, dialogue_id)
+        self.assertEqual(  # noqa: PT009
+            [(e["seq"], e["event"], e["text"]) for e in events],
+            [(1, "delta", "Hi"), (2, "delta", " there"), (3, "done", "")],
+        )
+        question, answer = Dialogue.objects.filter(user=self.user).order_by("id")
+        self.assertEqual(question.id, dialogue_id)  # noqa: PT009
+        self.assertEqual(question.status, StatusType.COMPLETED)  # noqa: PT009
+        self.assertEqual(answer.content, "Hi there")  # noqa: PT009
+        self.assertEqual(answer.type, UserType.AI)  # noqa: PT009
+        counters = metrics.get_counters()
+        for stage in PIPELINE_STAGES:
+            self.assertEqual(counters[f"{stage}.count"], 1)  # noqa: PT009
+
+    @override_settings(DIALOGUE_PIPELINE_MODE="fused")
+    @patch.object(run_dialogue_turn, "apply_async")
+    def test_enqueue_uses_configured_mode(self, mock_apply):
+        enqueue_dialogue_turn(self.user.id, "Hello", self.model.id, 1)
+
+        mock_apply.assert_called_once_with(
+            (self.user.id, "Hello", self.model.id, 1, None),
+            queue="openai",
+        )
+
+    @override_settings(DIALOGUE_PIPELINE_MODE="batched")
+    def test_enqueue_rejects_unknown_mode(self):
+        with self.assertRaises(ImproperlyConfigured):  # noqa: PT027
+            enqueue_dialogue_turn(self.user.id, "Hello", self.model.id, 1)
+
+
+class DialogueTurnPersistenceTestCase(TestCase):
+    def setUp(self):
+        self.user = UserFactory(username="turn-user")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        self.dialogue_id = create_user_dialogue(
+            self.user.id,
+            "Hello",
+            self.model.id,
+            self.model_version.id,
+        )
+        # Warm the model catalog, as any earlier turn in the process would.
+        catalog.get_version(self.model_version.id)
+
+    @patch.object(ChatGPTModel, "chat_with_ai", return_value="Hi there")
+    def test_turn_query_budget(self, mock_chat):
+        # SELECT content, then UPDATE status and INSERT the reply inside a
+        # savepoint (a transaction outside of tests).
+        with self.assertNumQueries(5):
+            DialogueAITask().respond(
+                self.dialogue_id,
+                self.user.id,
+                self.model.id,
+                self.model_version.id,
+            )
+
+        question, answer = Dialogue.objects.filter(user=self.user).order_by("id")
+        self.assertEqual(question.status, StatusType.COMPLETED)  # noqa: PT009
+        self.assertEqual(answer.content, "Hi there")  # noqa: PT009
+
+    def test_persist_turn_for_unknown_user(self):
+        chat_model = ChatGPTModel(self.model_version)
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        with self.assertRaises(NotFoundError):  # noqa: PT027
+            chat_model.persist_turn(self.dialogue_id, self.user.id + 1000, "Hi there")
+
+        self.assertEqual(  # noqa: PT009
+            Dialogue.objects.get(id=self.dialogue_id).status,
+            StatusType.ACTIVE,
+        )
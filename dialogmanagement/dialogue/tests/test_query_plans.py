@@ -0,0 +1,116 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from dialogmanagement.ai_model.models import AIModel
+from dialogmanagement.ai_model.models import ModelVersion
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.dialogue.tests.factories import DialogueUserFactory
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.dialogue.tests.fakes import MockAIModel
+from dialogmanagement.users.models import User
+from dialogmanagement.utils.dialogue_types import StatusType
+from dialogmanagement.utils.dialogue_types import UserType
+
+
+class DialogueQueryPlanTestCase(TestCase):
+    """
+    Run every dialogue query an endpoint issues through `EXPLAIN` against a
+    seeded table, and fail if Postgres plans a sequential scan for any of them.
+    """
+
+    USERS = 20
+    DIALOGUES_PER_USER = 200
+
+    users: list[User]
+    model: AIModel
+    model_version: ModelVersion
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.model_version = ModelVersionFactory()
+        cls.model = cls.model_version.ai_model
+        cls.users = [
+            DialogueUserFactory(username=f"plan-user-{i}") for i in range(cls.USERS)
+        ]
+        Dialogue.objects.bulk_create(
+            Dialogue(
+                user=user,
+                status=StatusType.COMPLETED if i % 4 else StatusType.ACTIVE,
+                content=f"message number {i} about topic{i % 50}",
+                type=UserType.USER if i % 2 else UserType.AI,
+                model=cls.model,
+                model_version=cls.model_version,
+            )
+            for user in cls.users
+            for i in range(cls.DIALOGUES_PER_USER)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE dialogue_dialogue")
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.users[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def dialogue_plans(self, queries):
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if "dialogue_dialogue" not in query["sql"]:
+                    continue
+                cursor.execute(f"EXPLAIN {query['sql']}")
+                plans.append("\n".join(row[0] for row in cursor.fetchall()))
+        self.assertTrue(plans)  # noqa: PT009
+        return plans
+
+    def assert_no_seq_scan(self, queries):
+        for plan in self.dialogue_plans(queries):
+            self.assertNotIn("Seq Scan", plan)  # noqa: PT009
+
+    def capture(self, func):
+        with CaptureQueriesContext(connection) as captured:
+            func()
+        return captured.captured_queries
+
+    def test_list_plans(self):
+        first_page = self.capture(lambda: self.client.get("/api/dialogue/"))
+        self.assert_no_seq_scan(first_page)
+
+        before = self.client.get("/api/dialogue/").json()["before"]
+        older_page = self.capture(
+            lambda: self.client.get(f"/api/dialogue/?before={before}"),
+        )
+        self.assert_no_seq_scan(older_page)
+
+        newer_page = self.capture(
+            lambda: self.client.get(f"/api/dialogue/?after={before}"),
+        )
+        self.assert_no_seq_scan(newer_page)
+
+    def test_update_dialogue_plan(self):
+        queries = self.capture(
+            lambda: self.client.put("/api/dialogue/update-dialogue/"),
+        )
+        self.assert_no_seq_scan(queries)
+
+    def test_search_plan(self):
+        queries = self.capture(
+            lambda: self.client.post(
+                "/api/dialogue/search-dialogue/",
+                {"keyword": "topic7"},
+                format="json",
+            ),
+        )
+        self.assert_no_seq_scan(queries)
+
+    def test_update_dialogue_status_plan(self):
+        dialogue = Dialogue.objects.filter(user=self.user).earliest("id")
+        ai_model = MockAIModel(self.model_version)
+        queries = self.capture(
+            lambda: ai_model.update_dialogue_status(dialogue.id),
+        )
+        self.assert_no_seq_scan(queries)
@@ -0,0 +1,74 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test import override_settings
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.users.tests.factories import UserFactory
+from dialogmanagement.utils import rate_limit
+from dialogmanagement.utils.ai_service import ChatGPTModel
+from dialogmanagement.utils.dialogue_stream import read_stream_buffer
+from dialogmanagement.utils.dialogue_types import StatusType
+from dialogmanagement.utils.tasks import chat_with_ai_task
+from dialogmanagement.utils.tasks import run_dialogue_turn
+
+
+@override_settings(
+    AI_PROVIDER_RATE_LIMITS={
+        "openai": {"requests_per_minute": 2, "tokens_per_minute": 1000},
+    },
+)
+class RateLimitTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory(username="rate-user")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+
+    def test_bucket_limits_requests_per_minute(self):
+        waits = [rate_limit.acquire("openai", 10) for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0, 0])  # noqa: PT009
+        self.assertAlmostEqual(waits[2], 30, delta=1)  # noqa: PT009
+
+    def test_bucket_limits_tokens_per_minute(self):
+        self.assertEqual(rate_limit.acquire("openai", 900), 0)  # noqa: PT009
+        wait = rate_limit.acquire("openai", 400)
+
+        self.assertAlmostEqual(wait, 18, delta=1)  # noqa: PT009
+        # The refused call took nothing from the request bucket.
+        self.assertEqual(rate_limit.acquire("openai", 100), 0)  # noqa: PT009
+
+    def test_unlimited_provider_is_never_throttled(self):
+        waits = [rate_limit.acquire("gemini", 10**6) for _ in range(5)]
+
+        self.assertEqual(waits, [0] * 5)  # noqa: PT009
+
+    @patch.object(chat_with_ai_task, "apply_async")
+    @patch.object(ChatGPTModel, "stream_completion")
+    def test_throttled_turn_is_deferred(self, mock_stream, mock_apply):
+        rate_limit.acquire("openai", 0)
+        rate_limit.acquire("openai", 0)
+
+        dialogue_id = run_dialogue_turn(
+            self.user.id,
+            "Hello",
+            self.model.id,
+            self.model_version.id,
+        )
+
+        mock_stream.assert_not_called()
+        mock_apply.assert_called_once()
+        self.assertEqual(  # noqa: PT009
+            mock_apply.call_args.args[0],
+            (dialogue_id, self.user.id, self.model.id, self.model_version.id),
+        )
+        self.assertEqual(mock_apply.call_args.kwargs["queue"], "openai")  # noqa: PT009
+        self.assertGreater(mock_apply.call_args.kwargs["countdown"], 0)  # noqa: PT009
+        self.assertEqual(read_stream_buffer(self.user.id, dialogue_id), [])  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            Dialogue.objects.get(id=dialogue_id).status,
+            StatusType.ACTIVE,
+        )
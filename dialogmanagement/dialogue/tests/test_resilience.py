@@ -0,0 +1,159 @@
+import time
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import httpx
+import openai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from django.test import override_settings
+from google.genai import errors as genai_errors
+
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.dialogue.tests.fakes import genai_error
+from dialogmanagement.dialogue.tests.fakes import openai_error
+from dialogmanagement.dialogue.tests.fakes import openai_stream
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils.ai_service import ChatGPTModel
+from dialogmanagement.utils.ai_service import GeminiModel
+from dialogmanagement.utils.error_handle import AIModelError
+from dialogmanagement.utils.error_handle import CircuitOpenError
+from dialogmanagement.utils.resilience import FATAL
+from dialogmanagement.utils.resilience import THROTTLED
+from dialogmanagement.utils.resilience import TRANSIENT
+from dialogmanagement.utils.resilience import CircuitBreaker
+from dialogmanagement.utils.resilience import classify
+
+
+class ResilienceTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        backoff = patch("dialogmanagement.utils.ai_service.backoff", return_value=0)
+        backoff.start()
+        self.addCleanup(backoff.stop)
+        self.model_version = ModelVersionFactory(gemini=True)
+        self.model = self.model_version.ai_model
+        self.gemini_model = GeminiModel(self.model_version)
+        self.gemini_model.client = MagicMock()
+        self.stream = self.gemini_model.client.models.generate_content_stream
+        self.breaker = CircuitBreaker("gemini", self.model_version.id)
+        metrics.reset()
+
+    def test_classify(self):
+        request = httpx.Request("POST", "https://api.openai.com")
+        cases = [
+            (openai.APIConnectionError(request=request), TRANSIENT),
+            (httpx.ReadTimeout("", request=request), TRANSIENT),
+            (openai_error(503), TRANSIENT),
+            (openai_error(429), THROTTLED),
+            (openai_error(400), FATAL),
+            (genai_error(500), TRANSIENT),
+            (genai_error(429), THROTTLED),
+            (genai_error(403), FATAL),
+            (ValueError(), FATAL),
+        ]
+        for err, kind in cases:
+            self.assertEqual(classify(err), kind, err)  # noqa: PT009
+
+    def test_transient_failure_is_retried(self):
+        self.stream.side_effect = [genai_error(503), [MagicMock(text="Hello!")]]
+
+        chunks = list(self.gemini_model.stream_chat(1, "Hi", None))
+
+        self.assertEqual(chunks, ["Hello!"])  # noqa: PT009
+        self.assertEqual(self.stream.call_count, 2)  # noqa: PT009
+        self.assertEqual(metrics.get_counters()["gemini.retries"], 1)  # noqa: PT009
+
+    def test_fatal_failure_is_not_retried(self):
+        self.stream.side_effect = genai_error(400)
+
+        with self.assertRaises(genai_errors.APIError):  # noqa: PT027
+            list(self.gemini_model.stream_chat(1, "Hi", None))
+
+        self.assertEqual(self.stream.call_count, 1)  # noqa: PT009
+
+    def test_failure_after_first_chunk_is_not_retried(self):
+        def broken_stream(**kwargs):
+            yield MagicMock(text="Hel")
+            raise genai_error(503)
+
+        self.stream.side_effect = broken_stream
+
+        with self.assertRaises(genai_errors.APIError):  # noqa: PT027
+            list(self.gemini_model.stream_chat(1, "Hi", None))
+
+        self.assertEqual(self.stream.call_count, 1)  # noqa: PT009
+
+    @override_settings(AI_PROVIDER_MAX_ATTEMPTS=3, AI_CIRCUIT_FAILURE_THRESHOLD=3)
+    def test_circuit_opens_after_failures(self):
+        self.stream.side_effect = genai_error(503)
+
+        with self.assertRaises(genai_errors.APIError):  # noqa: PT027
+            list(self.gemini_model.stream_chat(1, "Hi", None))
+        with self.assertRaises(CircuitOpenError):  # noqa: PT027
+            list(self.gemini_model.stream_chat(1, "Hi again", None))
+
+        self.assertEqual(self.stream.call_count, 3)  # noqa: PT009
+
+    def test_throttling_does_not_open_circuit(self):
+        for _ in range(settings.AI_CIRCUIT_FAILURE_THRESHOLD):
+            self.stream.side_effect = [genai_error(429), [MagicMock(text="Ok")]]
+            list(self.gemini_model.stream_chat(1, "Hi", None))
+
+        self.breaker.check()
+
+    @override_settings(AI_CIRCUIT_FAILURE_THRESHOLD=1, AI_CIRCUIT_COOLDOWN=0)
+    def test_half_open_probe(self):
+        self.breaker.record_failure()
+
+        # The cooldown is over: the first caller probes, the next is refused
+        # until the probe settles.
+        self.breaker.check()
+        with self.assertRaises(CircuitOpenError):  # noqa: PT027
+            self.breaker.check()
+        self.breaker.record_success()
+        self.breaker.check()
+        self.breaker.check()
+
+    @override_settings(AI_CIRCUIT_FAILURE_THRESHOLD=2, AI_CIRCUIT_COOLDOWN=60)
+    def test_failed_probe_reopens_circuit(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        with patch(
+            "dialogmanagement.utils.resilience.time.time",
+            return_value=time.time() + 61,
+        ):
+            self.breaker.check()
+            self.breaker.record_failure()
+            with self.assertRaises(CircuitOpenError):  # noqa: PT027
+                self.breaker.check()
+
+    async def test_async_transient_failure_is_retried(self):
+        async def completion(*texts):
+            for chunk in openai_stream(*texts):
+                yield chunk
+
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(
+            side_effect=[openai_error(502), completion("Hi")],
+        )
+        chat_model = ChatGPTModel(self.model_version)
+        await sync_to_async(chat_model.history(user_id=1).clear)()
+
+        with patch(
+            "dialogmanagement.utils.ai_service.get_async_openai_client",
+            return_value=client,
+        ):
+            response = await chat_model.achat_with_ai(1, "Hello", None)
+
+        self.assertEqual(response, "Hi")  # noqa: PT009
+        self.assertEqual(client.chat.completions.create.await_count, 2)  # noqa: PT009
+
+    def test_ai_model_error_is_raisable(self):
+        err = AIModelError("Unsupported model")
+
+        self.assertEqual(err.message, "Unsupported model")  # noqa: PT009
+        self.assertEqual(err.status_code, 400)  # noqa: PT009
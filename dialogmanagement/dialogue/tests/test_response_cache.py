@@ -0,0 +1,196 @@
+import asyncio
+import contextlib
+import threading
+import time
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test import override_settings
+
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils import response_cache
+from dialogmanagement.utils.ai_clients import provider_slot
+from dialogmanagement.utils.ai_service import GeminiModel
+from dialogmanagement.utils.chat_history import assistant_message
+from dialogmanagement.utils.chat_history import user_message
+from dialogmanagement.utils.single_flight import Flight
+from dialogmanagement.utils.single_flight import check_timeout
+
+
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.model_version = ModelVersionFactory(
+            gemini=True,
+            response_cache_enabled=True,
+        )
+        self.model = self.model_version.ai_model
+        self.gemini_model = GeminiModel(self.model_version)
+        self.gemini_model.client = MagicMock()
+        self.gemini_model.client.models.generate_content_stream.side_effect = (
+            lambda **kwargs: [MagicMock(text="Hello!")]
+        )
+
+    def test_repeated_prompt_is_served_from_cache(self):
+        first = self.gemini_model.chat_with_ai(1, "Hi")
+        publisher = MagicMock()
+        second = self.gemini_model.chat_with_ai(2, "  hi ", publisher)
+
+        self.assertEqual((first, second), ("Hello!", "Hello!"))  # noqa: PT009
+        stream = self.gemini_model.client.models.generate_content_stream
+        self.assertEqual(stream.call_count, 1)  # noqa: PT009
+        publisher.delta.assert_called_once_with("Hello!")
+        self.assertEqual(  # noqa: PT009
+            self.gemini_model.history(user_id=2).load(),
+            [user_message("  hi "), assistant_message("Hello!")],
+        )
+        self.assertEqual(  # noqa: PT009
+            response_cache.hit_rate(metrics.get_counters()),
+            0.5,
+        )
+
+    def test_different_window_misses(self):
+        self.gemini_model.chat_with_ai(1, "Hi")
+        self.gemini_model.chat_with_ai(1, "Hi")
+
+        stream = self.gemini_model.client.models.generate_content_stream
+        self.assertEqual(stream.call_count, 2)  # noqa: PT009
+
+    def test_disabled_by_default(self):
+        self.model_version.response_cache_enabled = False
+
+        self.gemini_model.chat_with_ai(1, "Hi")
+        self.gemini_model.chat_with_ai(2, "Hi")
+
+        stream = self.gemini_model.client.models.generate_content_stream
+        self.assertEqual(stream.call_count, 2)  # noqa: PT009
+        self.assertIsNone(response_cache.hit_rate(metrics.get_counters()))  # noqa: PT009
+
+    @override_settings(AI_RESPONSE_CACHE_MAX_ENTRIES=2)
+    def test_evicts_least_recently_used(self):
+        keys = [
+            response_cache.prompt_digest(1, {}, "", [user_message(text)])
+            for text in ("a", "b", "c")
+        ]
+        response_cache.put(keys[0], "A")
+        response_cache.put(keys[1], "B")
+        response_cache.get(keys[0])
+        response_cache.put(keys[2], "C")
+
+        self.assertEqual(  # noqa: PT009
+            [response_cache.get(key) for key in keys],
+            ["A", None, "C"],
+        )
+
+    async def test_async_lookup_shares_cache(self):
+        await sync_to_async(self.gemini_model.chat_with_ai)(1, "Hi")
+
+        async def fail(*args):
+            msg = "The provider should not be called."
+            raise AssertionError(msg)
+            yield
+
+        with patch.object(self.gemini_model, "astream_completion", fail):
+            response = await self.gemini_model.achat_with_ai(2, "Hi")
+
+        self.assertEqual(response, "Hello!")  # noqa: PT009
+
+
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.model_version = ModelVersionFactory(gemini=True)
+        self.model = self.model_version.ai_model
+        self.digest = response_cache.prompt_digest(1, {}, "", [user_message("Hi")])
+
+    def digest_of(self, ai_model):
+        system_prompt = ai_model.system_prompt("")
+        return ai_model.prompt_digest(system_prompt, [user_message("Hi")])
+
+    def test_concurrent_identical_calls_share_one_provider_call(self):
+        gemini_model = GeminiModel(self.model_version)
+        gemini_model.client = MagicMock()
+        release = threading.Event()
+
+        def generate_content_stream(**kwargs):
+            release.wait(5)
+            return [MagicMock(text="Hello!")]
+
+        stream = gemini_model.client.models.generate_content_stream
+        stream.side_effect = generate_content_stream
+        replies: dict[str, str] = {}
+        leader = threading.Thread(
+            target=lambda: replies.update(leader=gemini_model.chat_with_ai(1, "Hi")),
+        )
+        leader.start()
+        while not cache.has_key(f"ai_flight_{self.digest_of(gemini_model)}"):
+            time.sleep(0.01)
+        threading.Timer(0.1, release.set).start()
+
+        replies["follower"] = gemini_model.chat_with_ai(2, "Hi")
+        leader.join()
+
+        self.assertEqual(replies, {"leader": "Hello!", "follower": "Hello!"})  # noqa: PT009
+        self.assertEqual(stream.call_count, 1)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            gemini_model.history(user_id=2).load(),
+            [user_message("Hi"), assistant_message("Hello!")],
+        )
+
+    def test_failed_leader_releases_followers(self):
+        leader = Flight(self.digest)
+        self.assertIsNone(leader.join())  # noqa: PT009
+
+        def fail():
+            with contextlib.suppress(RuntimeError), leader:
+                raise RuntimeError
+
+        threading.Timer(0.1, fail).start()
+        start = time.monotonic()
+
+        self.assertIsNone(Flight(self.digest).join())  # noqa: PT009
+        self.assertLess(time.monotonic() - start, 1)  # noqa: PT009
+
+    @override_settings(AI_SINGLE_FLIGHT_TIMEOUT=0)
+    def test_disabled_with_zero_timeout(self):
+        first, second = Flight(self.digest), Flight(self.digest)
+
+        self.assertIsNone(first.join())  # noqa: PT009
+        self.assertIsNone(second.join())  # noqa: PT009
+        self.assertFalse(first.leader or second.leader)  # noqa: PT009
+
+    @override_settings(AI_SINGLE_FLIGHT_TIMEOUT=60, CELERY_TASK_SOFT_TIME_LIMIT=60)
+    def test_timeout_must_be_shorter_than_the_soft_time_limit(self):
+        with self.assertRaises(ImproperlyConfigured):  # noqa: PT027
+            check_timeout()
+
+    async def test_async_follower_gets_reply(self):
+        leader = Flight(self.digest)
+        self.assertIsNone(await leader.ajoin())  # noqa: PT009
+
+        async def finish():
+            await asyncio.sleep(0.1)
+            await leader.afinish("Hello!")
+
+        _, reply = await asyncio.gather(finish(), Flight(self.digest).ajoin())
+
+        self.assertEqual(reply, "Hello!")  # noqa: PT009
+
+    @override_settings(AI_PROVIDER_CONCURRENCY={"gemini": 1})
+    async def test_async_follower_holds_no_provider_slot(self):
+        gemini_model = GeminiModel(self.model_version)
+        leader = Flight(self.digest_of(gemini_model))
+        self.assertIsNone(await leader.ajoin())  # noqa: PT009
+
+        follower = asyncio.create_task(gemini_model.achat_with_ai(2, "Hi"))
+        await asyncio.sleep(0.1)
+        slot_taken = provider_slot(gemini_model.HISTORY_NAMESPACE).locked()
+        await leader.afinish("Hello!")
+
+        self.assertFalse(slot_taken)  # noqa: PT009
+        self.assertEqual(await follower, "Hello!")  # noqa: PT009
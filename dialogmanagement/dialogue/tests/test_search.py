@@ -0,0 +1,144 @@
+import importlib
+
+from django.apps import apps as django_apps
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.dialogue.tests.factories import DialogueUserFactory
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.users.tests.factories import UserFactory
+from dialogmanagement.utils.tasks import create_user_dialogue
+from dialogmanagement.utils.tasks import update_search_vector
+
+
+class SearchVectorTestCase(TestCase):
+    def setUp(self):
+        self.user = UserFactory(username="search-user")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+
+    def test_search_vector_filled_on_insert(self):
+        """The database trigger indexes a row as soon as it is written."""
+        dialogue_id = create_user_dialogue(
+            self.user.id,
+            "Tell me about penguins",
+            self.model.id,
+            self.model_version.id,
+        )
+
+        dialogue = Dialogue.objects.get(id=dialogue_id)
+        self.assertIn("penguin", dialogue.search_vector)  # noqa: PT009
+
+    def test_search_vector_follows_content_update(self):
+        """Editing content re-indexes only the edited row."""
+        dialogue_id = create_user_dialogue(
+            self.user.id,
+            "Tell me about penguins",
+            self.model.id,
+            self.model_version.id,
+        )
+        Dialogue.objects.filter(id=dialogue_id).update(content="Tell me about whales")
+
+        dialogue = Dialogue.objects.get(id=dialogue_id)
+        self.assertIn("whale", dialogue.search_vector)  # noqa: PT009
+        self.assertNotIn("penguin", dialogue.search_vector)  # noqa: PT009
+
+    def test_update_search_vector_backfills_missing_rows(self):
+        """The backfill task only touches rows without a vector."""
+        dialogue_id = create_user_dialogue(
+            self.user.id,
+            "Tell me about penguins",
+            self.model.id,
+            self.model_version.id,
+        )
+        Dialogue.objects.filter(id=dialogue_id).update(search_vector=None)
+
+        updated = update_search_vector(batch_size=1)
+
+        self.assertEqual(updated, 1)  # noqa: PT009
+        dialogue = Dialogue.objects.get(id=dialogue_id)
+        self.assertIn("penguin", dialogue.search_vector)  # noqa: PT009
+
+    def test_migration_backfills_rows_written_before_the_trigger(self):
+        dialogue_id = create_user_dialogue(
+            self.user.id,
+            "Tell me about penguins",
+            self.model.id,
+            self.model_version.id,
+        )
+        Dialogue.objects.filter(id=dialogue_id).update(search_vector=None)
+        migration = importlib.import_module(
+            "dialogmanagement.dialogue.migrations.0008_backfill_search_vector",
+        )
+
+        migration.backfill_search_vector(django_apps, None)
+
+        dialogue = Dialogue.objects.get(id=dialogue_id)
+        self.assertIn("penguin", dialogue.search_vector)  # noqa: PT009
+
+
+class DialogueSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = DialogueUserFactory(username="searcher")
+        self.other_user = UserFactory(username="someone-else")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_dialogue(self, user, content):
+        return Dialogue.objects.create(
+            user=user,
+            content=content,
+            model=self.model,
+            model_version=self.model_version,
+        )
+
+    def test_search_is_scoped_to_user(self):
+        mine = self.create_dialogue(self.user, "penguins live in Antarctica")
+        self.create_dialogue(self.other_user, "penguins cannot fly")
+        self.create_dialogue(self.user, "whales are mammals")
+
+        response = self.client.post(
+            "/api/dialogue/search-dialogue/",
+            {"keyword": "penguin"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            [row["id"] for row in response.json()["results"]],
+            [mine.id],
+        )
+        self.assertIsNone(response.json()["before"])  # noqa: PT009
+
+    def test_search_pages_with_before_cursor(self):
+        dialogues = [
+            self.create_dialogue(self.user, f"penguin fact {i}") for i in range(5)
+        ]
+
+        first = self.client.post(
+            "/api/dialogue/search-dialogue/?page_size=3",
+            {"keyword": "penguin"},
+            format="json",
+        )
+        second = self.client.post(
+            f"/api/dialogue/search-dialogue/?page_size=3&before={first.json()['before']}",
+            {"keyword": "penguin"},
+            format="json",
+        )
+
+        ids = [d.id for d in reversed(dialogues)]
+        self.assertEqual([r["id"] for r in first.json()["results"]], ids[:3])  # noqa: PT009
+        self.assertEqual([r["id"] for r in second.json()["results"]], ids[3:])  # noqa: PT009
+        self.assertIsNone(second.json()["before"])  # noqa: PT009
+
+    def test_search_requires_keyword(self):
+        response = self.client.post(
+            "/api/dialogue/search-dialogue/",
+            {"keyword": "  "},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)  # noqa: PT009
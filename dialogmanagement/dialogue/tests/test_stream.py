@@ -0,0 +1,252 @@
+import typing
+from typing import cast
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.utils.ai_service import ChatGPTModel
+from dialogmanagement.utils.dialogue_notifications import NewDialogueListener
+from dialogmanagement.utils.dialogue_stream import DialogueStreamPublisher
+from dialogmanagement.utils.dialogue_stream import arelay_dialogue_stream
+from dialogmanagement.utils.dialogue_stream import relay_dialogue_stream
+from dialogmanagement.utils.dialogue_types import StatusType
+from dialogmanagement.utils.subscriber import get_subscriber
+from dialogmanagement.utils.tasks import create_user_dialogue
+
+if typing.TYPE_CHECKING:
+    from django.http import StreamingHttpResponse
+
+from dialogmanagement.dialogue.tests.factories import DialogueUserFactory
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+
+
+class DialogueStreamTestCase(TestCase):
+    def setUp(self):
+        self.user = DialogueUserFactory(username="stream-user")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @patch("dialogmanagement.dialogue.api.views.enqueue_dialogue_turn")
+    def test_create_returns_reserved_dialogue_id(self, mock_enqueue):
+        response = self.client.post(
+            "/api/dialogue/",
+            {
+                "content": "Hello",
+                "model_id": self.model.id,
+                "model_version_id": self.model_version.id,
+            },
+            format="json",
+        )
+
+        dialogue_id = response.json()["dialogue_id"]
+        self.assertEqual(  # noqa: PT009
+            mock_enqueue.call_args.kwargs["dialogue_id"],
+            dialogue_id,
+        )
+        create_user_dialogue(
+            self.user.id,
+            "Hello",
+            self.model.id,
+            self.model_version.id,
+            dialogue_id,
+        )
+        self.assertTrue(Dialogue.objects.filter(id=dialogue_id).exists())  # noqa: PT009
+
+    async def test_relay_replays_buffer_then_live_events(self):
+        dialogue_id = 10**9
+        publisher = DialogueStreamPublisher(self.user.id, dialogue_id)
+        publisher.delta("Hel")
+
+        relay = arelay_dialogue_stream(self.user.id, dialogue_id, max_duration=5)
+        first = await anext(relay)
+        publisher.delta("lo")
+        publisher.done()
+        rest = [event async for event in relay]
+
+        self.assertEqual(first, 'id: 1\nevent: delta\ndata: {"text": "Hel"}\n\n')  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            rest,
+            [
+                'id: 2\nevent: delta\ndata: {"text": "lo"}\n\n',
+                'id: 3\nevent: done\ndata: {"text": ""}\n\n',
+            ],
+        )
+
+    async def test_relay_skips_seen_events_and_times_out(self):
+        dialogue_id = 10**9 + 1
+        publisher = DialogueStreamPublisher(self.user.id, dialogue_id)
+        publisher.delta("Hel")
+
+        events = [
+            event
+            async for event in arelay_dialogue_stream(
+                self.user.id,
+                dialogue_id,
+                last_seq=1,
+                max_duration=0.1,
+            )
+        ]
+
+        self.assertEqual(events, ['id: 1\nevent: timeout\ndata: {"text": ""}\n\n'])  # noqa: PT009
+
+    async def test_relays_share_one_pubsub_connection(self):
+        publishers = [
+            DialogueStreamPublisher(self.user.id, dialogue_id)
+            for dialogue_id in (10**9 + 2, 10**9 + 3)
+        ]
+        for publisher in publishers:
+            publisher.delta("Hi")
+        relays = [
+            arelay_dialogue_stream(self.user.id, 10**9 + 2, max_duration=5),
+            arelay_dialogue_stream(self.user.id, 10**9 + 3, max_duration=5),
+        ]
+        for relay in relays:
+            await anext(relay)
+        subscriber = get_subscriber()
+
+        self.assertEqual(subscriber.count, 2)  # noqa: PT009
+        self.assertEqual(len(subscriber.pubsub.channels), 2)  # noqa: PT009
+        for publisher in publishers:
+            publisher.done()
+        for relay in relays:
+            self.assertIn("event: done", await anext(relay))  # noqa: PT009
+            await relay.aclose()
+        self.assertEqual(subscriber.count, 0)  # noqa: PT009
+
+    @override_settings(PUBSUB_MAX_SUBSCRIPTIONS=0)
+    async def test_relay_beyond_the_cap_ends_with_timeout(self):
+        events = [
+            event async for event in arelay_dialogue_stream(self.user.id, 10**9 + 4)
+        ]
+
+        self.assertEqual(events, ['id: 0\nevent: timeout\ndata: {"text": ""}\n\n'])  # noqa: PT009
+
+    def test_relay_for_wsgi_replays_buffer_then_live_events(self):
+        dialogue_id = 10**9 + 6
+        publisher = DialogueStreamPublisher(self.user.id, dialogue_id)
+        publisher.delta("Hel")
+
+        relay = relay_dialogue_stream(self.user.id, dialogue_id, max_duration=5)
+        first = next(relay)
+        publisher.delta("lo")
+        publisher.done()
+
+        self.assertEqual(first, 'id: 1\nevent: delta\ndata: {"text": "Hel"}\n\n')  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            list(relay),
+            [
+                'id: 2\nevent: delta\ndata: {"text": "lo"}\n\n',
+                'id: 3\nevent: done\ndata: {"text": ""}\n\n',
+            ],
+        )
+
+    @override_settings(PUBSUB_MAX_SUBSCRIPTIONS=0)
+    async def test_stream_is_refused_beyond_the_cap(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(f"/api/dialogue/{10**9 + 5}/stream/")
+
+        self.assertEqual(response.status_code, 503)  # noqa: PT009
+        self.assertEqual(response["Retry-After"], "1")  # noqa: PT009
+
+    def test_stream_of_answered_dialogue_is_done(self):
+        dialogue_id = create_user_dialogue(
+            self.user.id,
+            "Hello",
+            self.model.id,
+            self.model_version.id,
+        )
+        Dialogue.objects.filter(id=dialogue_id).update(status=StatusType.COMPLETED)
+
+        response = cast(
+            "StreamingHttpResponse",
+            self.client.get(
+                f"/api/dialogue/{dialogue_id}/stream/",
+                HTTP_ACCEPT="text/event-stream",
+            ),
+        )
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            response.getvalue(),
+            b'id: 1\nevent: done\ndata: {"text": ""}\n\n',
+        )
+
+
+class DialogueWaitTestCase(TestCase):
+    def setUp(self):
+        self.user = DialogueUserFactory(username="waiting-user")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        self.dialogues = [
+            Dialogue.objects.create(
+                user=self.user,
+                content=f"message {i}",
+                model=self.model,
+                status=StatusType.COMPLETED,
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_returns_new_rows_without_waiting(self):
+        response = self.client.get(
+            f"/api/dialogue/wait/?after={self.dialogues[0].id}&timeout=30",
+        )
+
+        self.assertEqual(  # noqa: PT009
+            [row["id"] for row in response.json()["results"]],
+            [self.dialogues[1].id, self.dialogues[2].id],
+        )
+        self.assertEqual(response.json()["after"], self.dialogues[2].id)  # noqa: PT009
+
+    def test_times_out_with_empty_page(self):
+        latest_id = self.dialogues[2].id
+
+        response = self.client.get(f"/api/dialogue/wait/?after={latest_id}&timeout=0")
+
+        self.assertEqual(response.json()["results"], [])  # noqa: PT009
+        self.assertEqual(response.json()["after"], latest_id)  # noqa: PT009
+
+    def test_rejects_long_timeout(self):
+        response = self.client.get("/api/dialogue/wait/?timeout=600")
+
+        self.assertEqual(response.status_code, 400)  # noqa: PT009
+
+    def save_reply_and_commit(self):
+        chat_model = ChatGPTModel(self.model_version)
+        with self.captureOnCommitCallbacks(execute=True):
+            chat_model.save_ai_response(self.user.id, "Hi there")
+
+    async def test_saved_reply_wakes_listener(self):
+        async with NewDialogueListener(self.user.id) as listener:
+            await sync_to_async(self.save_reply_and_commit)()
+
+            self.assertTrue(await listener.wait(1))  # noqa: PT009
+
+    async def test_listeners_of_a_user_share_one_subscription(self):
+        async with (
+            NewDialogueListener(self.user.id) as first,
+            NewDialogueListener(self.user.id) as second,
+        ):
+            subscriber = get_subscriber()
+            self.assertEqual(subscriber.count, 2)  # noqa: PT009
+            self.assertEqual(len(subscriber.pubsub.channels), 1)  # noqa: PT009
+            await sync_to_async(self.save_reply_and_commit)()
+
+            self.assertTrue(await first.wait(1))  # noqa: PT009
+            self.assertTrue(await second.wait(1))  # noqa: PT009
+        self.assertEqual(subscriber.count, 0)  # noqa: PT009
+
+    @override_settings(PUBSUB_MAX_SUBSCRIPTIONS=0)
+    def test_wait_is_refused_beyond_the_cap(self):
+        response = self.client.get("/api/dialogue/wait/?timeout=0")
+
+        self.assertEqual(response.status_code, 503)  # noqa: PT009
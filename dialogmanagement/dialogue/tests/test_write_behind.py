@@ -0,0 +1,169 @@
+import json
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.dialogue.tests.factories import DialogueUserFactory
+from dialogmanagement.dialogue.tests.factories import ModelVersionFactory
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils import write_behind
+from dialogmanagement.utils.ai_service import ChatGPTModel
+from dialogmanagement.utils.dialogue_types import StatusType
+from dialogmanagement.utils.dialogue_types import UserType
+from dialogmanagement.utils.tasks import create_user_dialogue
+
+
+@override_settings(
+    DIALOGUE_WRITE_BEHIND=True,
+    DIALOGUE_FLUSH_BATCH_SIZE=2,
+    DIALOGUE_FLUSH_INTERVAL_MS=0,
+)
+class WriteBehindTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.user = DialogueUserFactory(username="write-behind-user")
+        self.model_version = ModelVersionFactory()
+        self.model = self.model_version.ai_model
+        self.chat_model = ChatGPTModel(self.model_version)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def answer(self, content, reply, user_id=None):
+        dialogue_id = create_user_dialogue(
+            self.user.id,
+            content,
+            self.model.id,
+            self.model_version.id,
+        )
+        self.chat_model.persist_turn(dialogue_id, user_id or self.user.id, reply)
+        return dialogue_id
+
+    def history(self, **params):
+        response = self.client.get("/api/dialogue/", params)
+        return [(row["content"], row["status"]) for row in response.json()["results"]]
+
+    def test_turn_is_queued_instead_of_written(self):
+        dialogue_id = create_user_dialogue(
+            self.user.id,
+            "Hello",
+            self.model.id,
+            self.model_version.id,
+        )
+
+        with self.assertNumQueries(1):  # Reserving the reply id.
+            self.chat_model.persist_turn(dialogue_id, self.user.id, "Hi there")
+
+        self.assertEqual(Dialogue.objects.filter(user=self.user).count(), 1)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            Dialogue.objects.get(id=dialogue_id).status,
+            StatusType.ACTIVE,
+        )
+
+    def test_history_shows_queued_turns(self):
+        self.answer("Hello", "Hi there")
+        self.answer("How are you?", "Fine")
+        expected = [
+            ("Hello", StatusType.COMPLETED),
+            ("Hi there", StatusType.COMPLETED),
+            ("How are you?", StatusType.COMPLETED),
+            ("Fine", StatusType.COMPLETED),
+        ]
+        queued = self.client.get("/api/dialogue/", {"page_size": 3}).json()
+
+        self.assertEqual(self.history(), expected)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            [row["content"] for row in queued["results"]],
+            ["Hi there", "How are you?", "Fine"],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            write_behind.Flusher().drain()
+        flushed = self.client.get("/api/dialogue/", {"page_size": 3}).json()
+
+        self.assertEqual(self.history(), expected)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            [row["id"] for row in flushed["results"]],
+            [row["id"] for row in queued["results"]],
+        )
+        self.assertEqual(  # noqa: PT009
+            self.history(before=queued["before"]),
+            [("Hello", StatusType.COMPLETED)],
+        )
+
+    def test_flush_writes_batches(self):
+        dialogue_ids = [self.answer(f"Question {i}", f"Answer {i}") for i in range(3)]
+
+        with CaptureQueriesContext(connection) as queries:
+            written = write_behind.Flusher().drain()
+
+        self.assertEqual(written, 3)  # noqa: PT009
+        # A savepoint, the INSERT, the UPDATE and the release, per batch.
+        self.assertEqual(len(queries), 8)  # noqa: PT009
+        counters = metrics.get_counters()
+        self.assertEqual(counters["write_behind.batches"], 2)  # noqa: PT009
+        self.assertEqual(counters["write_behind.rows"], 3)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            set(
+                Dialogue.objects.filter(id__in=dialogue_ids).values_list(
+                    "status",
+                    flat=True,
+                ),
+            ),
+            {StatusType.COMPLETED},
+        )
+        self.assertEqual(  # noqa: PT009
+            list(
+                Dialogue.objects.filter(type=UserType.AI)
+                .order_by("id")
+                .values_list("content", flat=True),
+            ),
+            ["Answer 0", "Answer 1", "Answer 2"],
+        )
+        self.assertEqual(write_behind.Flusher().drain(), 0)  # noqa: PT009
+
+    def test_unflushed_entries_of_a_dead_flusher_are_claimed(self):
+        self.answer("Hello", "Hi there")
+        dead = write_behind.Flusher(consumer="dead")
+        dead.read_batch(0)
+
+        with patch.object(write_behind, "CLAIM_IDLE_MS", 0):
+            written = write_behind.Flusher(consumer="alive").drain()
+
+        self.assertEqual(written, 1)  # noqa: PT009
+
+    def test_rewritten_batch_is_idempotent(self):
+        self.answer("Hello", "Hi there")
+        flusher = write_behind.Flusher()
+        batch = flusher.read_batch(0)
+        entries = [json.loads(fields[b"turn"]) for _, fields in batch]
+
+        write_behind.write(entries)
+        flusher.flush(batch)
+
+        self.assertEqual(Dialogue.objects.filter(type=UserType.AI).count(), 1)  # noqa: PT009
+
+    def test_turn_of_deleted_user_is_dropped(self):
+        self.answer("Hello", "Hi there")
+        self.answer("Hello", "Who?", user_id=self.user.id + 1000)
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        written = write_behind.Flusher().drain()
+
+        self.assertEqual(written, 1)  # noqa: PT009
+        self.assertEqual(  # noqa: PT009
+            list(
+                Dialogue.objects.filter(type=UserType.AI).values_list(
+                    "content",
+                    flat=True,
+                ),
+            ),
+            ["Hi there"],
+        )
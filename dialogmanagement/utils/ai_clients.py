@@ -0,0 +1,163 @@
+import asyncio
+import contextlib
+import threading
+import weakref
+
+import environ
+import httpx
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from google import genai
+from google.genai import types
+from openai import AsyncOpenAI
+from openai import DefaultAsyncHttpxClient
+from openai import DefaultHttpxClient
+from openai import OpenAI
+
+from dialogmanagement.utils import metrics
+
+env = environ.Env()
+env.read_env()
+
+# Keep-alive pool shared by every task in a worker process.
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+# Fail a stuck call fast: `provider_stream` retries it with its own backoff,
+# so the SDKs' built-in retries are turned off.
+READ_TIMEOUT = 30
+HTTP_TIMEOUT = httpx.Timeout(READ_TIMEOUT, connect=5)
+
+GEMINI_CONTENT_CONFIG = types.GenerateContentConfig(
+    temperature=0.7,
+    top_p=0.95,
+    max_output_tokens=100,
+    response_modalities=["TEXT"],
+    safety_settings=[
+        types.SafetySetting(
+            category="HARM_CATEGORY_HATE_SPEECH",
+            threshold="OFF",
+        ),
+        types.SafetySetting(
+            category="HARM_CATEGORY_DANGEROUS_CONTENT",
+            threshold="OFF",
+        ),
+        types.SafetySetting(
+            category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
+            threshold="OFF",
+        ),
+        types.SafetySetting(
+            category="HARM_CATEGORY_HARASSMENT",
+            threshold="OFF",
+        ),
+    ],
+)
+
+_clients: dict[str, object] = {}
+_lock = threading.Lock()
+# Async clients hold connection pools bound to the event loop they run on.
+_async_openai_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_provider_slots: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def track_connection_reuse(provider: str):
+    """
+    Return an httpx request hook that counts requests, and asks httpcore to
+    report when it has to open a new TCP connection for one. The ratio of the
+    two is the connection reuse rate.
+    """
+
+    def on_new_connection(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            metrics.incr(f"{provider}.connections")
+
+    def on_request(request):
+        metrics.incr(f"{provider}.requests")
+        request.extensions["trace"] = on_new_connection
+
+    return on_request
+
+
+def _get_or_create(name: str, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def get_openai_client() -> OpenAI:
+    return _get_or_create(
+        "openai",
+        lambda: OpenAI(
+            api_key=env("OPENAI_API_KEY"),
+            max_retries=0,
+            timeout=HTTP_TIMEOUT,
+            http_client=DefaultHttpxClient(
+                limits=HTTP_LIMITS,
+                event_hooks={"request": [track_connection_reuse("openai")]},
+            ),
+        ),
+    )
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Return the AsyncOpenAI client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_openai_clients.get(loop)
+    if client is None:
+        client = _async_openai_clients[loop] = AsyncOpenAI(
+            api_key=env("OPENAI_API_KEY"),
+            max_retries=0,
+            timeout=HTTP_TIMEOUT,
+            http_client=DefaultAsyncHttpxClient(limits=HTTP_LIMITS),
+        )
+    return client
+
+
+def provider_slot(provider: str) -> asyncio.Semaphore:
+    """
+    Return the semaphore capping concurrent calls to `provider` from the
+    running event loop, sized by `settings.AI_PROVIDER_CONCURRENCY`.
+    """
+    slots = _provider_slots.setdefault(asyncio.get_running_loop(), {})
+    slot = slots.get(provider)
+    if slot is None:
+        slot = slots[provider] = asyncio.Semaphore(
+            settings.AI_PROVIDER_CONCURRENCY[provider],
+        )
+    return slot
+
+
+def get_genai_client() -> genai.Client:
+    # google-genai 1.5 opens a new HTTP session per call, so sharing the
+    # client saves the credential loading and token refresh, not sockets.
+    return _get_or_create(
+        "gemini",
+        lambda: genai.Client(
+            vertexai=True,
+            project=env("GCP_PROJECT_ID"),
+            location="us-central1",
+            http_options=types.HttpOptions(timeout=READ_TIMEOUT * 1000),
+        ),
+    )
+
+
+def reset_clients():
+    with _lock:
+        _clients.clear()
+
+
+@worker_process_init.connect
+def init_worker_clients(**kwargs):
+    """
+    Build the clients once per worker process, after the prefork. Clients
+    inherited from the parent would share its sockets, so they are dropped.
+    """
+    reset_clients()
+    # A deployment may only configure one of the providers.
+    with contextlib.suppress(ImproperlyConfigured):
+        get_openai_client()
+    with contextlib.suppress(ImproperlyConfigured):
+        get_genai_client()
@@ -1,179 +1,646 @@
+import asyncio
+import time
 from abc import ABC
 from abc import abstractmethod
+from collections.abc import AsyncGenerator
+from collections.abc import AsyncIterator
+from collections.abc import Generator
+from collections.abc import Iterator
 
-import environ
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.db import transaction
 from django.utils import timezone
-from google import genai
 from google.genai import types
-from openai import OpenAI
 
-from dialogmanagement.ai_model.models import AIModel
+from dialogmanagement.ai_model.catalog import catalog
 from dialogmanagement.ai_model.models import ModelVersion
 from dialogmanagement.dialogue.models import Dialogue
-from dialogmanagement.users.models import User
+from dialogmanagement.utils import hedging
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils import rate_limit
+from dialogmanagement.utils import response_cache
+from dialogmanagement.utils import write_behind
+from dialogmanagement.utils.ai_clients import GEMINI_CONTENT_CONFIG
+from dialogmanagement.utils.ai_clients import get_async_openai_client
+from dialogmanagement.utils.ai_clients import get_genai_client
+from dialogmanagement.utils.ai_clients import get_openai_client
+from dialogmanagement.utils.ai_clients import provider_slot
+from dialogmanagement.utils.chat_history import ChatHistoryManager
+from dialogmanagement.utils.chat_history import assistant_message
+from dialogmanagement.utils.chat_history import count_message_tokens
+from dialogmanagement.utils.chat_history import count_tokens
+from dialogmanagement.utils.chat_history import user_message
+from dialogmanagement.utils.dialogue_cache import bump_dialogue_version
+from dialogmanagement.utils.dialogue_notifications import notify_new_dialogues
+from dialogmanagement.utils.dialogue_stream import DialogueStreamPublisher
 from dialogmanagement.utils.dialogue_types import StatusType
 from dialogmanagement.utils.dialogue_types import UserType
+from dialogmanagement.utils.error_handle import AIModelError
 from dialogmanagement.utils.error_handle import NotFoundError
+from dialogmanagement.utils.error_handle import RateLimitedError
+from dialogmanagement.utils.hedging import Hedge
+from dialogmanagement.utils.resilience import FATAL
+from dialogmanagement.utils.resilience import TRANSIENT
+from dialogmanagement.utils.resilience import CircuitBreaker
+from dialogmanagement.utils.resilience import backoff
+from dialogmanagement.utils.resilience import classify
+from dialogmanagement.utils.single_flight import Flight
 
-env = environ.Env()
-env.read_env()
+SUMMARY_MAX_TOKENS = 200
 
 
 # 1. Define an Abstract Base Class for AI Models
 class BaseAIModel(ABC):
     """Abstract base class for AI models."""
 
+    HISTORY_NAMESPACE = ""
+    SYSTEM_PROMPT = "You are a helpful assistant."
+    SUMMARY_PROMPT = (
+        "Summarize the conversation below in a few sentences. Keep names, "
+        "facts and open questions the assistant needs to continue it."
+    )
+
     def __init__(self, model_version: ModelVersion):
         self.model_version = model_version
 
-    @abstractmethod
-    def chat_with_ai(self, user_id: int, text: str) -> str:
+    def chat_with_ai(
+        self,
+        user_id: int,
+        text: str,
+        publisher: DialogueStreamPublisher | None = None,
+    ) -> str:
         """Generate AI response."""
+        return "".join(self.stream_chat(user_id, text, publisher))
+
+    def stream_chat(
+        self,
+        user_id: int,
+        text: str,
+        publisher: DialogueStreamPublisher | None = None,
+    ) -> Iterator[str]:
+        """
+        Yield the AI response to `text` chunk by chunk as the provider sends
+        it, forwarding each chunk to `publisher` if given. The turn is added to
+        the chat history once the response is complete.
+
+        A reply from the response cache, or from an identical call already in
+        flight, is yielded as one chunk instead.
+        """
+        history = self.history(user_id)
+        system_prompt, window, truncated = self.build_prompt(history, text)
+        digest = self.prompt_digest(system_prompt, window)
+        ai_res = response_cache.get(digest) if self.caches_responses else None
+        with Flight(digest) as flight:
+            if ai_res is None:
+                ai_res = flight.join()
+            if ai_res is not None:
+                if publisher is not None:
+                    publisher.delta(ai_res)
+                yield ai_res
+            else:
+                chunks: list[str] = []
+                for chunk in self.answer_stream(system_prompt, window, publisher):
+                    chunks.append(chunk)
+                    yield chunk
+                ai_res = "".join(chunks)
+                if self.caches_responses and ai_res:
+                    response_cache.put(digest, ai_res)
+                flight.finish(ai_res)
+        self.record_turn(user_id, history, text, ai_res, truncated=truncated)
+
+    def answer_stream(
+        self,
+        system_prompt: str,
+        window: list[dict],
+        publisher: DialogueStreamPublisher | None,
+    ) -> Iterator[str]:
+        """
+        `provider_stream`, raced against the model version's fallback version
+        if it has one (see `Hedge`).
+        """
+        fallback = self.fallback_model()
+        if fallback is None:
+            yield from self.provider_stream(system_prompt, window, publisher)
+            return
+        delay = None
+        if self.model_version.hedge_enabled:
+            delay = hedging.hedge_delay(self.model_version.id)
+        cost = fallback.cost(system_prompt, window)
+        hedge = Hedge(self.model_version.id, delay, cost)
+        for chunk in hedge.race(
+            self.provider_stream(system_prompt, window, None),
+            lambda: fallback.provider_stream(system_prompt, window, None),
+        ):
+            if publisher is not None:
+                publisher.delta(chunk)
+            yield chunk
+
+    def provider_stream(
+        self,
+        system_prompt: str,
+        window: list[dict],
+        publisher: DialogueStreamPublisher | None,
+    ) -> Generator[str, None, None]:
+        """
+        Yield the provider's reply, behind the rate limiter and the model
+        version's circuit breaker. A call that fails before its first chunk
+        is retried with backoff if the failure is transient or throttling.
+        """
+        breaker = CircuitBreaker(self.HISTORY_NAMESPACE, self.model_version.id)
+        cost = self.cost(system_prompt, window)
+        for attempt in range(1, settings.AI_PROVIDER_MAX_ATTEMPTS + 1):
+            breaker.check()
+            self.throttle(rate_limit.acquire(self.HISTORY_NAMESPACE, cost))
+            started = False
+            try:
+                start = time.perf_counter()
+                for chunk in self.stream_completion(system_prompt, window):
+                    if not started:
+                        started = True
+                        self.record_ttft((time.perf_counter() - start) * 1000)
+                    if publisher is not None:
+                        publisher.delta(chunk)
+                    yield chunk
+            except Exception as err:
+                kind = classify(err)
+                if kind == TRANSIENT:
+                    breaker.record_failure()
+                if not self.retries(kind, attempt, started=started):
+                    raise
+                metrics.incr(f"{self.HISTORY_NAMESPACE}.retries")
+                time.sleep(backoff(attempt - 1))
+            else:
+                breaker.record_success()
+                return
+
+    def retries(self, kind: str, attempt: int, *, started: bool) -> bool:
+        """Whether a failed call is tried again; not once chunks went out."""
+        return (
+            kind != FATAL
+            and not started
+            and attempt < settings.AI_PROVIDER_MAX_ATTEMPTS
+        )
+
+    async def achat_with_ai(
+        self,
+        user_id: int,
+        text: str,
+        publisher: DialogueStreamPublisher | None = None,
+    ) -> str:
+        """`chat_with_ai` on the provider's async client."""
+        return "".join(
+            [chunk async for chunk in self.astream_chat(user_id, text, publisher)],
+        )
+
+    async def astream_chat(
+        self,
+        user_id: int,
+        text: str,
+        publisher: DialogueStreamPublisher | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        `stream_chat` for an event loop: the provider call is awaited, so one
+        process can keep many slow completions in flight. The short Redis
+        history reads and writes run in a thread.
+        """
+        history = self.history(user_id)
+        system_prompt, window, truncated = await sync_to_async(
+            self.build_prompt,
+            thread_sensitive=False,
+        )(history, text)
+        digest = self.prompt_digest(system_prompt, window)
+        ai_res = await response_cache.aget(digest) if self.caches_responses else None
+        async with Flight(digest) as flight:
+            if ai_res is None:
+                ai_res = await flight.ajoin()
+            if ai_res is not None:
+                if publisher is not None:
+                    await publisher.adelta(ai_res)
+                yield ai_res
+            else:
+                chunks: list[str] = []
+                async for chunk in self.aanswer_stream(
+                    system_prompt,
+                    window,
+                    publisher,
+                ):
+                    chunks.append(chunk)
+                    yield chunk
+                ai_res = "".join(chunks)
+                if self.caches_responses and ai_res:
+                    await response_cache.aput(digest, ai_res)
+                await flight.afinish(ai_res)
+        await sync_to_async(self.record_turn, thread_sensitive=False)(
+            user_id,
+            history,
+            text,
+            ai_res,
+            truncated=truncated,
+        )
+
+    async def aanswer_stream(
+        self,
+        system_prompt: str,
+        window: list[dict],
+        publisher: DialogueStreamPublisher | None,
+    ) -> AsyncIterator[str]:
+        # A catalog reload queries the database, which the loop must not.
+        fallback = await sync_to_async(self.fallback_model)()
+        if fallback is None:
+            async for chunk in self.aprovider_stream(system_prompt, window, publisher):
+                yield chunk
+            return
+        delay = None
+        if self.model_version.hedge_enabled:
+            delay = await hedging.ahedge_delay(self.model_version.id)
+        cost = fallback.cost(system_prompt, window)
+        hedge = Hedge(self.model_version.id, delay, cost)
+        async for chunk in hedge.arace(
+            self.aprovider_stream(system_prompt, window, None),
+            lambda: fallback.aprovider_stream(system_prompt, window, None),
+        ):
+            if publisher is not None:
+                await publisher.adelta(chunk)
+            yield chunk
+
+    async def aprovider_stream(
+        self,
+        system_prompt: str,
+        window: list[dict],
+        publisher: DialogueStreamPublisher | None,
+    ) -> AsyncGenerator[str, None]:
+        breaker = CircuitBreaker(self.HISTORY_NAMESPACE, self.model_version.id)
+        cost = self.cost(system_prompt, window)
+        for attempt in range(1, settings.AI_PROVIDER_MAX_ATTEMPTS + 1):
+            await breaker.acheck()
+            self.throttle(await rate_limit.aacquire(self.HISTORY_NAMESPACE, cost))
+            started = False
+            try:
+                # Taken only for the call itself: turns answered from the
+                # cache or by another's flight never hold a slot.
+                async with provider_slot(self.HISTORY_NAMESPACE):
+                    start = time.perf_counter()
+                    async for chunk in self.astream_completion(system_prompt, window):
+                        if not started:
+                            started = True
+                            elapsed = time.perf_counter() - start
+                            await self.arecord_ttft(elapsed * 1000)
+                        if publisher is not None:
+                            await publisher.adelta(chunk)
+                        yield chunk
+            except Exception as err:
+                kind = classify(err)
+                if kind == TRANSIENT:
+                    await breaker.arecord_failure()
+                if not self.retries(kind, attempt, started=started):
+                    raise
+                await metrics.aincr(f"{self.HISTORY_NAMESPACE}.retries")
+                await asyncio.sleep(backoff(attempt - 1))
+            else:
+                await breaker.arecord_success()
+                return
+
+    @abstractmethod
+    def stream_completion(
+        self,
+        system_prompt: str,
+        messages: list[dict],
+    ) -> Iterator[str]:
+        """Yield the provider's completion of `messages` as non-empty chunks."""
+
+    @abstractmethod
+    def astream_completion(
+        self,
+        system_prompt: str,
+        messages: list[dict],
+    ) -> AsyncIterator[str]:
+        """`stream_completion` on the provider's async client."""
+
+    def generation_config(self) -> dict:
+        """The settings, besides the prompt, that shape the provider's reply."""
+        return {"model": self.model_version.name}
+
+    def max_output_tokens(self) -> int:
+        return 0
+
+    def cost(self, system_prompt: str, window: list[dict]) -> int:
+        """Tokens a call counts against the provider's tokens-per-minute limit."""
+        return (
+            count_tokens(system_prompt)
+            + sum(count_message_tokens(message) for message in window)
+            + self.max_output_tokens()
+        )
+
+    def throttle(self, wait: float):
+        """Raise RateLimitedError unless the rate limiter granted the call."""
+        if wait:
+            raise RateLimitedError(self.HISTORY_NAMESPACE, wait)
+
+    def record_ttft(self, elapsed_ms: float):
+        metrics.observe_ms(f"{self.HISTORY_NAMESPACE}.ttft", elapsed_ms)
+        if self.model_version.hedge_enabled:
+            hedging.record_ttft(self.model_version.id, elapsed_ms)
+
+    async def arecord_ttft(self, elapsed_ms: float):
+        await metrics.aobserve_ms(f"{self.HISTORY_NAMESPACE}.ttft", elapsed_ms)
+        if self.model_version.hedge_enabled:
+            await hedging.arecord_ttft(self.model_version.id, elapsed_ms)
+
+    def fallback_model(self) -> "BaseAIModel | None":
+        """The model of the version's fallback version, if it has one."""
+        version_id = self.model_version.fallback_version_id
+        if version_id is None:
+            return None
+        version = catalog.get_version(version_id)
+        if version is None:
+            return None
+        return AIModelFactory.get_model(version.ai_model_id, version.id)
+
+    @property
+    def caches_responses(self) -> bool:
+        return self.model_version.response_cache_enabled
+
+    def prompt_digest(self, system_prompt: str, window: list[dict]) -> str:
+        """Identify the reply to a prompt, for the response cache and `Flight`."""
+        return response_cache.prompt_digest(
+            self.model_version.id,
+            self.generation_config(),
+            system_prompt,
+            window,
+        )
+
+    @abstractmethod
+    def generate_summary(self, transcript: str) -> str:
+        """Return the provider's completion of `SUMMARY_PROMPT` for a transcript."""
+
+    def history(self, user_id: int) -> ChatHistoryManager:
+        return ChatHistoryManager(
+            self.HISTORY_NAMESPACE,
+            user_id,
+            self.model_version.context_token_budget,
+        )
+
+    def system_prompt(self, summary: str) -> str:
+        if not summary:
+            return self.SYSTEM_PROMPT
+        return f"{self.SYSTEM_PROMPT}\nSummary of the earlier conversation: {summary}"
+
+    def build_prompt(
+        self,
+        history: ChatHistoryManager,
+        text: str,
+    ) -> tuple[str, list[dict], bool]:
+        """
+        Return the system prompt and the provider-neutral messages to send
+        for `text`, and whether stored messages were left out of them.
+        """
+        recent, stored = history.recent()
+        system_prompt = self.system_prompt(history.get_summary())
+        window = history.window(
+            [*recent, user_message(text)],
+            reserved_tokens=count_tokens(system_prompt),
+        )
+        return system_prompt, window, stored + 1 > len(window)
+
+    def record_turn(
+        self,
+        user_id: int,
+        history: ChatHistoryManager,
+        text: str,
+        ai_res: str,
+        *,
+        truncated: bool,
+    ):
+        """Append the turn to the history and compact it if it is over budget."""
+        history.append(user_message(text), assistant_message(ai_res))
+        if truncated:
+            self.schedule_compaction(user_id, history)
+
+    def summarize(self, summary: str, messages: list[dict]) -> str:
+        """Fold `messages` into the rolling `summary`."""
+        lines = [f"{m['role']}: {m['content']}" for m in messages]
+        if summary:
+            lines.insert(0, f"Earlier summary: {summary}")
+        transcript = "\n".join(lines)
+        cost = count_tokens(self.SUMMARY_PROMPT + transcript) + SUMMARY_MAX_TOKENS
+        self.throttle(rate_limit.acquire(self.HISTORY_NAMESPACE, cost))
+        return self.generate_summary(transcript)
+
+    def schedule_compaction(self, user_id: int, history: ChatHistoryManager):
+        """Summarize old turns in the background once history is over budget."""
+        from dialogmanagement.utils.tasks import compact_chat_history
+
+        if history.acquire_compaction():
+            compact_chat_history.delay(
+                user_id,
+                self.model_version.ai_model_id,
+                self.model_version.id,
+            )
+
+    def compact_history(self, user_id: int):
+        self.history(user_id).compact(self.summarize)
 
     def save_ai_response(self, user_id: int, text: str):
         """Save AI response to Dialogue model."""
         try:
-            user = User.objects.get(pk=user_id)
             Dialogue.objects.create(
-                user=user,
+                user_id=user_id,
                 status=StatusType.COMPLETED,
                 content=text,
                 type=UserType.AI,
-                model=self.model_version.ai_model,
-                model_version=self.model_version,
+                model_id=self.model_version.ai_model_id,
+                model_version_id=self.model_version.id,
                 created_timestamp=timezone.now(),
             )
-        except User.DoesNotExist as err:
-            raise NotFoundError(
-                message=str(err),
-                status_code=404,
-            ) from err
+        except IntegrityError as err:
+            raise user_not_found(user_id) from err
+        bump_dialogue_version(user_id)
+        notify_new_dialogues(user_id)
 
     def update_dialogue_status(self, dialogue_id: int):
         """Update dialogue status to COMPLETED."""
         Dialogue.objects.filter(id=dialogue_id).update(status=StatusType.COMPLETED)
 
+    def persist_turn(self, dialogue_id: int, user_id: int, text: str):
+        """
+        Mark the user's message completed and save the AI reply in one
+        transaction: an UPDATE and an INSERT ... RETURNING, with foreign keys
+        passed as ids so nothing is fetched first.
+
+        With `settings.DIALOGUE_WRITE_BEHIND` the turn is queued for the
+        flusher instead; the history list shows it meanwhile.
+        """
+        if settings.DIALOGUE_WRITE_BEHIND:
+            write_behind.append_turn(dialogue_id, user_id, text, self.model_version)
+            bump_dialogue_version(user_id)
+            notify_new_dialogues(user_id)
+            return
+        try:
+            with transaction.atomic():
+                self.update_dialogue_status(dialogue_id)
+                # Saving the reply bumps the user's dialogue version and wakes
+                # long-polling clients on commit.
+                self.save_ai_response(user_id, text)
+        except IntegrityError as err:
+            # Foreign keys are checked at commit, outside save_ai_response.
+            raise user_not_found(user_id) from err
+
+
+def user_not_found(user_id: int) -> NotFoundError:
+    return NotFoundError(message=f"User {user_id} does not exist.", status_code=404)
+
 
 # 2. Implement Different Model Class
 class ChatGPTModel(BaseAIModel):
-    CACHE_TIMEOUT = 60 * 60  # 1 hour (adjust as needed)
+    HISTORY_NAMESPACE = "openai"
+    MAX_TOKENS = 100
+    GENERATION_CONFIG = {"temperature": 0.3, "max_tokens": MAX_TOKENS, "n": 1}
 
     def __init__(self, model_version: ModelVersion):
         super().__init__(model_version)
-        self.client = OpenAI(api_key=env("OPENAI_API_KEY"))
+        self.client = get_openai_client()
 
-    def chat_with_ai(self, user_id: int, text: str) -> str:
-        """Generate AI response using OpenAI."""
-        cache_key = f"chat_history_openai_{user_id}"
+    def completion_kwargs(self, system_prompt: str, messages: list[dict]) -> dict:
+        message = [{"role": "system", "content": system_prompt}]
+        return {
+            **self.generation_config(),
+            "messages": message + messages,
+            "stream": True,
+        }
 
-        # Retrieve previous conversation history from cache
-        conversation_history = cache.get(cache_key, [])
+    def generation_config(self) -> dict:
+        return {**super().generation_config(), **self.GENERATION_CONFIG}
 
-        # Append user message
-        conversation_history.append({"role": "user", "content": text})
-        message = [{"role": "system", "content": "You are a helpful assistant."}]
+    def max_output_tokens(self) -> int:
+        return self.MAX_TOKENS
+
+    def stream_completion(
+        self,
+        system_prompt: str,
+        messages: list[dict],
+    ) -> Iterator[str]:
+        """Stream the response from OpenAI."""
+        stream = self.client.chat.completions.create(
+            **self.completion_kwargs(system_prompt, messages),
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content.replace("\n", " ")
+
+    async def astream_completion(
+        self,
+        system_prompt: str,
+        messages: list[dict],
+    ) -> AsyncIterator[str]:
+        """Stream the response from OpenAI on the event loop's async client."""
+        stream = await get_async_openai_client().chat.completions.create(
+            **self.completion_kwargs(system_prompt, messages),
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content.replace("\n", " ")
+
+    def generate_summary(self, transcript: str) -> str:
         completion = self.client.chat.completions.create(
             model=self.model_version.name,
-            messages=message + conversation_history,
+            messages=[
+                {"role": "system", "content": self.SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
             temperature=0.3,
-            max_tokens=100,
+            max_tokens=SUMMARY_MAX_TOKENS,
             n=1,
         )
-        ai_res = completion.choices[0].message.content.replace("\n", " ")
-        conversation_history.append({"role": "assistant", "content": ai_res})
-        cache.set(cache_key, conversation_history, timeout=self.CACHE_TIMEOUT)
-        return ai_res
+        summary = completion.choices[0].message.content
+        if not summary:
+            # Leaves the history as it was, to be compacted on a later turn.
+            msg = "OpenAI returned no summary."
+            raise AIModelError(msg)
+        return summary
 
 
 class GeminiModel(BaseAIModel):
-    CACHE_TIMEOUT = 60 * 60
+    HISTORY_NAMESPACE = "gemini"
+    # Gemini calls the assistant role "model".
+    ROLES = {"user": "user", "assistant": "model"}
 
     def __init__(self, model_version: ModelVersion):
         super().__init__(model_version)
-        self.client = genai.Client(
-            vertexai=True,
-            project=env("GCP_PROJECT_ID"),
-            location="us-central1",
-        )
-        self.generate_content_config = types.GenerateContentConfig(
-            temperature=0.7,
-            top_p=0.95,
-            max_output_tokens=100,
-            response_modalities=["TEXT"],
-            safety_settings=[
-                types.SafetySetting(
-                    category="HARM_CATEGORY_HATE_SPEECH",
-                    threshold="OFF",
-                ),
-                types.SafetySetting(
-                    category="HARM_CATEGORY_DANGEROUS_CONTENT",
-                    threshold="OFF",
-                ),
-                types.SafetySetting(
-                    category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    threshold="OFF",
-                ),
-                types.SafetySetting(
-                    category="HARM_CATEGORY_HARASSMENT",
-                    threshold="OFF",
-                ),
-            ],
-        )
+        self.client = get_genai_client()
+        self.generate_content_config = GEMINI_CONTENT_CONFIG
 
-    def chat_with_ai(self, user_id: int, text: str) -> str:
-        """Generate AI response using Gemnini and store conversation history in cache."""  # noqa: E501
-        cache_key = f"chat_history_gemini_{user_id}"
-        # Retrieve previous conversation history from cache
-        raw_history = cache.get(cache_key, [])
-
-        # Ensure retrieved history is converted intovalid Gemini Content objects
-        conversation_history = []
-        for item in raw_history:
-            if isinstance(item, dict) and "role" in item and "parts" in item:
-                conversation_history.append(
-                    types.Content(
-                        role=item.get("role"),
-                        parts=[
-                            types.Part.from_text(text=p.get("text"))
-                            for p in item["parts"]
-                        ],
-                    ),
-                )
-            else:
-                conversation_history.append(item)
+    def generation_config(self) -> dict:
+        return {
+            **super().generation_config(),
+            **self.generate_content_config.model_dump(mode="json", exclude_none=True),
+        }
 
-        # Append user's message
-        user_content = types.Content(
-            role="user",
-            parts=[types.Part.from_text(text=text)],
-        )
-        conversation_history.append(user_content)
+    def max_output_tokens(self) -> int:
+        return self.generate_content_config.max_output_tokens or 0
 
-        resp = ""
+    def content_kwargs(self, system_prompt: str, messages: list[dict]) -> dict:
+        return {
+            "model": self.model_version.name,
+            "contents": self.to_contents(messages),
+            "config": self.generate_content_config.model_copy(
+                update={"system_instruction": system_prompt},
+            ),
+        }
+
+    def stream_completion(
+        self,
+        system_prompt: str,
+        messages: list[dict],
+    ) -> Iterator[str]:
+        """Stream the response from Gemini."""
         for chunk in self.client.models.generate_content_stream(
-            model=self.model_version.name,
-            contents=conversation_history,
-            config=self.generate_content_config,
+            **self.content_kwargs(system_prompt, messages),
         ):
-            resp += chunk.text + " "
-        ai_res = resp.strip()
+            if chunk.text:
+                yield chunk.text
 
-        # Append AI response to history
-        assistant_content = types.Content(
-            role="assistant",
-            parts=[types.Part.from_text(text=ai_res)],
-        )
-        conversation_history.append(assistant_content)
+    async def astream_completion(
+        self,
+        system_prompt: str,
+        messages: list[dict],
+    ) -> AsyncIterator[str]:
+        """Stream the response from Gemini through the client's async API."""
+        async for chunk in await self.client.aio.models.generate_content_stream(
+            **self.content_kwargs(system_prompt, messages),
+        ):
+            if chunk.text:
+                yield chunk.text
 
-        # Convert conversation history to a format that can be stored in cache
-        serialized_history = [
-            {"role": c.role, "parts": [{"text": p.text} for p in c.parts]}
-            for c in conversation_history
+    @classmethod
+    def to_contents(cls, messages: list[dict]) -> list[types.Content]:
+        """Convert provider-neutral messages into Gemini Content objects."""
+        return [
+            types.Content(
+                role=cls.ROLES[m["role"]],
+                parts=[types.Part.from_text(text=m["content"])],
+            )
+            for m in messages
         ]
-        # Store updated conversation history in cache
-        cache.set(cache_key, serialized_history, timeout=self.CACHE_TIMEOUT)
-        return ai_res
+
+    def generate_summary(self, transcript: str) -> str:
+        response = self.client.models.generate_content(
+            model=self.model_version.name,
+            contents=transcript,
+            config=self.generate_content_config.model_copy(
+                update={
+                    "system_instruction": self.SUMMARY_PROMPT,
+                    "max_output_tokens": SUMMARY_MAX_TOKENS,
+                },
+            ),
+        )
+        # None when the reply was blocked or came back empty.
+        summary = response.text
+        if not summary:
+            msg = "Gemini returned no summary."
+            raise AIModelError(msg)
+        return summary
 
 
 # 3. Implement a Factory Class to Instantiate to the Correct AI Model
@@ -188,13 +655,26 @@ class AIModelFactory:
     @staticmethod
     def get_model(model_id: int, model_version_id: int) -> BaseAIModel:
         """Return an instance of the requested AI model."""
-        try:
-            model = AIModel.objects.get(pk=model_id)
-            model_version = ModelVersion.objects.get(pk=model_version_id)
-        except (AIModel.DoesNotExist, ModelVersion.DoesNotExist) as err:
-            raise NotFoundError(message=str(err), status_code=404) from err
+        model = catalog.get_model(model_id)
+        if model is None:
+            error = f"AIModel {model_id} does not exist."
+            raise NotFoundError(message=error, status_code=404)
+        model_version = catalog.get_version(model_version_id)
+        if model_version is None:
+            error = f"ModelVersion {model_version_id} does not exist."
+            raise NotFoundError(message=error, status_code=404)
 
         if model.name not in AIModelFactory.MODEL_MAP:
             error = f"Unsupported model: {model.name}"
-            raise NotFoundError(message=error, status_code=404) from error
+            raise NotFoundError(message=error, status_code=404)
         return AIModelFactory.MODEL_MAP[model.name](model_version)
+
+    @staticmethod
+    def get_provider(model_id: int) -> str:
+        """Return the provider that serves an AI model, e.g. "openai"."""
+        model = catalog.get_model(model_id)
+        model_class = AIModelFactory.MODEL_MAP.get(model.name) if model else None
+        if model_class is None:
+            error = f"AIModel {model_id} is not available."
+            raise NotFoundError(message=error, status_code=404)
+        return model_class.HISTORY_NAMESPACE
@@ -0,0 +1,149 @@
+import asyncio
+import contextlib
+import logging
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from celery import states
+from django.db import close_old_connections
+from django.utils import timezone
+
+from config import celery_app
+from dialogmanagement.utils.tasks import ASYNC_TASKS
+
+logger = logging.getLogger(__name__)
+
+# How long the consumer thread waits on the broker before it acknowledges
+# the messages of finished tasks.
+POLL_INTERVAL = 0.05
+
+
+def handled(future) -> bool:
+    """Whether `handle` got through a message, so it can be acknowledged."""
+    return not future.cancelled() and future.exception() is None
+
+
+class AsyncAIWorker:
+    """
+    Runs the AI task messages of Celery queues as coroutines on one event
+    loop, using the `ASYNC_TASKS` twin of each task.
+
+    A prefork worker slot is blocked for the whole provider call, so each
+    process answers one turn at a time. Here a process keeps up to
+    `concurrency` turns in flight, while `settings.AI_PROVIDER_CONCURRENCY`
+    caps those waiting on each provider.
+
+    A kombu channel is not thread-safe, so one thread reads and acknowledges
+    the messages. A message is acknowledged once its task has finished, as
+    with `task_acks_late`, so a crashed worker's turns are redelivered.
+    Results go to the result backend; task links are not followed, which no
+    AI task uses. A task without a coroutine twin is sent on to the default
+    queue, which a Celery worker consumes; a message that could not be
+    handled at all is rejected and requeued instead of acknowledged.
+    """
+
+    def __init__(self, queue_names: list[str], concurrency: int):
+        self.queue_names = queue_names
+        self.concurrency = concurrency
+        self.stopping = threading.Event()
+        self.finished: queue.SimpleQueue = queue.SimpleQueue()
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stopping.set)
+        with ThreadPoolExecutor(1, thread_name_prefix="ai-worker-consumer") as pool:
+            await loop.run_in_executor(pool, self.consume, loop)
+
+    def consume(self, loop: asyncio.AbstractEventLoop):
+        """
+        Hand messages to the event loop until stopped, then wait for the
+        turns in flight to finish.
+        """
+        in_flight = 0
+
+        def on_message(body, message):
+            nonlocal in_flight
+            in_flight += 1
+            future = asyncio.run_coroutine_threadsafe(
+                self.handle(body, message.headers),
+                loop,
+            )
+            future.add_done_callback(
+                lambda done: self.finished.put((message, handled(done))),
+            )
+
+        with (
+            celery_app.connection_for_read() as connection,
+            connection.Consumer(
+                [celery_app.amqp.queues[name] for name in self.queue_names],
+                callbacks=[on_message],
+                accept=["json"],
+                prefetch_count=self.concurrency,
+            ),
+        ):
+            while in_flight or not self.stopping.is_set():
+                while not self.finished.empty():
+                    message, ok = self.finished.get()
+                    if ok:
+                        message.ack()
+                    else:
+                        message.reject(requeue=True)
+                    in_flight -= 1
+                if self.stopping.is_set():
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                with contextlib.suppress(TimeoutError):
+                    connection.drain_events(timeout=POLL_INTERVAL)
+
+    async def handle(self, body, headers: dict):
+        """Run one task message and store its result."""
+        task_name, task_id = headers["task"], headers["id"]
+        run = ASYNC_TASKS.get(task_name)
+        args, kwargs, _embed = body
+        if run is None:
+            logger.error(
+                "run_ai_worker has no coroutine for %s; route it to another "
+                "queue. Sending it to the default queue.",
+                task_name,
+            )
+            await sync_to_async(celery_app.send_task, thread_sensitive=False)(
+                task_name,
+                args=args,
+                kwargs=kwargs,
+                task_id=task_id,
+                eta=headers.get("eta"),
+                queue=celery_app.conf.task_default_queue,
+            )
+            return
+        if headers.get("eta"):
+            # A countdown, e.g. from a rate-limit retry: hold the message
+            # unacknowledged until it is due, as a Celery worker does.
+            eta = datetime.fromisoformat(headers["eta"])
+            if timezone.is_naive(eta):
+                eta = timezone.make_aware(eta)
+            delay = (eta - timezone.now()).total_seconds()
+            await asyncio.sleep(max(delay, 0))
+        await sync_to_async(close_old_connections)()
+        try:
+            result = await run(*args, **kwargs)
+        except Exception as err:
+            logger.exception("Task %s[%s] raised an exception", task_name, task_id)
+            await self.store_result(task_id, err, states.FAILURE)
+        else:
+            await self.store_result(task_id, result, states.SUCCESS)
+
+    async def store_result(self, task_id: str, result, state: str):
+        await sync_to_async(celery_app.backend.store_result, thread_sensitive=False)(
+            task_id,
+            result,
+            state,
+        )
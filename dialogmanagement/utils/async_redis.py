@@ -0,0 +1,23 @@
+import asyncio
+import weakref
+
+from django.conf import settings
+from redis import asyncio as aioredis
+
+_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_client() -> aioredis.Redis:
+    """
+    Return the redis.asyncio client of the running event loop. Its connection
+    pool is bound to the loop, so each loop gets one; under an ASGI server
+    that is one per process.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = aioredis.Redis.from_url(
+            settings.REDIS_URL,
+            **settings.REDIS_ASYNC_CONNECTION_KWARGS,
+        )
+    return client
@@ -0,0 +1,133 @@
+import json
+import math
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+# Local token estimate: roughly four characters per token for English text,
+# plus a few tokens of per-message framing. Cheap enough to run on every turn
+# and close enough to keep prompts inside the budget without a tokenizer.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# History namespaces in use, one per provider class.
+HISTORY_NAMESPACES = ("openai", "gemini")
+
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def user_message(text: str) -> dict:
+    return {"role": "user", "content": text}
+
+
+def assistant_message(text: str) -> dict:
+    return {"role": "assistant", "content": text}
+
+
+class ChatHistoryManager:
+    """
+    Conversation history for one user and provider, kept as an append-only
+    Redis list of provider-neutral `{"role", "content"}` messages.
+
+    A turn reads only the newest `WINDOW_MESSAGES` entries and appends its two
+    messages with a single pipelined RPUSH + LTRIM + EXPIRE, so it never moves
+    the whole history and concurrent turns for the same user cannot overwrite
+    each other. Only the newest messages that fit in the model version's
+    token budget are sent; once older ones are left out, a Celery task folds
+    them into a rolling summary so the provider call never waits on it.
+    """
+
+    CACHE_TIMEOUT = 60 * 60  # 1 hour
+    COMPACTION_LOCK_TIMEOUT = 60 * 5
+    # Newest messages read per turn; the token budget usually cuts earlier.
+    WINDOW_MESSAGES = 50
+    # Hard cap on the stored list, in case compaction falls behind.
+    MAX_MESSAGES = 500
+
+    def __init__(self, namespace: str, user_id: int, token_budget: int):
+        self.token_budget = token_budget
+        self.redis = get_redis_connection("default")
+        self.history_key = cache.make_key(f"chat_messages_{namespace}_{user_id}")
+        self.summary_key = f"chat_summary_{namespace}_{user_id}"
+        self.compaction_key = f"chat_compaction_{namespace}_{user_id}"
+
+    def recent(self) -> tuple[list[dict], int]:
+        """Return the newest stored messages, oldest first, and the list length."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.lrange(self.history_key, -self.WINDOW_MESSAGES, -1)
+        pipe.llen(self.history_key)
+        raw, length = pipe.execute()
+        return [json.loads(item) for item in raw], length
+
+    def load(self) -> list[dict]:
+        """Return the whole stored history; only used off the request path."""
+        return [json.loads(item) for item in self.redis.lrange(self.history_key, 0, -1)]
+
+    def append(self, *messages: dict):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(self.history_key, *(json.dumps(m) for m in messages))
+        pipe.ltrim(self.history_key, -self.MAX_MESSAGES, -1)
+        pipe.expire(self.history_key, self.CACHE_TIMEOUT)
+        # The summary covers turns already trimmed from the list, so it must
+        # live as long as the list does.
+        pipe.expire(cache.make_key(self.summary_key), self.CACHE_TIMEOUT)
+        pipe.execute()
+
+    def get_summary(self) -> str:
+        return cache.get(self.summary_key, "")
+
+    def window(self, history: list[dict], reserved_tokens: int = 0) -> list[dict]:
+        """
+        Return the newest messages that fit in the budget, oldest first.
+        The newest message is always kept, even if it alone is over budget.
+        """
+        remaining = self.token_budget - reserved_tokens
+        window: list[dict] = []
+        for message in reversed(history):
+            tokens = count_message_tokens(message)
+            if tokens > remaining and window:
+                break
+            window.append(message)
+            remaining -= tokens
+        window.reverse()
+        return window
+
+    def acquire_compaction(self) -> bool:
+        """Return True if no other compaction is queued for this history."""
+        return cache.add(self.compaction_key, 1, timeout=self.COMPACTION_LOCK_TIMEOUT)
+
+    def compact(self, summarize):
+        """
+        Fold the oldest messages into the summary, keeping the newest half of
+        the budget verbatim. `summarize(summary, messages)` returns the new
+        summary text.
+        """
+        try:
+            history = self.load()
+            keep = self.window(history, reserved_tokens=self.token_budget // 2)
+            folded = len(history) - len(keep)
+            if not folded:
+                return
+            summary = summarize(self.get_summary(), history[:folded])
+            cache.set(self.summary_key, summary, timeout=self.CACHE_TIMEOUT)
+            # Turns appended meanwhile went to the tail; drop only the head
+            # that is now covered by the summary.
+            self.redis.ltrim(self.history_key, folded, -1)
+        finally:
+            cache.delete(self.compaction_key)
+
+    def clear(self):
+        self.redis.delete(self.history_key)
+        cache.delete(self.summary_key)
+
+
+def clear_chat_history(user_id: int):
+    """Forget every provider's conversation history and summary for a user."""
+    for namespace in HISTORY_NAMESPACES:
+        ChatHistoryManager(namespace, user_id, token_budget=0).clear()
@@ -0,0 +1,171 @@
+"""
+Cold tier of the Dialogue table: old rows moved to gzipped JSONL segment
+files in the default storage, one user's rows per segment.
+
+`archive_old_dialogues` moves them, run daily by Celery beat once
+`DIALOGUE_ARCHIVE_AFTER_DAYS` is set. `find_archived` and
+`archived_dialogues` read them back for the API.
+"""
+
+import datetime
+import gzip
+import json
+from collections.abc import Iterator
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db import transaction
+
+from dialogmanagement.dialogue.models import ArchivedDialogueSegment
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils.dialogue_cache import bump_dialogue_version
+
+# The Dialogue fields a segment keeps; the search vector is left behind.
+FIELDS = (
+    "id",
+    "user_id",
+    "status",
+    "content",
+    "type",
+    "model_id",
+    "model_version_id",
+)
+
+
+def encode(dialogues: list[Dialogue]) -> bytes:
+    lines = []
+    for dialogue in dialogues:
+        row = {field: getattr(dialogue, field) for field in FIELDS}
+        row["created_timestamp"] = dialogue.created_timestamp.isoformat()
+        row["updated_timestamp"] = dialogue.updated_timestamp.isoformat()
+        lines.append(json.dumps(row))
+    return gzip.compress("\n".join(lines).encode())
+
+
+def decode(row: dict) -> Dialogue:
+    return Dialogue(
+        **{field: row[field] for field in FIELDS},
+        created_timestamp=datetime.datetime.fromisoformat(row["created_timestamp"]),
+        updated_timestamp=datetime.datetime.fromisoformat(row["updated_timestamp"]),
+    )
+
+
+def segment_rows(segment: ArchivedDialogueSegment) -> Iterator[dict]:
+    with segment.file.open("rb") as raw, gzip.open(raw, "rt") as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def row_bytes(dialogue_ids: list[int]) -> int:
+    """Heap bytes the rows take in the Dialogue table, indexes aside."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT coalesce(sum(pg_column_size(d.*)), 0) "
+            "FROM dialogue_dialogue d WHERE id = ANY(%s)",
+            [dialogue_ids],
+        )
+        return cursor.fetchone()[0]
+
+
+def hot_table_bytes() -> int:
+    """Size of the Dialogue table with its indexes, partitions included."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT coalesce(sum(pg_total_relation_size(relid)), 0) "
+            "FROM pg_partition_tree('dialogue_dialogue')",
+        )
+        return cursor.fetchone()[0]
+
+
+def archive_segment(user_id: int, cutoff, batch_size: int) -> int:
+    """
+    Move up to `batch_size` of the user's dialogues created before
+    `cutoff`, oldest ids first, to a new segment. Return the rows moved.
+    """
+    with transaction.atomic():
+        dialogues = list(
+            Dialogue.objects.select_for_update()
+            .filter(user_id=user_id, created_timestamp__lt=cutoff)
+            .order_by("id")[:batch_size],
+        )
+        if not dialogues:
+            return 0
+        ids = [dialogue.id for dialogue in dialogues]
+        created = [dialogue.created_timestamp for dialogue in dialogues]
+        segment = ArchivedDialogueSegment(
+            user_id=user_id,
+            first_id=ids[0],
+            last_id=ids[-1],
+            first_created=min(created),
+            last_created=max(created),
+            row_count=len(dialogues),
+        )
+        data = encode(dialogues)
+        hot_bytes = row_bytes(ids)
+        # A file saved by a transaction that then fails is left behind.
+        segment.file.save(f"{ids[0]}-{ids[-1]}.jsonl.gz", ContentFile(data))
+        Dialogue.objects.filter(id__in=ids).delete()
+    bump_dialogue_version(user_id)
+    metrics.incr("archive.segments")
+    metrics.incr("archive.rows", len(ids))
+    metrics.incr("archive.hot_bytes", hot_bytes)
+    metrics.incr("archive.bytes", len(data))
+    return len(ids)
+
+
+def archive_old_dialogues(cutoff, batch_size: int) -> dict[str, int]:
+    """
+    Move every dialogue created before `cutoff` to segments. The table's
+    size only drops once VACUUM has reclaimed the rows; until then their
+    space is reused by new ones.
+    """
+    size_before = hot_table_bytes()
+    user_ids = list(
+        Dialogue.objects.filter(created_timestamp__lt=cutoff)
+        .values_list("user_id", flat=True)
+        .distinct(),
+    )
+    archived = 0
+    for user_id in user_ids:
+        while moved := archive_segment(user_id, cutoff, batch_size):
+            archived += moved
+    return {
+        "rows": archived,
+        "table_bytes_before": size_before,
+        "table_bytes_after": hot_table_bytes(),
+    }
+
+
+def archive_stats(counters: dict[str, int]) -> tuple[int, int, int] | None:
+    """Rows archived, heap bytes they took and bytes of their segments."""
+    rows = counters.get("archive.rows", 0)
+    if not rows:
+        return None
+    return rows, counters.get("archive.hot_bytes", 0), counters.get("archive.bytes", 0)
+
+
+def find_archived(user, dialogue_id: int) -> Dialogue | None:
+    """The user's archived dialogue `dialogue_id`, if there is one."""
+    segments = ArchivedDialogueSegment.objects.filter(
+        user=user,
+        first_id__lte=dialogue_id,
+        last_id__gte=dialogue_id,
+    )
+    for segment in segments:
+        for row in segment_rows(segment):
+            if row["id"] == dialogue_id:
+                dialogue = decode(row)
+                dialogue.user = user
+                return dialogue
+    return None
+
+
+def archived_dialogues(user) -> Iterator[Dialogue]:
+    """All the user's archived dialogues, streamed a segment file at a time."""
+    segments = ArchivedDialogueSegment.objects.filter(user=user).order_by("first_id")
+    for segment in segments:
+        for row in segment_rows(segment):
+            dialogue = decode(row)
+            dialogue.user = user
+            yield dialogue
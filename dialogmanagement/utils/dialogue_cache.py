@@ -0,0 +1,43 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+PAGE_CACHE_TIMEOUT = 60 * 5
+# Query parameters that select a dialogue list page.
+PAGE_PARAMS = ("before", "after", "page_size")
+
+
+def dialogue_version_key(user_id: int) -> str:
+    return f"user_dialogues_version_{user_id}"
+
+
+async def aget_dialogue_version(user_id: int) -> int:
+    """Return the user's dialogue version, creating it on first use."""
+    key = dialogue_version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        # Seed from the clock rather than 1, so a version that was evicted
+        # never comes back and matches a page cached before the eviction.
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_dialogue_version(user_id: int):
+    """Invalidate every cached page of the user's dialogues once committed."""
+
+    def bump():
+        key = dialogue_version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+async def adialogue_page_cache_key(user_id: int, query_params) -> str:
+    version = await aget_dialogue_version(user_id)
+    page = "_".join(f"{param}={query_params.get(param, '')}" for param in PAGE_PARAMS)
+    return f"user_dialogues_{user_id}_v{version}_{page}"
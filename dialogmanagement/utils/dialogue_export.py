@@ -0,0 +1,89 @@
+"""
+A user's whole dialogue history as NDJSON or CSV, produced a chunk of rows
+at a time so memory stays flat however long the history is.
+"""
+
+import csv
+import itertools
+import zlib
+from collections.abc import AsyncIterator
+from collections.abc import Iterable
+from collections.abc import Iterator
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.utils import dialogue_archive
+
+NDJSON = "ndjson"
+CSV = "csv"
+
+COLUMNS = (
+    "id",
+    "status",
+    "type",
+    "content",
+    "model_id",
+    "model_version_id",
+    "created_timestamp",
+    "updated_timestamp",
+)
+
+
+class Echo:
+    """A file for `csv.writer` that hands each written line back."""
+
+    def write(self, value):
+        return value
+
+
+def rows(user, chunk_size: int) -> Iterator[tuple]:
+    """
+    The user's archived rows, then those in the table, each by id. Table rows
+    come from a server-side cursor, `chunk_size` at a time.
+    """
+    for dialogue in dialogue_archive.archived_dialogues(user):
+        yield tuple(getattr(dialogue, column) for column in COLUMNS)
+    table_rows = Dialogue.objects.filter(user=user).order_by("id").values_list(*COLUMNS)
+    yield from table_rows.iterator(chunk_size=chunk_size)
+
+
+def export(user, output: str, chunk_size: int) -> Iterator[bytes]:
+    """The rows of `rows` in `output`, one chunk of rows per bytes string."""
+    if output == CSV:
+        writer = csv.writer(Echo())
+        encode = writer.writerow
+        yield encode(COLUMNS).encode()
+    else:
+        encoder = DjangoJSONEncoder()
+
+        def encode(row):
+            return encoder.encode(dict(zip(COLUMNS, row, strict=True))) + "\n"
+
+    for chunk in itertools.batched(rows(user, chunk_size), chunk_size):
+        yield "".join(encode(row) for row in chunk).encode()
+
+
+def gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a byte stream as it is produced."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+async def aiterate(iterator: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Pull a sync iterator an item at a time in Django's thread, for an ASGI
+    response. `aiterator()` is no help here: it runs the query of a
+    values_list() on the loop.
+    """
+
+    @sync_to_async
+    def next_item() -> bytes | None:
+        return next(iterator, None)
+
+    while (item := await next_item()) is not None:
+        yield item
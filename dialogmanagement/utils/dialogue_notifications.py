@@ -0,0 +1,53 @@
+import asyncio
+
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from dialogmanagement.utils.subscriber import get_subscriber
+
+
+def new_dialogues_channel(user_id: int) -> str:
+    return f"dialogue_new_{user_id}"
+
+
+def notify_new_dialogues(user_id: int):
+    """Wake the user's waiting long-poll requests once the transaction commits."""
+    transaction.on_commit(
+        lambda: get_redis_connection("default").publish(
+            new_dialogues_channel(user_id),
+            b"1",
+        ),
+    )
+
+
+class NewDialogueListener:
+    """
+    Waiter for one user's new-dialogue notifications, registered with the
+    process's shared Subscriber instead of opening a pub/sub connection.
+
+    Enter it before checking the database for new rows, so a row committed
+    between the check and `wait()` still wakes the waiter. Entering raises
+    TooManySubscriptionsError when the process waits on too many channels.
+    """
+
+    def __init__(self, user_id: int):
+        self.channel = new_dialogues_channel(user_id)
+        self.notified = asyncio.Event()
+
+    def notify(self, data):
+        self.notified.set()
+
+    async def __aenter__(self):
+        await get_subscriber().subscribe(self.channel, self.notify)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await get_subscriber().unsubscribe(self.channel, self.notify)
+
+    async def wait(self, seconds: float) -> bool:
+        """Wait for a notification; False if none arrives within `seconds`."""
+        try:
+            await asyncio.wait_for(self.notified.wait(), timeout=seconds)
+        except TimeoutError:
+            return False
+        return True
@@ -0,0 +1,311 @@
+"""
+Monthly range partitioning of the Dialogue table by `created_timestamp`.
+
+`python manage.py partition_dialogues` moves an existing table over while it
+stays in use: it builds a partitioned copy next to it, keeps the copy in step
+with a trigger while rows are copied in batches, then swaps the two tables in
+one short transaction. The `create_dialogue_partitions` task keeps partitions
+ahead of the clock, of the copy while it is filled and of the table after.
+A default partition takes the rows of months without one, so a write is
+never refused for its timestamp.
+"""
+
+import datetime
+import re
+
+from django.db import connection
+from django.db import transaction
+
+TABLE = "dialogue_dialogue"
+# The partitioned table while it is filled, and the old table after the swap.
+NEW_TABLE = f"{TABLE}_partitioned"
+OLD_TABLE = f"{TABLE}_unpartitioned"
+MIRROR_TRIGGER = f"{TABLE}_mirror"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+# Copies every write to the old table into the new one until the swap. The
+# backfill inserts with ON CONFLICT DO NOTHING, so a mirrored row wins, and
+# locks the rows it copies, so a write to one waits until the copy is in.
+CREATE_MIRROR_SQL = f"""
+CREATE OR REPLACE FUNCTION {MIRROR_TRIGGER}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {NEW_TABLE} WHERE id = OLD.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {NEW_TABLE} SELECT NEW.*;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER {MIRROR_TRIGGER}
+AFTER INSERT OR UPDATE OR DELETE ON {TABLE}
+FOR EACH ROW EXECUTE FUNCTION {MIRROR_TRIGGER}();
+"""  # noqa: S608
+
+DROP_MIRROR_SQL = f"""
+DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {TABLE};
+DROP FUNCTION IF EXISTS {MIRROR_TRIGGER}();
+"""
+
+# Same as migration 0004 of the dialogue app.
+CREATE_SEARCH_TRIGGER_SQL = f"""
+CREATE TRIGGER dialogue_dialogue_search_vector_trigger
+BEFORE INSERT OR UPDATE OF content ON {NEW_TABLE}
+FOR EACH ROW EXECUTE FUNCTION dialogue_dialogue_search_vector_update();
+"""
+
+# Longest name Postgres keeps for an index or constraint.
+MAX_NAME_LENGTH = 63
+
+
+def month_start(moment: datetime.datetime) -> datetime.date:
+    return moment.astimezone(datetime.UTC).date().replace(day=1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    # Named after the live table from the start, so a swap keeps the names.
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned(table: str = TABLE) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)",
+            [table],
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def table_exists(table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [table])
+        return cursor.fetchone()[0]
+
+
+def default_partition(table: str) -> str | None:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT partdefid::regclass::text FROM pg_partitioned_table "
+            "WHERE partrelid = %s::regclass AND partdefid <> 0",
+            [table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def create_partition(cursor, table: str, month: datetime.date, default: str | None):
+    """Create `table`'s partition for `month`, with the rows `default` holds."""
+    name = partition_name(month)
+    start, end = (
+        datetime.datetime.combine(day, datetime.time(), datetime.UTC)
+        for day in (month, add_months(month, 1))
+    )
+    # Bounds are UTC month starts; Postgres compares instants.
+    bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    in_month = "created_timestamp >= %s AND created_timestamp < %s"
+    held = False
+    if default is not None:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})",  # noqa: S608
+            [start, end],
+        )
+        held = cursor.fetchone()[0]
+    if not held:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} {bounds}")
+        return
+    # Postgres refuses a partition for rows the default one holds: they are
+    # moved to a table of their own, which is then attached.
+    cursor.execute(
+        f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+    )
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {default} WHERE {in_month} RETURNING *) "  # noqa: S608
+        f"INSERT INTO {name} SELECT * FROM moved",
+        [start, end],
+    )
+    cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}")
+
+
+def create_partitions(
+    table: str,
+    first: datetime.date,
+    last: datetime.date,
+) -> list[str]:
+    """
+    Create the monthly partitions of `table` from `first` to `last`, moving
+    in the rows its default partition holds for them.
+    """
+    created = []
+    default = default_partition(table)
+    month = first
+    with transaction.atomic(), connection.cursor() as cursor:
+        while month <= last:
+            name = partition_name(month)
+            if not table_exists(name):
+                create_partition(cursor, table, month, default)
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+def ensure_partitions(now: datetime.datetime, months_ahead: int) -> list[str]:
+    """
+    Create the partitions of the Dialogue table, or of its partitioned copy
+    while one is being filled, up to `months_ahead` months after `now`'s.
+    """
+    month = month_start(now)
+    for table in (TABLE, NEW_TABLE):
+        if is_partitioned(table):
+            return create_partitions(table, month, add_months(month, months_ahead))
+    return []
+
+
+def temporary_name(name: str) -> str:
+    return f"{name[: MAX_NAME_LENGTH - 2]}_p"
+
+
+def retired_name(name: str) -> str:
+    return f"{name[: MAX_NAME_LENGTH - 4]}_old"
+
+
+def secondary_indexes(cursor) -> list[tuple[str, str]]:
+    """Name and definition of the live table's indexes, but its primary key."""
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexname <> %s",
+        [TABLE, f"{TABLE}_pkey"],
+    )
+    return cursor.fetchall()
+
+
+def create_new_table(now: datetime.datetime, months_ahead: int):
+    """
+    Create the partitioned copy of the Dialogue table, with its partitions,
+    keys, indexes and triggers, and start mirroring writes into it.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS "
+            "INCLUDING CONSTRAINTS INCLUDING IDENTITY) "
+            "PARTITION BY RANGE (created_timestamp)",
+        )
+        # A key of a partitioned table must include the partition column.
+        cursor.execute(
+            f"ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {NEW_TABLE}_pkey "
+            "PRIMARY KEY (id, created_timestamp)",
+        )
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        for name, definition in cursor.fetchall():
+            cursor.execute(
+                f"ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {name} {definition}",
+            )
+        for name, definition in secondary_indexes(cursor):
+            cursor.execute(
+                re.sub(
+                    rf"INDEX {name} ON (\S+\.)?{TABLE} ",
+                    f"INDEX {temporary_name(name)} ON {NEW_TABLE} ",
+                    definition,
+                ),
+            )
+        cursor.execute(CREATE_SEARCH_TRIGGER_SQL)
+        cursor.execute(f"SELECT min(created_timestamp) FROM {TABLE}")  # noqa: S608
+        oldest = cursor.fetchone()[0] or now
+        cursor.execute(f"SELECT max(created_timestamp) FROM {TABLE}")  # noqa: S608
+        newest = max(cursor.fetchone()[0] or now, now)
+        create_partitions(
+            NEW_TABLE,
+            month_start(oldest),
+            add_months(month_start(newest), months_ahead),
+        )
+        cursor.execute(
+            f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {NEW_TABLE} DEFAULT",
+        )
+        cursor.execute(CREATE_MIRROR_SQL)
+
+
+def id_range(table: str) -> tuple[int, int]:
+    with connection.cursor() as cursor:
+        sql = f"SELECT coalesce(min(id), 0), coalesce(max(id), 0) FROM {table}"  # noqa: S608
+        cursor.execute(sql)
+        return cursor.fetchone()
+
+
+def copy_batch(first_id: int, last_id: int) -> int:
+    """
+    Copy the rows with ids in [first_id, last_id] to the new table. Writes
+    to them wait until the batch commits: until then the mirror trigger
+    cannot see the copies it should replace.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {NEW_TABLE} SELECT * FROM {TABLE} "  # noqa: S608
+            "WHERE id BETWEEN %s AND %s FOR SHARE ON CONFLICT DO NOTHING",
+            [first_id, last_id],
+        )
+        return cursor.rowcount
+
+
+def prune_batch(first_id: int, last_id: int) -> int:
+    """
+    Delete copied rows, with ids in [first_id, last_id], that were deleted
+    from the live table while their batch was being copied.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {NEW_TABLE} n WHERE n.id BETWEEN %s AND %s "  # noqa: S608
+            f"AND NOT EXISTS (SELECT 1 FROM {TABLE} o WHERE o.id = n.id)",
+            [first_id, last_id],
+        )
+        return cursor.rowcount
+
+
+def swap_tables():
+    """
+    Put the partitioned table in place of the live one, which is kept as
+    `OLD_TABLE`. Writers wait on the lock for the few renames this takes.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(DROP_MIRROR_SQL)
+        indexes = [name for name, _ in secondary_indexes(cursor)]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        old_sequence = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+        cursor.execute(
+            f"ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT {TABLE}_pkey "
+            f"TO {OLD_TABLE}_pkey",
+        )
+        for name in indexes:
+            cursor.execute(f"ALTER INDEX {name} RENAME TO {retired_name(name)}")
+        cursor.execute(
+            f"ALTER SEQUENCE {old_sequence} RENAME TO {OLD_TABLE}_id_seq",
+        )
+
+        cursor.execute(f"ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}")
+        cursor.execute(
+            f"ALTER TABLE {TABLE} RENAME CONSTRAINT {NEW_TABLE}_pkey TO {TABLE}_pkey",
+        )
+        for name in indexes:
+            cursor.execute(f"ALTER INDEX {temporary_name(name)} RENAME TO {name}")
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        new_sequence = cursor.fetchone()[0]
+        cursor.execute(f"ALTER SEQUENCE {new_sequence} RENAME TO {TABLE}_id_seq")
+        # Continue after every id handed out so far, reserved ones included.
+        cursor.execute(
+            f"SELECT setval('{TABLE}_id_seq', last_value, is_called) "  # noqa: S608
+            f"FROM {OLD_TABLE}_id_seq",
+        )
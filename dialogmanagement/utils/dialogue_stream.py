@@ -0,0 +1,214 @@
+import asyncio
+import json
+import time
+from collections.abc import AsyncGenerator
+from collections.abc import Awaitable
+from collections.abc import Iterator
+from typing import cast
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from dialogmanagement.utils import async_redis
+from dialogmanagement.utils.error_handle import TooManySubscriptionsError
+from dialogmanagement.utils.subscriber import get_subscriber
+
+# How long a finished or abandoned reply stays replayable for late joiners.
+STREAM_BUFFER_TIMEOUT = 60 * 5
+# Longest a client stays connected waiting for a reply; it can reconnect
+# with `Last-Event-ID` to carry on.
+STREAM_TIMEOUT = 60 * 2
+# Comment lines sent while idle keep proxies from closing the connection.
+HEARTBEAT_INTERVAL = 15
+
+DELTA = "delta"
+DONE = "done"
+ERROR = "error"
+# Sent by the relay, never published: the client should reconnect.
+TIMEOUT = "timeout"
+
+
+def stream_channel(user_id: int, dialogue_id: int) -> str:
+    return f"dialogue_stream_{user_id}_{dialogue_id}"
+
+
+def stream_buffer_key(user_id: int, dialogue_id: int) -> str:
+    return cache.make_key(f"{stream_channel(user_id, dialogue_id)}_buffer")
+
+
+class DialogueStreamPublisher:
+    """
+    Publishes the AI reply to one dialogue as it is generated.
+
+    Every event is a JSON object `{"seq", "event", "text"}`, where `event` is
+    `delta` for a chunk of text, then `done` or `error` once. It is sent on the
+    dialogue's pub/sub channel and appended to a short-lived buffer list in
+    the same round-trip. A late subscriber replays the buffer and then skips
+    live events whose `seq` it has already seen.
+    """
+
+    def __init__(self, user_id: int, dialogue_id: int):
+        self.redis = get_redis_connection("default")
+        self.channel = stream_channel(user_id, dialogue_id)
+        self.buffer_key = stream_buffer_key(user_id, dialogue_id)
+        self.seq = 0
+
+    def publish(self, event: str, text: str = ""):
+        pipe = self.redis.pipeline(transaction=False)
+        self.queue_event(pipe, event, text)
+        pipe.execute()
+
+    async def apublish(self, event: str, text: str = ""):
+        pipe = async_redis.get_client().pipeline(transaction=False)
+        self.queue_event(pipe, event, text)
+        await pipe.execute()
+
+    def queue_event(self, pipe, event: str, text: str):
+        self.seq += 1
+        payload = json.dumps({"seq": self.seq, "event": event, "text": text})
+        pipe.rpush(self.buffer_key, payload)
+        pipe.expire(self.buffer_key, STREAM_BUFFER_TIMEOUT)
+        pipe.publish(self.channel, payload)
+
+    def delta(self, text: str):
+        self.publish(DELTA, text)
+
+    def done(self):
+        self.publish(DONE)
+
+    def error(self, message: str):
+        self.publish(ERROR, message)
+
+    async def adelta(self, text: str):
+        await self.apublish(DELTA, text)
+
+    async def adone(self):
+        await self.apublish(DONE)
+
+    async def aerror(self, message: str):
+        await self.apublish(ERROR, message)
+
+
+def read_stream_buffer(user_id: int, dialogue_id: int) -> list[dict]:
+    """Return the events published so far for a dialogue's reply."""
+    redis = get_redis_connection("default")
+    raw = redis.lrange(stream_buffer_key(user_id, dialogue_id), 0, -1)
+    return [json.loads(item) for item in raw]
+
+
+async def stream_started(user_id: int, dialogue_id: int) -> bool:
+    """Whether any event of the dialogue's reply is still buffered."""
+    client = async_redis.get_client()
+    return bool(await client.exists(stream_buffer_key(user_id, dialogue_id)))
+
+
+def format_event(event: dict) -> str:
+    """Render an event in the `text/event-stream` wire format."""
+    data = json.dumps({"text": event["text"]})
+    return f"id: {event['seq']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+def relay_dialogue_stream(
+    user_id: int,
+    dialogue_id: int,
+    last_seq: int = 0,
+    max_duration: float = STREAM_TIMEOUT,
+) -> Iterator[str]:
+    """
+    `arelay_dialogue_stream` for a WSGI worker, which holds a thread and a
+    pub/sub connection of its own for as long as the stream is open.
+    """
+    pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+    deadline = time.monotonic() + max_duration
+    try:
+        pubsub.subscribe(stream_channel(user_id, dialogue_id))
+        pending = read_stream_buffer(user_id, dialogue_id)
+        last_write = time.monotonic()
+        while True:
+            for event in pending:
+                if event["seq"] <= last_seq:
+                    continue
+                last_seq = event["seq"]
+                last_write = time.monotonic()
+                yield format_event(event)
+                if event["event"] in (DONE, ERROR):
+                    return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield format_event({"seq": last_seq, "event": TIMEOUT, "text": ""})
+                return
+            if time.monotonic() - last_write >= HEARTBEAT_INTERVAL:
+                last_write = time.monotonic()
+                yield ": keep-alive\n\n"
+            message = pubsub.get_message(timeout=min(remaining, HEARTBEAT_INTERVAL))
+            pending = [] if message is None else [json.loads(message["data"])]
+    finally:
+        pubsub.close()
+
+
+async def arelay_dialogue_stream(
+    user_id: int,
+    dialogue_id: int,
+    last_seq: int = 0,
+    max_duration: float = STREAM_TIMEOUT,
+) -> AsyncGenerator[str, None]:
+    """
+    Yield a dialogue's reply events as Server-Sent Events until `done` or
+    `error`, skipping those up to `last_seq`.
+
+    The channel is subscribed before the buffer is read, so no event falls
+    between the replay and the live messages; `seq` drops the duplicates.
+    Waiting is a coroutine on the event loop and the subscription is shared
+    through the process's Subscriber, so an ASGI worker can hold many open
+    streams on one Redis connection. When it holds too many, the stream ends
+    at once with `timeout`.
+    """
+    channel = stream_channel(user_id, dialogue_id)
+    messages: asyncio.Queue = asyncio.Queue()
+    notify = messages.put_nowait
+    subscriber = get_subscriber()
+    try:
+        await subscriber.subscribe(channel, notify)
+    except TooManySubscriptionsError:
+        yield format_event({"seq": last_seq, "event": TIMEOUT, "text": ""})
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_duration
+    try:
+        backlog = await cast(
+            Awaitable[list],
+            async_redis.get_client().lrange(
+                stream_buffer_key(user_id, dialogue_id),
+                0,
+                -1,
+            ),
+        )
+        pending = [json.loads(item) for item in backlog]
+        last_write = loop.time()
+        while True:
+            for event in pending:
+                if event["seq"] <= last_seq:
+                    continue
+                last_seq = event["seq"]
+                last_write = loop.time()
+                yield format_event(event)
+                if event["event"] in (DONE, ERROR):
+                    return
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                yield format_event({"seq": last_seq, "event": TIMEOUT, "text": ""})
+                return
+            if loop.time() - last_write >= HEARTBEAT_INTERVAL:
+                last_write = loop.time()
+                yield ": keep-alive\n\n"
+            try:
+                data = await asyncio.wait_for(
+                    messages.get(),
+                    timeout=min(remaining, HEARTBEAT_INTERVAL),
+                )
+            except TimeoutError:
+                pending = []
+            else:
+                pending = [json.loads(data)]
+    finally:
+        await subscriber.unsubscribe(channel, notify)
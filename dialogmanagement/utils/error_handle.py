@@ -1,6 +1,6 @@
 class AIModelError(Exception):
-    def __init___(self, meassage, status_code=400, *args):
-        self.message = meassage
+    def __init__(self, message, status_code=400, *args):
+        self.message = message
         self.status_code = status_code
         super().__init__(self.message, *args)
 
@@ -10,3 +10,32 @@ class NotFoundError(Exception):
         self.message = message
         self.status_code = status_code
         super().__init__(self.message, *args)
+
+
+class RateLimitedError(Exception):
+    """The provider's rate limit has no room for a call for `retry_after` s."""
+
+    def __init__(self, provider, retry_after, *args):
+        self.provider = provider
+        self.retry_after = retry_after
+        message = f"{provider} rate limit reached, retry in {retry_after:.1f}s."
+        super().__init__(message, *args)
+
+
+class CircuitOpenError(Exception):
+    """Calls to a failing provider are refused for the next `retry_after` s."""
+
+    def __init__(self, provider, retry_after, *args):
+        self.provider = provider
+        self.retry_after = retry_after
+        message = f"{provider} is failing, calls resume in {retry_after:.1f}s."
+        super().__init__(message, *args)
+
+
+class TooManySubscriptionsError(Exception):
+    """This process already waits on `PUBSUB_MAX_SUBSCRIPTIONS` channels."""
+
+    def __init__(self, subscriptions, *args):
+        self.subscriptions = subscriptions
+        message = f"{subscriptions} pub/sub subscriptions open, try again later."
+        super().__init__(message, *args)
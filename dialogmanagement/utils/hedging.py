@@ -0,0 +1,267 @@
+import asyncio
+import math
+import time
+from collections.abc import AsyncGenerator
+from collections.abc import AsyncIterator
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import cast
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from dialogmanagement.utils import async_redis
+from dialogmanagement.utils import metrics
+
+# Latest times to first token kept per model version, and how many of them
+# are needed before their percentile is trusted to start hedges.
+SAMPLES = 200
+MIN_SAMPLES = 20
+PERCENTILE = 95
+
+# Threads awaiting the first chunks of sync races, shared by the process's
+# turns: a hedged turn takes two for as long as its slower call blocks.
+pool = ThreadPoolExecutor(32, thread_name_prefix="ai-hedge")
+
+
+def samples_key(model_version_id: int) -> str:
+    return cache.make_key(f"ai_ttft_samples_{model_version_id}")
+
+
+def queue_record(pipe, model_version_id: int, elapsed_ms: float):
+    key = samples_key(model_version_id)
+    pipe.lpush(key, round(elapsed_ms))
+    pipe.ltrim(key, 0, SAMPLES - 1)
+
+
+def record_ttft(model_version_id: int, elapsed_ms: float):
+    """Keep a time to first token of the model version for `hedge_delay`."""
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    queue_record(pipe, model_version_id, elapsed_ms)
+    pipe.execute()
+
+
+async def arecord_ttft(model_version_id: int, elapsed_ms: float):
+    pipe = async_redis.get_client().pipeline(transaction=False)
+    queue_record(pipe, model_version_id, elapsed_ms)
+    await pipe.execute()
+
+
+def percentile_delay(samples: list[bytes]) -> float | None:
+    """Seconds at the `PERCENTILE` of the samples, or None if too few."""
+    if len(samples) < MIN_SAMPLES:
+        return None
+    ordered = sorted(int(sample) for sample in samples)
+    return ordered[math.ceil(len(ordered) * PERCENTILE / 100) - 1] / 1000
+
+
+def hedge_delay(model_version_id: int) -> float | None:
+    """
+    How long a call to the model version may go without a first chunk
+    before it is hedged: its p95 time to first token, or None while it has
+    too few samples.
+    """
+    redis = get_redis_connection("default")
+    return percentile_delay(redis.lrange(samples_key(model_version_id), 0, -1))
+
+
+async def ahedge_delay(model_version_id: int) -> float | None:
+    client = async_redis.get_client()
+    samples = await cast(
+        Awaitable[list],
+        client.lrange(samples_key(model_version_id), 0, -1),
+    )
+    return percentile_delay(samples)
+
+
+def hedge_stats(counters: dict[str, int]) -> tuple[int, float, int] | None:
+    """Hedges sent, the share of them that answered, and the tokens they cost."""
+    sent = counters.get("hedge.requests", 0)
+    if not sent:
+        return None
+    return sent, counters.get("hedge.wins", 0) / sent, counters.get("hedge.tokens", 0)
+
+
+async def first_chunk(stream: AsyncIterator[str]) -> str | None:
+    return await anext(stream, None)
+
+
+def closer(stream: Generator[str, None, None]) -> Callable[[Future], None]:
+    """A done callback closing `stream`."""
+    return lambda _future: stream.close()
+
+
+def abandon(streams: dict[Future, Generator[str, None, None]]):
+    """
+    Cancel the reads of `streams` not started yet. A blocking read cannot
+    be interrupted, so its stream is closed once its first chunk is in.
+    """
+    for future, stream in streams.items():
+        future.cancel()
+        future.add_done_callback(closer(stream))
+    streams.clear()
+
+
+class Hedge:
+    """
+    Races a model version's reply stream against its fallback version's.
+
+    The fallback is called when the primary fails before its first chunk (a
+    failover), or has no first chunk `delay` seconds after the race starts
+    (a hedge; a delay of None never hedges). The first stream to yield a
+    chunk answers and the other is abandoned. If both fail, the primary's
+    error is raised.
+
+    Hedges are counted in `hedge.requests`, those that answered in
+    `hedge.wins` and the tokens they were charged in `hedge.tokens`;
+    failovers in `hedge.failovers`.
+    """
+
+    def __init__(self, model_version_id: int, delay: float | None, cost: int):
+        self.model_version_id = model_version_id
+        self.delay = delay
+        self.cost = cost
+        self.hedged = False
+
+    def race(
+        self,
+        primary: Generator[str, None, None],
+        start_fallback: Callable[[], Generator[str, None, None]],
+    ) -> Iterator[str]:
+        # The first chunks are awaited in threads; the answer's other chunks
+        # are read by the caller.
+        streams = {pool.submit(next, primary, None): primary}
+        pending, timeout = set(streams), self.delay
+        fallback: Generator[str, None, None] | None = None
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = wait(pending, timeout, FIRST_COMPLETED)
+                timeout = None
+                for future in done:
+                    stream = streams.pop(future)
+                    if future.exception() is None:
+                        self.count_answer(by_fallback=stream is fallback)
+                        abandon(streams)
+                        yield from self.answer(future.result(), stream)
+                        return
+                    if stream is primary or error is None:
+                        error = future.exception()
+                if fallback is None:
+                    fallback = start_fallback()
+                    self.count_fallback(hedge=not done)
+                    future = pool.submit(next, fallback, None)
+                    streams[future] = fallback
+                    pending.add(future)
+        finally:
+            # Also when the caller stops reading mid-race.
+            abandon(streams)
+        # Every stream failed, so an error was kept.
+        assert error is not None
+        raise error
+
+    async def arace(
+        self,
+        primary: AsyncGenerator[str, None],
+        start_fallback: Callable[[], AsyncGenerator[str, None]],
+    ) -> AsyncIterator[str]:
+        """
+        `race` on an event loop, where the losing call is cancelled. A
+        primary cut short that way still adds its wait as a sample, so its
+        slowest calls keep counting in its percentile.
+        """
+        start = time.perf_counter()
+        streams = {asyncio.ensure_future(first_chunk(primary)): primary}
+        pending, timeout = set(streams), self.delay
+        fallback: AsyncGenerator[str, None] | None = None
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                timeout = None
+                for task in done:
+                    stream = streams.pop(task)
+                    if task.exception() is None:
+                        await self.acount_answer(by_fallback=stream is fallback)
+                        await self.acancel(streams, primary, start)
+                        async for chunk in self.aanswer(task.result(), stream):
+                            yield chunk
+                        return
+                    if stream is primary or error is None:
+                        error = task.exception()
+                if fallback is None:
+                    fallback = start_fallback()
+                    await self.acount_fallback(hedge=not done)
+                    task = asyncio.ensure_future(first_chunk(fallback))
+                    streams[task] = fallback
+                    pending.add(task)
+        finally:
+            # Stop the reads left if the caller is cancelled mid-race.
+            for task in streams:
+                task.cancel()
+        assert error is not None
+        raise error
+
+    async def acancel(
+        self,
+        streams: dict[asyncio.Task, AsyncGenerator[str, None]],
+        primary: AsyncGenerator[str, None],
+        start: float,
+    ):
+        for task, stream in streams.items():
+            if stream is primary and not task.done():
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                await arecord_ttft(self.model_version_id, elapsed_ms)
+            task.cancel()
+            await asyncio.wait([task])
+            await stream.aclose()
+
+    @staticmethod
+    def answer(first: str | None, stream: Iterator[str]) -> Iterator[str]:
+        if first is not None:
+            yield first
+            yield from stream
+
+    @staticmethod
+    async def aanswer(
+        first: str | None,
+        stream: AsyncIterator[str],
+    ) -> AsyncIterator[str]:
+        if first is not None:
+            yield first
+            async for chunk in stream:
+                yield chunk
+
+    def count_fallback(self, *, hedge: bool):
+        self.hedged = hedge
+        if hedge:
+            metrics.incr("hedge.requests")
+            metrics.incr("hedge.tokens", self.cost)
+        else:
+            metrics.incr("hedge.failovers")
+
+    def count_answer(self, *, by_fallback: bool):
+        if by_fallback and self.hedged:
+            metrics.incr("hedge.wins")
+
+    async def acount_fallback(self, *, hedge: bool):
+        self.hedged = hedge
+        if hedge:
+            await metrics.aincr("hedge.requests")
+            await metrics.aincr("hedge.tokens", self.cost)
+        else:
+            await metrics.aincr("hedge.failovers")
+
+    async def acount_answer(self, *, by_fallback: bool):
+        if by_fallback and self.hedged:
+            await metrics.aincr("hedge.wins")
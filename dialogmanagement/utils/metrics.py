@@ -0,0 +1,78 @@
+import time
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django_redis import get_redis_connection
+
+# One Redis hash holds every counter, so all web and worker processes
+# report into the same place.
+METRICS_KEY = "ai_metrics"
+
+
+def incr(name: str, amount: int = 1):
+    get_redis_connection("default").hincrby(METRICS_KEY, name, amount)
+
+
+def get_counters() -> dict[str, int]:
+    raw = get_redis_connection("default").hgetall(METRICS_KEY)
+    return {name.decode(): int(value) for name, value in raw.items()}
+
+
+def ratio(counters: dict[str, int], part: str, whole: str) -> float | None:
+    """Return `counters[part] / counters[whole]`, or None before any data."""
+    total = counters.get(whole, 0)
+    if not total:
+        return None
+    return counters.get(part, 0) / total
+
+
+def connection_reuse_rate(counters: dict[str, int], provider: str) -> float | None:
+    """Share of provider requests that went out on an already open connection."""
+    new_connections = ratio(counters, f"{provider}.connections", f"{provider}.requests")
+    return None if new_connections is None else 1 - new_connections
+
+
+def reset():
+    get_redis_connection("default").delete(METRICS_KEY)
+
+
+def observe_ms(name: str, elapsed_ms: float):
+    """Add a duration to `{name}.ms` and count it in `{name}.count`."""
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    pipe.hincrby(METRICS_KEY, f"{name}.count", 1)
+    pipe.hincrby(METRICS_KEY, f"{name}.ms", round(elapsed_ms))
+    pipe.execute()
+
+
+@contextmanager
+def timer(name: str):
+    """Record the block's wall time with `observe_ms`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_ms(name, (time.perf_counter() - start) * 1000)
+
+
+async def aincr(name: str, amount: int = 1):
+    await sync_to_async(incr, thread_sensitive=False)(name, amount)
+
+
+async def aobserve_ms(name: str, elapsed_ms: float):
+    await sync_to_async(observe_ms, thread_sensitive=False)(name, elapsed_ms)
+
+
+@asynccontextmanager
+async def atimer(name: str):
+    """`timer` for a block on an event loop."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        await aobserve_ms(name, (time.perf_counter() - start) * 1000)
+
+
+def average_ms(counters: dict[str, int], name: str) -> float | None:
+    """Mean duration of a `timer` block, or None before any data."""
+    return ratio(counters, f"{name}.ms", f"{name}.count")
@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from dialogmanagement.utils import async_redis
+
+# Token buckets refilled continuously at their per-minute capacity. KEYS are
+# the request and token buckets; ARGV is the current time, then the capacity
+# (0: unlimited) and cost of each bucket. Both costs are taken or neither;
+# the result is 0 or the seconds until both fit.
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local cost = math.min(tonumber(ARGV[i * 2 + 1]), capacity)
+    if capacity > 0 then
+        local state = redis.call("HMGET", key, "level", "updated")
+        local rate = capacity / 60
+        local level = tonumber(state[1]) or capacity
+        local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+        level = math.min(capacity, level + elapsed * rate)
+        levels[i] = level - cost
+        if level < cost then
+            wait = math.max(wait, (cost - level) / rate)
+        end
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    if levels[i] then
+        redis.call("HSET", key, "level", levels[i], "updated", now)
+        redis.call("EXPIRE", key, 120)
+    end
+end
+return "0"
+"""
+
+
+def acquire_args(provider: str, tokens: int) -> dict:
+    limits = settings.AI_PROVIDER_RATE_LIMITS.get(provider, {})
+    return {
+        "keys": [
+            cache.make_key(f"ai_rate_{provider}_requests"),
+            cache.make_key(f"ai_rate_{provider}_tokens"),
+        ],
+        "args": [
+            time.time(),
+            limits.get("requests_per_minute", 0),
+            1,
+            limits.get("tokens_per_minute", 0),
+            tokens,
+        ],
+    }
+
+
+def acquire(provider: str, tokens: int) -> float:
+    """
+    Take one request and `tokens` tokens from the provider's per-minute
+    limits. Return 0 if they were taken, or else the seconds until they can
+    be, without taking anything.
+    """
+    script = get_redis_connection("default").register_script(ACQUIRE_SCRIPT)
+    return float(script(**acquire_args(provider, tokens)))
+
+
+async def aacquire(provider: str, tokens: int) -> float:
+    """`acquire` on the event loop's Redis client."""
+    script = async_redis.get_client().register_script(ACQUIRE_SCRIPT)
+    return float(await script(**acquire_args(provider, tokens)))
@@ -0,0 +1,148 @@
+import random
+import time
+
+import httpx
+import openai
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from google.genai import errors as genai_errors
+
+from dialogmanagement.utils import async_redis
+from dialogmanagement.utils.error_handle import CircuitOpenError
+
+# Provider failures, as sorted by `classify`.
+TRANSIENT = "transient"  # The backend is unhealthy: retry, count as failure.
+THROTTLED = "throttled"  # The provider's own rate limit: retry only.
+FATAL = "fatal"  # The request itself is wrong: do not retry.
+
+THROTTLED_STATUS = 429
+TRANSIENT_STATUS = {408, 409}
+
+# Longest one probe of a half-open circuit may take before another is let in.
+PROBE_TIMEOUT = 30
+
+# Return the circuit's state for a caller: [0] closed, [1, wait] open or
+# another probe is in flight, or [2] the caller probes a half-open circuit.
+# KEYS: circuit hash, probe key. ARGV: now, probe timeout.
+CHECK_SCRIPT = """
+local opened_until = tonumber(redis.call("HGET", KEYS[1], "opened_until") or "0")
+if opened_until == 0 then
+    return {0}
+end
+local now = tonumber(ARGV[1])
+if now < opened_until then
+    return {1, tostring(opened_until - now)}
+end
+if redis.call("SET", KEYS[2], 1, "NX", "EX", ARGV[2]) then
+    return {2}
+end
+return {1, ARGV[2]}
+"""
+
+# Count a failure, and open the circuit at the threshold or when a probe
+# fails. KEYS: circuit hash, probe key. ARGV: now, threshold, window,
+# cooldown.
+FAILURE_SCRIPT = """
+local failures = redis.call("HINCRBY", KEYS[1], "failures", 1)
+local opened_until = tonumber(redis.call("HGET", KEYS[1], "opened_until") or "0")
+local cooldown = tonumber(ARGV[4])
+if opened_until > 0 or failures >= tonumber(ARGV[2]) then
+    redis.call("HSET", KEYS[1], "opened_until", tonumber(ARGV[1]) + cooldown)
+    redis.call("HSET", KEYS[1], "failures", 0)
+    redis.call("EXPIRE", KEYS[1], cooldown + tonumber(ARGV[3]))
+    redis.call("DEL", KEYS[2])
+    return 1
+end
+if failures == 1 then
+    redis.call("EXPIRE", KEYS[1], ARGV[3])
+end
+return 0
+"""
+
+
+def classify(err: Exception) -> str:
+    """Sort a provider call's exception into TRANSIENT, THROTTLED or FATAL."""
+    if isinstance(err, openai.APIConnectionError | httpx.TransportError):
+        return TRANSIENT
+    if isinstance(err, openai.APIStatusError):
+        status = err.status_code
+    elif isinstance(err, genai_errors.APIError):
+        status = err.code
+    else:
+        return FATAL
+    if status == THROTTLED_STATUS:
+        return THROTTLED
+    if status in TRANSIENT_STATUS or status >= httpx.codes.INTERNAL_SERVER_ERROR:
+        return TRANSIENT
+    return FATAL
+
+
+def backoff(attempt: int) -> float:
+    """Seconds to wait before retry `attempt` (from 0): full-jitter backoff."""
+    ceiling = min(
+        settings.AI_RETRY_MAX_DELAY,
+        settings.AI_RETRY_BASE_DELAY * 2**attempt,
+    )
+    return random.uniform(0, ceiling)  # noqa: S311
+
+
+class CircuitBreaker:
+    """
+    Shared health of one provider model version, kept in Redis so every
+    worker sees it.
+
+    `settings.AI_CIRCUIT_FAILURE_THRESHOLD` transient failures within
+    `AI_CIRCUIT_FAILURE_WINDOW` seconds open the circuit: for
+    `AI_CIRCUIT_COOLDOWN` seconds `check` raises CircuitOpenError without
+    calling the provider. After that one caller at a time probes the
+    provider; its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, provider: str, model_version_id: int):
+        self.provider = provider
+        self.key = cache.make_key(f"ai_circuit_{provider}_{model_version_id}")
+        self.probe_key = f"{self.key}_probe"
+
+    def check(self):
+        script = get_redis_connection("default").register_script(CHECK_SCRIPT)
+        self.raise_if_open(script(**self.check_args()))
+
+    def record_failure(self):
+        script = get_redis_connection("default").register_script(FAILURE_SCRIPT)
+        script(**self.failure_args())
+
+    def record_success(self):
+        get_redis_connection("default").delete(self.key, self.probe_key)
+
+    async def acheck(self):
+        script = async_redis.get_client().register_script(CHECK_SCRIPT)
+        self.raise_if_open(await script(**self.check_args()))
+
+    async def arecord_failure(self):
+        script = async_redis.get_client().register_script(FAILURE_SCRIPT)
+        await script(**self.failure_args())
+
+    async def arecord_success(self):
+        await async_redis.get_client().delete(self.key, self.probe_key)
+
+    def check_args(self) -> dict:
+        return {
+            "keys": [self.key, self.probe_key],
+            "args": [time.time(), PROBE_TIMEOUT],
+        }
+
+    def failure_args(self) -> dict:
+        return {
+            "keys": [self.key, self.probe_key],
+            "args": [
+                time.time(),
+                settings.AI_CIRCUIT_FAILURE_THRESHOLD,
+                settings.AI_CIRCUIT_FAILURE_WINDOW,
+                settings.AI_CIRCUIT_COOLDOWN,
+            ],
+        }
+
+    def raise_if_open(self, state: list):
+        if state[0] == 1:
+            raise CircuitOpenError(self.provider, float(state[1]))
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from dialogmanagement.utils import async_redis
+from dialogmanagement.utils import metrics
+
+# Cached reply keys scored by their last use, to evict the least recently
+# used once the cache is full. Entries also expire after their TTL.
+LRU_KEY = "ai_response_cache_lru"
+
+# Store a reply, mark it used and evict the least recently used replies over
+# the size limit, in one round-trip.
+STORE_SCRIPT = """
+redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[2])
+redis.call("ZADD", KEYS[2], ARGV[3], KEYS[1])
+local excess = redis.call("ZCARD", KEYS[2]) - tonumber(ARGV[4])
+if excess > 0 then
+    local evicted = redis.call("ZPOPMIN", KEYS[2], excess)
+    for i = 1, #evicted, 2 do
+        redis.call("DEL", evicted[i])
+    end
+end
+"""
+
+
+def normalize(text: str) -> str:
+    """Fold case and runs of whitespace, so trivially different prompts match."""
+    return " ".join(text.split()).casefold()
+
+
+def prompt_digest(
+    model_version_id: int,
+    config: dict,
+    system_prompt: str,
+    messages: list[dict],
+) -> str:
+    """
+    Return a hash of the model version, its generation config and the
+    normalized prompt sent to the provider, which identifies a reply.
+    """
+    payload = json.dumps(
+        {
+            "model_version": model_version_id,
+            "config": config,
+            "system": normalize(system_prompt),
+            "messages": [[m["role"], normalize(m["content"])] for m in messages],
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def response_cache_key(digest: str) -> str:
+    return cache.make_key(f"ai_response_{digest}")
+
+
+def queue_lookup(pipe, digest: str):
+    key = response_cache_key(digest)
+    pipe.get(key)
+    # XX: only refresh the last use of a reply that is still listed.
+    pipe.zadd(cache.make_key(LRU_KEY), {key: time.time()}, xx=True)
+
+
+def lookup_result(reply: bytes | None) -> tuple[str | None, str]:
+    counter = "response_cache.misses" if reply is None else "response_cache.hits"
+    return (None if reply is None else reply.decode()), counter
+
+
+def store_args(digest: str, reply: str) -> dict:
+    return {
+        "keys": [response_cache_key(digest), cache.make_key(LRU_KEY)],
+        "args": [
+            reply,
+            settings.AI_RESPONSE_CACHE_TIMEOUT,
+            time.time(),
+            settings.AI_RESPONSE_CACHE_MAX_ENTRIES,
+        ],
+    }
+
+
+def get(digest: str) -> str | None:
+    """Return the cached reply for the prompt `digest`, or None."""
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    queue_lookup(pipe, digest)
+    reply, counter = lookup_result(pipe.execute()[0])
+    metrics.incr(counter)
+    return reply
+
+
+def put(digest: str, reply: str):
+    script = get_redis_connection("default").register_script(STORE_SCRIPT)
+    script(**store_args(digest, reply))
+
+
+async def aget(digest: str) -> str | None:
+    """`get` on the event loop's Redis client."""
+    pipe = async_redis.get_client().pipeline(transaction=False)
+    queue_lookup(pipe, digest)
+    reply, counter = lookup_result((await pipe.execute())[0])
+    await metrics.aincr(counter)
+    return reply
+
+
+async def aput(digest: str, reply: str):
+    script = async_redis.get_client().register_script(STORE_SCRIPT)
+    await script(**store_args(digest, reply))
+
+
+def hit_rate(counters: dict[str, int]) -> float | None:
+    hits = counters.get("response_cache.hits", 0)
+    lookups = hits + counters.get("response_cache.misses", 0)
+    return hits / lookups if lookups else None
@@ -0,0 +1,158 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django_redis import get_redis_connection
+
+from dialogmanagement.utils import async_redis
+from dialogmanagement.utils import metrics
+
+# How often a follower checks that the leader still holds the lock.
+LEADER_CHECK_INTERVAL = 1
+# How long a settled reply stays readable, for a follower that subscribed
+# just after it was published.
+RESULT_TIMEOUT = 10
+
+
+def check_timeout():
+    """
+    Refuse a flight timeout that outlasts a task's soft time limit: the
+    followers of a stuck leader would be killed with it instead of calling
+    the provider themselves.
+    """
+    if settings.AI_SINGLE_FLIGHT_TIMEOUT >= settings.CELERY_TASK_SOFT_TIME_LIMIT:
+        err = (
+            "AI_SINGLE_FLIGHT_TIMEOUT must be shorter than CELERY_TASK_SOFT_TIME_LIMIT."
+        )
+        raise ImproperlyConfigured(err)
+
+
+class Flight:
+    """
+    Coalesces concurrent provider calls for the same prompt digest.
+
+    `join` makes the first caller the leader, holding a Redis lock for
+    `settings.AI_SINGLE_FLIGHT_TIMEOUT` seconds, and returns None: it calls
+    the provider and hands the reply to `finish`. Later callers are
+    followers: `join` waits for the leader's reply on a pub/sub channel and
+    returns it. If the leader fails or its lock expires, followers get None
+    and call the provider themselves. Use the flight as a context manager
+    so a leader that fails releases its followers at once.
+
+    A timeout of 0 turns coalescing off: every caller leads.
+    """
+
+    def __init__(self, digest: str):
+        self.lock_key = cache.make_key(f"ai_flight_{digest}")
+        self.result_key = f"{self.lock_key}_result"
+        self.channel = f"{self.lock_key}_done"
+        self.timeout = settings.AI_SINGLE_FLIGHT_TIMEOUT
+        self.leader = False
+
+    def join(self) -> str | None:
+        """Return the leader's reply, or None if the caller must answer."""
+        if not self.timeout:
+            return None
+        redis = get_redis_connection("default")
+        if redis.set(self.lock_key, 1, nx=True, ex=self.timeout):
+            self.leader = True
+            metrics.incr("single_flight.leaders")
+            return None
+
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(self.channel)
+            # Subscribed before reading, so a reply settled in between is in
+            # the result key.
+            result = redis.get(self.result_key)
+            deadline = time.monotonic() + self.timeout
+            while result is None and time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=LEADER_CHECK_INTERVAL)
+                if message is not None:
+                    result = message["data"]
+                elif not redis.exists(self.lock_key):
+                    result = redis.get(self.result_key)
+                    break
+        finally:
+            pubsub.close()
+        reply = self.decode_result(result)
+        if reply is not None:
+            metrics.incr("single_flight.followers")
+        return reply
+
+    def finish(self, reply: str):
+        """Hand the leader's reply to the followers."""
+        if self.leader:
+            self.settle(reply)
+
+    def settle(self, reply: str | None):
+        self.leader = False
+        pipe = get_redis_connection("default").pipeline()
+        self.queue_settle(pipe, reply)
+        pipe.execute()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.leader:
+            self.settle(None)
+
+    async def ajoin(self) -> str | None:
+        """`join` on the event loop's Redis client."""
+        if not self.timeout:
+            return None
+        client = async_redis.get_client()
+        if await client.set(self.lock_key, 1, nx=True, ex=self.timeout):
+            self.leader = True
+            await metrics.aincr("single_flight.leaders")
+            return None
+
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self.channel)
+            result = await client.get(self.result_key)
+            deadline = time.monotonic() + self.timeout
+            while result is None and time.monotonic() < deadline:
+                message = await pubsub.get_message(timeout=LEADER_CHECK_INTERVAL)
+                if message is not None:
+                    result = message["data"]
+                elif not await client.exists(self.lock_key):
+                    result = await client.get(self.result_key)
+                    break
+        finally:
+            await pubsub.aclose()
+        reply = self.decode_result(result)
+        if reply is not None:
+            await metrics.aincr("single_flight.followers")
+        return reply
+
+    async def afinish(self, reply: str):
+        if self.leader:
+            await self.asettle(reply)
+
+    async def asettle(self, reply: str | None):
+        self.leader = False
+        pipe = async_redis.get_client().pipeline()
+        self.queue_settle(pipe, reply)
+        await pipe.execute()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.leader:
+            await self.asettle(None)
+
+    def queue_settle(self, pipe, reply: str | None):
+        # `reply` None tells the followers that the leader failed.
+        payload = json.dumps({"reply": reply})
+        pipe.set(self.result_key, payload, ex=RESULT_TIMEOUT)
+        pipe.publish(self.channel, payload)
+        pipe.delete(self.lock_key)
+
+    @staticmethod
+    def decode_result(result: bytes | None) -> str | None:
+        return None if result is None else json.loads(result)["reply"]
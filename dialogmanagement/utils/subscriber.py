@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import weakref
+from collections.abc import Callable
+
+from django.conf import settings
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from dialogmanagement.utils import async_redis
+from dialogmanagement.utils.error_handle import TooManySubscriptionsError
+
+logger = logging.getLogger(__name__)
+
+# How often the reader checks whether anything is still subscribed.
+POLL_TIMEOUT = 1.0
+
+_subscribers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+class Subscriber:
+    """
+    One Redis pub/sub connection shared by every coroutine of an event loop
+    that waits on a channel. Each registers a callback for its channel; a
+    reader task subscribes a channel once, while anyone listens, and calls
+    its callbacks with every message's data.
+
+    At most `settings.PUBSUB_MAX_SUBSCRIPTIONS` callbacks are registered at
+    once; `subscribe` raises TooManySubscriptionsError beyond that.
+    """
+
+    def __init__(self):
+        self.pubsub = async_redis.get_client().pubsub(ignore_subscribe_messages=True)
+        self.callbacks: dict[str, set[Callable]] = {}
+        self.count = 0
+        self.lock = asyncio.Lock()
+        self.reader: asyncio.Task | None = None
+
+    def has_room(self) -> bool:
+        return self.count < settings.PUBSUB_MAX_SUBSCRIPTIONS
+
+    async def subscribe(self, channel: str, callback: Callable):
+        async with self.lock:
+            if not self.has_room():
+                raise TooManySubscriptionsError(self.count)
+            if channel not in self.callbacks:
+                await self.pubsub.subscribe(channel)
+                self.callbacks[channel] = set()
+            self.callbacks[channel].add(callback)
+            self.count += 1
+            # The reader stops once nothing is subscribed.
+            if self.reader is None or self.reader.done():
+                self.reader = asyncio.create_task(self.read())
+
+    async def unsubscribe(self, channel: str, callback: Callable):
+        async with self.lock:
+            callbacks = self.callbacks[channel]
+            callbacks.discard(callback)
+            self.count -= 1
+            if not callbacks:
+                del self.callbacks[channel]
+                await self.pubsub.unsubscribe(channel)
+
+    async def read(self):
+        while self.callbacks:
+            try:
+                message = await self.pubsub.get_message(timeout=POLL_TIMEOUT)
+            except (RedisConnectionError, RedisTimeoutError):
+                # The next read reconnects and subscribes the channels again;
+                # listeners time out on anything published meanwhile.
+                logger.warning("Pub/sub connection lost, reconnecting")
+                await asyncio.sleep(POLL_TIMEOUT)
+                continue
+            if message is None:
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            for callback in list(self.callbacks.get(channel, ())):
+                callback(message["data"])
+
+
+def get_subscriber() -> Subscriber:
+    """Return the running event loop's Subscriber."""
+    loop = asyncio.get_running_loop()
+    subscriber = _subscribers.get(loop)
+    if subscriber is None:
+        subscriber = _subscribers[loop] = Subscriber()
+    return subscriber
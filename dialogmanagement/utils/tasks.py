@@ -1,57 +1,396 @@
+import datetime
 import logging
+from collections.abc import Awaitable
+from collections.abc import Callable
 
+from asgiref.sync import sync_to_async
 from celery import Task
+from celery import chain
 from celery import shared_task
+from django.conf import settings
 from django.contrib.postgres.search import SearchVector
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
 
 from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.utils import dialogue_archive
+from dialogmanagement.utils import dialogue_partitions
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils import write_behind
 from dialogmanagement.utils.ai_service import AIModelFactory
+from dialogmanagement.utils.dialogue_cache import bump_dialogue_version
+from dialogmanagement.utils.dialogue_stream import DialogueStreamPublisher
 from dialogmanagement.utils.error_handle import AIModelError
+from dialogmanagement.utils.error_handle import RateLimitedError
+
+SEARCH_VECTOR_BATCH_SIZE = 1000
+
+PIPELINE_FUSED = "fused"
+PIPELINE_CHAINED = "chained"
+PIPELINE_STAGES = ("pipeline.insert", "pipeline.provider", "pipeline.save")
 
 
 class DialogueAITask(Task):
     """Celery task for handling AI response asynchronously."""
 
     def run(self, dialogue_id, user_id, model_id, model_version_id):
+        """Fetch dialogue, generate AI response, and update status."""
+        return self.respond(dialogue_id, user_id, model_id, model_version_id)
+
+    def respond(self, dialogue_id, user_id, model_id, model_version_id, content=None):
+        """
+        Generate the AI reply to a dialogue, mark it completed and save the
+        reply. `content` saves re-reading a dialogue the caller just wrote.
+        The reply is streamed to the dialogue's channel while it is generated
+        and written to the database once, before `done` is published.
+        """
+        publisher = DialogueStreamPublisher(user_id, dialogue_id)
+        try:
+            if content is None:
+                content = Dialogue.objects.values_list("content", flat=True).get(
+                    id=dialogue_id,
+                )
+            with metrics.timer("pipeline.provider"):
+                ai_model = AIModelFactory.get_model(model_id, model_version_id)
+                response = ai_model.chat_with_ai(user_id, content, publisher)
+            with metrics.timer("pipeline.save"):
+                ai_model.persist_turn(dialogue_id, user_id, response)
+            publisher.done()
+        except RateLimitedError:
+            # Not a failure: the caller answers the dialogue later.
+            raise
+        except Exception as err:
+            publisher.error("The AI reply could not be generated.")
+            msg = f"Unexpected error for user: {err!s}"
+            logging.exception(msg)
+            raise AIModelError(message=str(err), status_code=400) from err
+
+    async def arespond(
+        self,
+        dialogue_id,
+        user_id,
+        model_id,
+        model_version_id,
+        content=None,
+    ):
+        """
+        `respond` on an event loop, for `run_ai_worker`. The provider call is
+        awaited under the provider's concurrency cap, taken by
+        `aprovider_stream`; the database work runs in Django's sync thread.
+        """
+        publisher = DialogueStreamPublisher(user_id, dialogue_id)
         try:
-            """Fetch dialogue, generate AI response, and update status."""
-            dialogue = Dialogue.objects.get(id=dialogue_id)
-            ai_model = AIModelFactory.get_model(model_id, model_version_id)
-            response = ai_model.chat_with_ai(user_id, dialogue.content)
-            ai_model.save_ai_response(user_id, response)
-            ai_model.update_dialogue_status(dialogue_id)
+            if content is None:
+                content = await Dialogue.objects.values_list(
+                    "content",
+                    flat=True,
+                ).aget(id=dialogue_id)
+            async with metrics.atimer("pipeline.provider"):
+                ai_model = await sync_to_async(AIModelFactory.get_model)(
+                    model_id,
+                    model_version_id,
+                )
+                response = await ai_model.achat_with_ai(
+                    user_id,
+                    content,
+                    publisher,
+                )
+            async with metrics.atimer("pipeline.save"):
+                await sync_to_async(ai_model.persist_turn)(
+                    dialogue_id,
+                    user_id,
+                    response,
+                )
+            await publisher.adone()
+        except RateLimitedError:
+            raise
         except Exception as err:
+            await publisher.aerror("The AI reply could not be generated.")
             msg = f"Unexpected error for user: {err!s}"
             logging.exception(msg)
-            raise AIModelError(meassage=str(err), status_code=400) from err
+            raise AIModelError(message=str(err), status_code=400) from err
 
 
 @shared_task
-def create_user_dialogue(user_id, content, model_id, model_version_id):
-    dialogue = Dialogue.objects.create(
-        user_id=user_id,
-        content=content,
-        model_id=model_id,
-        model_version_id=model_version_id,
-    )
+def create_user_dialogue(
+    user_id,
+    content,
+    model_id,
+    model_version_id,
+    dialogue_id=None,
+):
+    with metrics.timer("pipeline.insert"):
+        dialogue = Dialogue.objects.create(
+            id=dialogue_id,
+            user_id=user_id,
+            content=content,
+            model_id=model_id,
+            model_version_id=model_version_id,
+        )
+        bump_dialogue_version(user_id)
     return dialogue.id
 
 
-@shared_task(base=DialogueAITask)
+@shared_task(base=DialogueAITask, bind=True, max_retries=None)
 def chat_with_ai_task(
+    self,
+    dialogue_id,
+    user_id,
+    model_id,
+    model_version_id,
+):
+    """
+    Answer a dialogue. While the provider's rate limit is exhausted, the
+    task is retried, from its queue, once it has room.
+    """
+    try:
+        return self.respond(dialogue_id, user_id, model_id, model_version_id)
+    except RateLimitedError as err:
+        metrics.incr(f"{err.provider}.throttled")
+        raise self.retry(countdown=err.retry_after) from err
+
+
+def defer_reply(
+    err: RateLimitedError,
     dialogue_id,
     user_id,
     model_id,
     model_version_id,
 ):
-    return DialogueAITask().run(
+    """
+    Answer an inserted dialogue with `chat_with_ai_task` once the provider's
+    rate limit has room, instead of retrying the task that inserted it.
+    """
+    metrics.incr(f"{err.provider}.throttled")
+    chat_with_ai_task.apply_async(
+        (dialogue_id, user_id, model_id, model_version_id),
+        countdown=err.retry_after,
+        queue=settings.AI_PROVIDER_QUEUES[err.provider],
+    )
+
+
+@shared_task(base=DialogueAITask)
+def run_dialogue_turn(
+    user_id,
+    content,
+    model_id,
+    model_version_id,
+    dialogue_id=None,
+):
+    """
+    Insert the user's message and answer it in a single task, so a turn
+    costs one broker publish and one worker pickup instead of one per step.
+    The search vector is filled in by the database trigger on insert.
+    """
+    dialogue_id = create_user_dialogue(
+        user_id,
+        content,
+        model_id,
+        model_version_id,
         dialogue_id,
+    )
+    try:
+        DialogueAITask().respond(
+            dialogue_id,
+            user_id,
+            model_id,
+            model_version_id,
+            content=content,
+        )
+    except RateLimitedError as err:
+        defer_reply(err, dialogue_id, user_id, model_id, model_version_id)
+    return dialogue_id
+
+
+async def achat_with_ai_task(dialogue_id, user_id, model_id, model_version_id):
+    """`chat_with_ai_task` for `run_ai_worker`."""
+    try:
+        await DialogueAITask().arespond(
+            dialogue_id,
+            user_id,
+            model_id,
+            model_version_id,
+        )
+    except RateLimitedError as err:
+        await sync_to_async(defer_reply)(
+            err,
+            dialogue_id,
+            user_id,
+            model_id,
+            model_version_id,
+        )
+
+
+async def arun_dialogue_turn(
+    user_id,
+    content,
+    model_id,
+    model_version_id,
+    dialogue_id=None,
+):
+    """`run_dialogue_turn` for `run_ai_worker`."""
+    dialogue_id = await sync_to_async(create_user_dialogue)(
         user_id,
+        content,
         model_id,
         model_version_id,
+        dialogue_id,
+    )
+    try:
+        await DialogueAITask().arespond(
+            dialogue_id,
+            user_id,
+            model_id,
+            model_version_id,
+            content=content,
+        )
+    except RateLimitedError as err:
+        await sync_to_async(defer_reply)(
+            err,
+            dialogue_id,
+            user_id,
+            model_id,
+            model_version_id,
+        )
+    return dialogue_id
+
+
+# Coroutine twins of the tasks `run_ai_worker` can run, by task name.
+ASYNC_TASKS: dict[str, Callable[..., Awaitable]] = {
+    run_dialogue_turn.name: arun_dialogue_turn,
+    chat_with_ai_task.name: achat_with_ai_task,
+}
+
+
+def provider_queue(model_id):
+    """Return the Celery queue of the provider that serves `model_id`."""
+    return settings.AI_PROVIDER_QUEUES[AIModelFactory.get_provider(model_id)]
+
+
+def start_fused_turn(user_id, content, model_id, model_version_id, dialogue_id):
+    return run_dialogue_turn.apply_async(
+        (user_id, content, model_id, model_version_id, dialogue_id),
+        queue=provider_queue(model_id),
     )
 
 
+def start_chained_turn(user_id, content, model_id, model_version_id, dialogue_id):
+    return chain(
+        create_user_dialogue.s(
+            user_id,
+            content,
+            model_id,
+            model_version_id,
+            dialogue_id,
+        ),
+        chat_with_ai_task.s(user_id, model_id, model_version_id).set(
+            queue=provider_queue(model_id),
+        ),
+    ).apply_async()
+
+
+PIPELINES = {
+    PIPELINE_FUSED: start_fused_turn,
+    PIPELINE_CHAINED: start_chained_turn,
+}
+
+
+def get_pipeline(mode=None):
+    """
+    Return the function that starts a dialogue turn in `mode`, by default
+    `settings.DIALOGUE_PIPELINE_MODE`.
+    """
+    mode = mode or settings.DIALOGUE_PIPELINE_MODE
+    if mode not in PIPELINES:
+        err = f"Unknown dialogue pipeline mode: {mode}"
+        raise ImproperlyConfigured(err)
+    return PIPELINES[mode]
+
+
+def enqueue_dialogue_turn(
+    user_id,
+    content,
+    model_id,
+    model_version_id,
+    dialogue_id=None,
+):
+    """
+    Start answering a dialogue message in the configured pipeline mode.
+    `dialogue_id` is an id from `Dialogue.objects.reserve_id()` for the
+    message row.
+    """
+    start_turn = get_pipeline()
+    return start_turn(user_id, content, model_id, model_version_id, dialogue_id)
+
+
+@shared_task(bind=True, max_retries=None)
+def compact_chat_history(self, user_id, model_id, model_version_id):
+    """Fold a user's oldest chat turns into the rolling summary."""
+    ai_model = AIModelFactory.get_model(model_id, model_version_id)
+    try:
+        ai_model.compact_history(user_id)
+    except RateLimitedError as err:
+        metrics.incr(f"{err.provider}.throttled")
+        raise self.retry(countdown=err.retry_after) from err
+
+
+@shared_task()
+def update_search_vector(batch_size=SEARCH_VECTOR_BATCH_SIZE):
+    """
+    Backfill `search_vector` for rows the database trigger has not covered yet
+    (rows written before the trigger existed), a batch of ids at a time.
+    New and edited rows are indexed on write by the trigger itself.
+    """
+    updated = 0
+    while True:
+        dialogue_ids = list(
+            Dialogue.objects.filter(search_vector__isnull=True).values_list(
+                "id",
+                flat=True,
+            )[:batch_size],
+        )
+        if not dialogue_ids:
+            return updated
+        updated += Dialogue.objects.filter(id__in=dialogue_ids).update(
+            search_vector=SearchVector("content"),
+        )
+
+
 @shared_task()
-def update_search_vector(self=None):
-    Dialogue.objects.update(search_vector=SearchVector("content"))
+def flush_dialogue_writes():
+    """
+    Write every turn queued by `DIALOGUE_WRITE_BEHIND`. `flush_dialogues`
+    does this continuously; schedule this task as a backstop.
+    """
+    return write_behind.Flusher().drain()
+
+
+@shared_task()
+def create_dialogue_partitions():
+    """
+    Keep `DIALOGUE_PARTITION_MONTHS_AHEAD` months of Dialogue partitions
+    ready, once the table is partitioned. Run daily by Celery beat.
+    """
+    return dialogue_partitions.ensure_partitions(
+        timezone.now(),
+        settings.DIALOGUE_PARTITION_MONTHS_AHEAD,
+    )
+
+
+@shared_task()
+def archive_old_dialogues():
+    """
+    Move dialogues older than `DIALOGUE_ARCHIVE_AFTER_DAYS` to compressed
+    segment files. Run daily by Celery beat; does nothing while it is 0.
+    """
+    if not settings.DIALOGUE_ARCHIVE_AFTER_DAYS:
+        return None
+    cutoff = timezone.now() - datetime.timedelta(
+        days=settings.DIALOGUE_ARCHIVE_AFTER_DAYS,
+    )
+    result = dialogue_archive.archive_old_dialogues(
+        cutoff,
+        settings.DIALOGUE_ARCHIVE_SEGMENT_ROWS,
+    )
+    logging.info("Archived dialogues: %s", result)
+    return result
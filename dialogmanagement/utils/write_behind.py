@@ -0,0 +1,224 @@
+import datetime
+import json
+import logging
+import os
+import socket
+import time
+from collections.abc import Awaitable
+from typing import cast
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from dialogmanagement.dialogue.models import Dialogue
+from dialogmanagement.utils import async_redis
+from dialogmanagement.utils import metrics
+from dialogmanagement.utils.dialogue_cache import bump_dialogue_version
+from dialogmanagement.utils.dialogue_types import StatusType
+from dialogmanagement.utils.dialogue_types import UserType
+
+logger = logging.getLogger(__name__)
+
+# Answered turns waiting to be written, read by the flushers' consumer group.
+STREAM_KEY = "dialogue_write_behind"
+GROUP = "flushers"
+# How long a flusher blocks on an empty stream before checking for stop.
+POLL_MS = 1000
+# Entries a flusher read but did not acknowledge for this long, e.g. because
+# it died, are taken over by another one.
+CLAIM_IDLE_MS = 60_000
+
+
+def stream_key() -> str:
+    return cache.make_key(STREAM_KEY)
+
+
+def pending_key(user_id: int) -> str:
+    """The user's turns in the stream, by reply id, for the history list."""
+    return cache.make_key(f"dialogue_pending_{user_id}")
+
+
+def append_turn(dialogue_id: int, user_id: int, text: str, model_version) -> int:
+    """
+    Queue the answer to a dialogue for the flusher instead of writing it:
+    the reply row under an id reserved now, and the COMPLETED status of the
+    user's message. Return the reply id.
+    """
+    entry = {
+        "dialogue_id": dialogue_id,
+        "reply_id": Dialogue.objects.reserve_id(),
+        "user_id": user_id,
+        "content": text,
+        "model_id": model_version.ai_model_id,
+        "model_version_id": model_version.id,
+        "created": timezone.now().isoformat(),
+    }
+    payload = json.dumps(entry)
+    pipe = get_redis_connection("default").pipeline()
+    pipe.xadd(stream_key(), {"turn": payload})
+    pipe.hset(pending_key(user_id), entry["reply_id"], payload)
+    pipe.execute()
+    return entry["reply_id"]
+
+
+def reply_row(entry: dict) -> Dialogue:
+    return Dialogue(
+        id=entry["reply_id"],
+        user_id=entry["user_id"],
+        status=StatusType.COMPLETED,
+        content=entry["content"],
+        type=UserType.AI,
+        model_id=entry["model_id"],
+        model_version_id=entry["model_version_id"],
+        created_timestamp=datetime.datetime.fromisoformat(entry["created"]),
+    )
+
+
+async def apending_rows(user) -> list[Dialogue]:
+    """
+    The user's answered turns not written yet, as the rows the history list
+    will find once they are: the reply, and the user's message COMPLETED.
+    """
+    client = async_redis.get_client()
+    raw = await cast(Awaitable[list], client.hvals(pending_key(user.id)))
+    if not raw:
+        return []
+    entries = [json.loads(payload) for payload in raw]
+    rows = []
+    for entry in entries:
+        row = reply_row(entry)
+        row.user = user
+        row.updated_timestamp = row.created_timestamp
+        rows.append(row)
+    messages = Dialogue.objects.select_related("user").filter(
+        id__in=[entry["dialogue_id"] for entry in entries],
+        user=user,
+    )
+    async for message in messages:
+        message.status = StatusType.COMPLETED
+        rows.append(message)
+    return rows
+
+
+def write(entries: list[dict]):
+    """Insert the replies and complete the messages in one transaction."""
+    with transaction.atomic():
+        # A batch written before its flusher died is read again: the
+        # reserved ids make the insert idempotent.
+        Dialogue.objects.bulk_create(
+            [reply_row(entry) for entry in entries],
+            ignore_conflicts=True,
+        )
+        Dialogue.objects.filter(
+            id__in=[entry["dialogue_id"] for entry in entries],
+        ).update(status=StatusType.COMPLETED)
+
+
+class Flusher:
+    """
+    Writes the turns of the write-behind stream to the database, in batches
+    of up to `settings.DIALOGUE_FLUSH_BATCH_SIZE` rows collected over at most
+    `settings.DIALOGUE_FLUSH_INTERVAL_MS` from the first one.
+
+    Flushers share a Redis consumer group, so several can run. An entry is
+    acknowledged once its batch is committed; entries a dead flusher left
+    unacknowledged are claimed by another after `CLAIM_IDLE_MS`.
+    """
+
+    def __init__(self, consumer: str | None = None):
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.redis = get_redis_connection("default")
+        self.batch_size = settings.DIALOGUE_FLUSH_BATCH_SIZE
+        self.interval_ms = settings.DIALOGUE_FLUSH_INTERVAL_MS
+        try:
+            self.redis.xgroup_create(stream_key(), GROUP, id="0", mkstream=True)
+        except ResponseError as err:
+            if "BUSYGROUP" not in str(err):
+                raise
+
+    def run(self, stop=lambda: False):
+        while not stop():
+            self.flush(self.read_batch(POLL_MS))
+
+    def drain(self) -> int:
+        """Flush until the stream is empty; return the turns written."""
+        written = 0
+        while batch := self.read_batch(0):
+            written += self.flush(batch)
+        return written
+
+    def read_batch(self, block_ms: int) -> list[tuple[bytes, dict]]:
+        """
+        Wait up to `block_ms` for a first entry (0: do not wait), then collect
+        more until the batch is full or the flush interval has passed.
+        """
+        _, batch, _ = self.redis.xautoclaim(
+            stream_key(),
+            GROUP,
+            self.consumer,
+            min_idle_time=CLAIM_IDLE_MS,
+            count=self.batch_size,
+        )
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None and batch:
+                deadline = time.monotonic() + self.interval_ms / 1000
+            if deadline is None:
+                block = block_ms or None
+            else:
+                left_ms = round((deadline - time.monotonic()) * 1000)
+                if left_ms <= 0:
+                    break
+                block = left_ms
+            response = self.redis.xreadgroup(
+                GROUP,
+                self.consumer,
+                {stream_key(): ">"},
+                count=self.batch_size - len(batch),
+                block=block,
+            )
+            if not response:
+                if deadline is None:
+                    break
+                continue
+            batch.extend(response[0][1])
+        return batch
+
+    def flush(self, batch: list[tuple[bytes, dict]]) -> int:
+        if not batch:
+            return 0
+        entries = [json.loads(fields[b"turn"]) for _, fields in batch]
+        try:
+            write(entries)
+            written = entries
+        except IntegrityError:
+            # Foreign keys are checked at commit: find the turns whose user
+            # or model is gone and drop them.
+            written = []
+            for entry in entries:
+                try:
+                    write([entry])
+                    written.append(entry)
+                except IntegrityError:
+                    logger.exception(
+                        "Dropping the answer to dialogue %s",
+                        entry["dialogue_id"],
+                    )
+        ids = [entry_id for entry_id, _ in batch]
+        pipe = self.redis.pipeline()
+        pipe.xack(stream_key(), GROUP, *ids)
+        pipe.xdel(stream_key(), *ids)
+        for entry in entries:
+            pipe.hdel(pending_key(entry["user_id"]), entry["reply_id"])
+        pipe.execute()
+        for user_id in {entry["user_id"] for entry in written}:
+            # The rows now carry their write time in `updated_timestamp`.
+            bump_dialogue_version(user_id)
+        metrics.incr("write_behind.batches")
+        metrics.incr("write_behind.rows", len(written))
+        return len(written)